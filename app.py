@@ -3,11 +3,15 @@ import re
 import json
 import random
 import base64
+import hashlib
 import html
 import threading
 import time
 import unicodedata
+import uuid
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import ContextVar, copy_context
 from difflib import SequenceMatcher
 from io import BytesIO
 from datetime import datetime, timedelta
@@ -15,13 +19,39 @@ from pathlib import Path
 from typing import Optional, Any
 import pandas as pd
 import numpy as np
-
-try:
-    WORLD_TIMESTAMPS = np.load("world_timestamps.npy")
-except Exception:
-    WORLD_TIMESTAMPS = None
+from pupil_analysis import (
+    GAZE_MIN_CONFIDENCE,
+    _sanitize_participant_id,
+    integrate_app_with_pupil,
+    export_final_excel,
+    export_framewise_archive,
+    _stream_gaze_csv,
+    _stream_pupil_csv,
+    _load_cached_gaze,
+    _store_cached_gaze,
+    _cached_world_timestamps,
+    _cached_video_path,
+    _screen_stimuli,
+    render_scanpath_overlay,
+    _store_video_chunks,
+    _mirrored_blob_path,
+    _store_mirror_chunks,
+    _csv_source_handle,
+    DOWNLOAD_CHUNK_BYTES,
+    VIDEO_CHUNK_BYTES,
+    _frames_for_timestamps,
+    _load_world_timestamps,
+    HEATMAP_BINS,
+    _compute_gaze_heatmaps,
+    _recording_spans,
+    _span,
+    _record_span,
+    _spans_table,
+)
+import altair as alt
 import streamlit as st
-from github import Github, GithubException
+from github import Github, GithubException, InputGitTreeElement
+from github.GithubObject import GithubObject
 
 # =========================================================
 # CONFIG
@@ -278,7 +308,16 @@ DATA_FILES = {
 }
 
 RESULTS_PATH_IN_REPO = "Resultados_SmartScore.xlsx"  # se crea/actualiza vía API de GitHub
+RESULTS_RECORDS_DIR = "registros_resultados"  # un JSON por envío, hasta la compactación
+RESULTS_COMPACT_EVERY = 20
 REPO_FULL_NAME = "SChavavt/app_Estancia"
+REPO_BRANCH = "main"
+REPO_INDEX_HEAD_TTL_SECONDS = 10
+GITHUB_POOL_SIZE = 16
+DOWNLOAD_WORKERS = 8
+COMMIT_MAX_ATTEMPTS = 3
+GITHUB_CALL_LOG_MAX = 50
+GITHUB_COUNTED_PREFIXES = ("get_", "create_", "update_", "delete_", "edit")
 
 INITIAL_FORM_VALUES = {
     "nombre_completo": "",
@@ -522,18 +561,35 @@ def _normalize_product_key(value: str) -> str:
     return re.sub(r"[^a-z0-9]+", "", normalized)
 
 
-def _load_user_smartscore_map(user_name: str) -> dict[str, float]:
-    cleaned = user_name.strip()
-    if not cleaned:
-        return {}
+def _current_results_table() -> tuple[pd.DataFrame, Optional[str]]:
+    """
+    Tabla de resultados para la pestaña del experimento: la del repo (Excel
+    compactado más registros pendientes, ver _read_results_table) o, sin
+    GITHUB_TOKEN, el Excel local. Devuelve también un mensaje de error o None.
+    """
+    if "GITHUB_TOKEN" in st.secrets:
+        try:
+            df, _ = _read_results_table(_github_repo())
+        except Exception as error:
+            return pd.DataFrame(), f"No se pudo leer '{RESULTS_PATH_IN_REPO}': {error}"
+        return df, None
 
     results_path = Path(RESULTS_PATH_IN_REPO)
     if not results_path.exists():
+        return pd.DataFrame(), f"El archivo '{results_path}' no existe aún."
+    try:
+        return pd.read_excel(results_path), None
+    except Exception as error:
+        return pd.DataFrame(), f"No se pudo leer el archivo '{results_path}': {error}"
+
+
+def _load_user_smartscore_map(user_name: str) -> dict[str, float]:
+    cleaned = user_name.strip()
+    if not cleaned:
         return {}
 
-    try:
-        df = pd.read_excel(results_path)
-    except Exception:
+    df, error = _current_results_table()
+    if error:
         return {}
 
     if "Nombre Completo" not in df.columns:
@@ -581,13 +637,8 @@ def _lookup_participant_metadata(user_name: str) -> tuple[str, str]:
     if not cleaned:
         return "", ""
 
-    results_path = Path(RESULTS_PATH_IN_REPO)
-    if not results_path.exists():
-        return "", ""
-
-    try:
-        df = pd.read_excel(results_path)
-    except Exception:
+    df, error = _current_results_table()
+    if error:
         return "", ""
 
     if "Nombre Completo" not in df.columns:
@@ -662,6 +713,121 @@ def _find_registered_name_matches(
     return filtered[:limit]
 
 
+@st.cache_resource(show_spinner=False)
+def _github_call_counter() -> dict:
+    """
+    ContextVar con la acción en curso ("action") y la función que le suma
+    llamadas ("tally"). Vive en cache_resource porque este script se re-ejecuta
+    en cada rerun y el cliente compartido sobrevive a todos.
+    """
+    action_var: ContextVar[Optional[dict]] = ContextVar("github_action", default=None)
+    lock = threading.Lock()
+
+    def _tally(calls: int = 1) -> None:
+        action = action_var.get()
+        if action is None or calls <= 0:
+            return
+        with lock:
+            if action["Llamadas API"] == 0:
+                action["_log"].append(action)
+                del action["_log"][:-GITHUB_CALL_LOG_MAX]
+            action["Llamadas API"] += calls
+
+    return {"action": action_var, "tally": _tally}
+
+
+def _unwrap_github(value):
+    if isinstance(value, _CountedGithubObject):
+        return value._target
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap_github(item) for item in value)
+    return value
+
+
+class _CountedGithubObject:
+    """
+    Envoltorio de un objeto de PyGithub (repo, ref, commit…) que suma una
+    llamada a la acción en curso por cada método de la API que la app invoca
+    (GITHUB_COUNTED_PREFIXES). Los objetos que devuelven quedan envueltos
+    igual, así ref.edit también cuenta. Una lista paginada cuenta como una.
+    """
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name: str):
+        value = getattr(self._target, name)
+        if not callable(value) or not name.startswith(GITHUB_COUNTED_PREFIXES):
+            return value
+
+        def _counted(*args, **kwargs):
+            _github_call_counter()["tally"]()
+            result = value(
+                *_unwrap_github(args),
+                **{key: _unwrap_github(item) for key, item in kwargs.items()},
+            )
+            return _CountedGithubObject(result) if isinstance(result, GithubObject) else result
+
+        return _counted
+
+
+def _begin_github_action(label: str) -> None:
+    """Las llamadas a la API desde aquí hasta la siguiente acción (o rerun) cuentan para `label`."""
+    _github_call_counter()["action"].set(
+        {
+            "Acción": label,
+            "Inicio": datetime.now().strftime("%H:%M:%S"),
+            "Llamadas API": 0,
+            "_log": st.session_state.setdefault("github_call_log", []),
+        }
+    )
+
+
+def _github_call_log() -> pd.DataFrame:
+    log = st.session_state.get("github_call_log", [])
+    return pd.DataFrame(
+        [{key: value for key, value in entry.items() if key != "_log"} for entry in log],
+        columns=["Acción", "Inicio", "Llamadas API"],
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def _github_client() -> Github:
+    """Cliente único por proceso: su sesión HTTP mantiene las conexiones keep-alive."""
+    return Github(st.secrets["GITHUB_TOKEN"], pool_size=GITHUB_POOL_SIZE)
+
+
+@st.cache_resource(show_spinner=False)
+def _github_http_session():
+    """Sesión HTTP compartida (keep-alive, mismo tamaño de pool) para bajar blobs crudos."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=GITHUB_POOL_SIZE, pool_maxsize=GITHUB_POOL_SIZE)
+    session.mount("https://", adapter)
+    # Cada respuesta cuenta como llamada a la API para la acción en curso
+    session.hooks["response"].append(
+        lambda response, *args, **kwargs: _github_call_counter()["tally"]()
+    )
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {st.secrets['GITHUB_TOKEN']}",
+            "Accept": "application/vnd.github.raw+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+    )
+    return session
+
+
+@st.cache_resource(show_spinner=False)
+def _github_repo():
+    """Handle del repositorio compartido; get_repo se paga una sola vez por proceso."""
+    return _CountedGithubObject(_github_client().get_repo(REPO_FULL_NAME))
+
+
 def get_user_group(user_name: str) -> str:
     cleaned = (user_name or "").strip()
     if not cleaned:
@@ -671,11 +837,7 @@ def get_user_group(user_name: str) -> str:
         return ""
 
     try:
-        github_client = Github(st.secrets["GITHUB_TOKEN"])
-        repo = github_client.get_repo(REPO_FULL_NAME)
-        contents = repo.get_contents(RESULTS_PATH_IN_REPO)
-        excel_bytes = base64.b64decode(contents.content)
-        df = pd.read_excel(BytesIO(excel_bytes))
+        df, _ = _read_results_table(_github_repo())
     except GithubException:
         return ""
     except Exception:
@@ -809,14 +971,14 @@ def _reorder_person_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df_reordenado
 
 
-def buscar_frame(timestamp_segundos):
-    if WORLD_TIMESTAMPS is None:
-        return None
-    try:
-        idx = np.searchsorted(WORLD_TIMESTAMPS, timestamp_segundos)
-        return int(idx)
-    except Exception:
-        return None
+LOCAL_WORLD_TIMESTAMPS_PATH = Path("world_timestamps.npy")
+
+
+def buscar_frames(timestamps_segundos) -> pd.Series:
+    """Índices de frame para varios tiempos a la vez (carga diferida, memory-mapped)."""
+    return _frames_for_timestamps(
+        _load_world_timestamps(LOCAL_WORLD_TIMESTAMPS_PATH), timestamps_segundos
+    )
 
 
 def _apply_reset_form_state() -> None:
@@ -877,6 +1039,38 @@ def _load_mode_images(mode: str) -> list[Path]:
     return image_paths
 
 
+def _stimulus_images_for_products(mode: str, productos: list[str]) -> dict[str, Path]:
+    """Imagen de data/images/<modo> que corresponde a cada producto mostrado en pantalla."""
+    folder_name = VISUAL_SUBFOLDERS.get(mode)
+    if folder_name is None:
+        return {}
+    claves_imagen: dict[str, Path] = {}
+    for path in sorted(_load_image_paths(VISUAL_BASE_PATH / folder_name)):
+        claves_imagen[_normalize_product_key(path.stem)] = path
+        alias = IMAGE_STEM_TO_PRODUCT.get(path.stem.casefold())
+        if alias:
+            claves_imagen[_normalize_product_key(alias)] = path
+
+    imagenes: dict[str, Path] = {}
+    for producto in productos:
+        clave = _normalize_product_key(producto)
+        if not clave:
+            continue
+        path = claves_imagen.get(clave)
+        if path is None:
+            path = next(
+                (
+                    candidate
+                    for clave_imagen, candidate in claves_imagen.items()
+                    if clave_imagen and (clave_imagen in clave or clave in clave_imagen)
+                ),
+                None,
+            )
+        if path is not None:
+            imagenes[producto] = path
+    return imagenes
+
+
 def _ensure_ab_mode_defaults(mode_state: dict) -> None:
     images: list[Path] = mode_state.get("images", [])
     total_images = len(images)
@@ -1877,6 +2071,7 @@ def _build_experiment_results(
     if isinstance(experiment_start, datetime) and isinstance(experiment_end, datetime):
         experiment_duration = (experiment_end - experiment_start).total_seconds()
     records: list[dict] = []
+    frame_seconds: list[tuple[Optional[float], Optional[float]]] = []
     participant_group = user_group or st.session_state.get("tab2_user_group", "")
     smartscore_enabled = participant_group == "Con SmartScore"
     default_atn = {"tiempo": None, "fijaciones": None, "primera_mirada": None}
@@ -2174,8 +2369,10 @@ def _build_experiment_results(
                 frame_start_seconds = frame_end_seconds
             if frame_end_seconds is None and frame_start_seconds is not None:
                 frame_end_seconds = frame_start_seconds
-            record["Frame_inicio"] = buscar_frame(frame_start_seconds)
-            record["Frame_fin"] = buscar_frame(frame_end_seconds)
+            # Se convierten a frames todos juntos al final (buscar_frames)
+            record["Frame_inicio"] = None
+            record["Frame_fin"] = None
+            frame_seconds.append((frame_start_seconds, frame_end_seconds))
 
             selected_display = _resolve_display_name(selected_stem)
             selected_score = None
@@ -2233,6 +2430,9 @@ def _build_experiment_results(
             records.append(record)
 
     summary_df = pd.DataFrame(records)
+    if frame_seconds:
+        summary_df["Frame_inicio"] = buscar_frames([start for start, _ in frame_seconds])
+        summary_df["Frame_fin"] = buscar_frames([end for _, end in frame_seconds])
 
     for column in ("Frame_inicio", "Frame_fin"):
         if column in summary_df.columns:
@@ -2414,8 +2614,7 @@ def guardar_excel_en_github(
         return False
 
     try:
-        github_client = Github(st.secrets["GITHUB_TOKEN"])
-        repo = github_client.get_repo(REPO_FULL_NAME)
+        repo = _github_repo()
     except KeyError:
         st.error("No se configuró el token de GitHub en st.secrets.")
         return False
@@ -2435,555 +2634,129 @@ def guardar_excel_en_github(
     folder = f"data_participantes/{id_participante}"
     path = f"{folder}/{filename}"
 
+    if not _commit_files_to_repo(repo, {path: bytes_excel}, "Update experiment data"):
+        return False
+    st.success(
+        f"Archivo guardado automáticamente en GitHub para el participante {id_participante}"
+    )
+    return True
+
+
+def _get_github_repo_instance():
+    if "GITHUB_TOKEN" not in st.secrets:
+        st.error("No se configuró el token de GitHub en st.secrets.")
+        return None
     try:
-        existing_file = repo.get_contents(path)
+        return _github_repo()
     except GithubException as gh_error:
-        if getattr(gh_error, "status", None) == 404:
-            try:
-                repo.create_file(
-                    path,
-                    "Create experiment data",
-                    bytes_excel,
-                    branch="main",
-                )
-                st.success(
-                    f"Archivo guardado automáticamente en GitHub para el participante {id_participante}"
-                )
-                return True
-            except GithubException as create_error:
-                datos_error = getattr(create_error, "data", {})
-                mensaje_error = (
-                    datos_error.get("message", str(create_error))
-                    if isinstance(datos_error, dict)
-                    else str(create_error)
-                )
-                st.error(
-                    f"❌ Error al crear el archivo en GitHub: {mensaje_error}"
-                )
-                return False
-            except Exception as generic_error:
-                st.error(f"❌ Error al crear el archivo en GitHub: {generic_error}")
-                return False
         datos_error = getattr(gh_error, "data", {})
         mensaje_error = (
             datos_error.get("message", str(gh_error))
             if isinstance(datos_error, dict)
             else str(gh_error)
         )
-        st.error(f"❌ Error al acceder al archivo en GitHub: {mensaje_error}")
-        return False
-    except Exception as generic_error:
-        st.error(f"❌ Error al acceder al archivo en GitHub: {generic_error}")
-        return False
-
-    try:
-        repo.update_file(
-            path,
-            "Update experiment data",
-            bytes_excel,
-            existing_file.sha,
-            branch="main",
-        )
-        st.success(
-            f"Archivo guardado automáticamente en GitHub para el participante {id_participante}"
-        )
-        return True
-    except GithubException as update_error:
-        datos_error = getattr(update_error, "data", {})
-        mensaje_error = (
-            datos_error.get("message", str(update_error))
-            if isinstance(datos_error, dict)
-            else str(update_error)
-        )
-        st.error(f"❌ Error al actualizar el archivo en GitHub: {mensaje_error}")
-        return False
+        st.error(f"❌ Error al conectar con GitHub: {mensaje_error}")
     except Exception as generic_error:
-        st.error(f"❌ Error al actualizar el archivo en GitHub: {generic_error}")
-        return False
-
-
-def _sanitize_participant_id(df_app: pd.DataFrame) -> str:
-    """Return a safe identifier for filenames based on the participant ID."""
-
-    if "ID_Participante" not in df_app.columns or df_app.empty:
-        return "sin_id"
-
-    raw_value = df_app["ID_Participante"].iloc[0]
-    if pd.isna(raw_value):
-        return "sin_id"
-
-    sanitized = re.sub(r"[^A-Za-z0-9_-]+", "_", str(raw_value).strip())
-    sanitized = sanitized.strip("_")
-    return sanitized or "sin_id"
-
-
-def _parse_aoi_payload(aoi_payload) -> dict[str, dict]:
-    if aoi_payload is None or (isinstance(aoi_payload, float) and np.isnan(aoi_payload)):
-        return {}
-    parsed = aoi_payload
-    if isinstance(aoi_payload, str):
-        aoi_payload = aoi_payload.strip()
-        if not aoi_payload:
-            return {}
-        try:
-            parsed = json.loads(aoi_payload)
-        except json.JSONDecodeError:
-            return {}
-    if isinstance(parsed, list):
-        result: dict[str, dict] = {}
-        for entry in parsed:
-            if not isinstance(entry, dict):
-                continue
-            name = entry.get("name") or entry.get("producto") or entry.get("Producto")
-            if not name:
-                continue
-            result[str(name)] = entry
-        return result
-    if isinstance(parsed, dict):
-        return parsed
-    return {}
-
-
-def _first_float(data: dict, keys: list[str]) -> Optional[float]:
-    for key in keys:
-        if key in data and data[key] is not None:
-            try:
-                return float(data[key])
-            except (TypeError, ValueError):
-                continue
+        st.error(f"❌ Error al conectar con GitHub: {generic_error}")
     return None
 
 
-def _aoi_bounds_from_dict(raw_data: dict) -> Optional[dict[str, float]]:
-    if not isinstance(raw_data, dict):
-        return None
-    x_min = _first_float(raw_data, ["x_min", "xmin", "left", "x"])
-    y_min = _first_float(raw_data, ["y_min", "ymin", "top", "y"])
-    x_max = _first_float(raw_data, ["x_max", "xmax", "right"])
-    y_max = _first_float(raw_data, ["y_max", "ymax", "bottom"])
-    width = _first_float(raw_data, ["width", "ancho"])
-    height = _first_float(raw_data, ["height", "alto"])
-    if x_min is None or y_min is None:
-        return None
-    if x_max is None and width is not None:
-        x_max = x_min + width
-    if y_max is None and height is not None:
-        y_max = y_min + height
-    if x_max is None or y_max is None:
-        return None
+@st.cache_resource(show_spinner=False)
+def _repo_index_state() -> dict:
     return {
-        "x_min": min(x_min, x_max),
-        "x_max": max(x_min, x_max),
-        "y_min": min(y_min, y_max),
-        "y_max": max(y_min, y_max),
+        "head": None,
+        "files": {},
+        "dirs": set(),
+        "truncated": False,
+        "checked_at": 0.0,
+        "lock": threading.Lock(),
     }
 
 
-def _normalize_aoi_block(raw_value, row_number: int) -> dict[str, dict[str, float]]:
-    if raw_value is None or (isinstance(raw_value, float) and np.isnan(raw_value)):
-        return {}
-    try:
-        parsed = json.loads(raw_value) if isinstance(raw_value, str) else raw_value
-    except json.JSONDecodeError:
-        return {}
-    if not isinstance(parsed, dict) or not parsed:
-        return {}
-
-    def _normalize_bounds(bounds) -> Optional[dict[str, float]]:
-        if isinstance(bounds, dict):
-            return _aoi_bounds_from_dict(bounds)
-        if isinstance(bounds, (list, tuple)) and len(bounds) >= 4:
-            try:
-                x1, y1, x2, y2 = [float(value) for value in bounds[:4]]
-            except (TypeError, ValueError):
-                return None
-            return {
-                "x_min": min(x1, x2),
-                "x_max": max(x1, x2),
-                "y_min": min(y1, y2),
-                "y_max": max(y1, y2),
-            }
-        return None
-
-    cleaned: dict[str, dict[str, float]] = {}
-    treat_as_flat = all(_normalize_bounds(bounds) for bounds in parsed.values())
-    if treat_as_flat:
-        block_entries: dict[str, dict[str, float]] = {}
-        for name, bounds in parsed.items():
-            normalized = _normalize_bounds(bounds)
-            if normalized:
-                block_entries[str(name)] = normalized
-        if block_entries:
-            cleaned["default"] = block_entries
-        return cleaned
-
-    for block_name, block_data in parsed.items():
-        if not isinstance(block_data, dict):
-            continue
-        normalized_block: dict[str, dict[str, float]] = {}
-        for aoi_name, bounds in block_data.items():
-            normalized = _normalize_bounds(bounds)
-            if normalized:
-                normalized_block[str(aoi_name)] = normalized
-        if normalized_block:
-            cleaned[str(block_name)] = normalized_block
-    return cleaned
-
-
-def _point_inside_bounds(x: Optional[float], y: Optional[float], bounds: dict[str, float]) -> bool:
-    return (
-        x is not None
-        and y is not None
-        and bounds["x_min"] <= x <= bounds["x_max"]
-        and bounds["y_min"] <= y <= bounds["y_max"]
-    )
+def _repo_tree_index(repo, force_refresh: bool = False) -> dict:
+    """
+    Índice del repositorio (path → SHA del blob y tamaño, más carpetas) armado
+    con un solo git tree recursivo. Solo se reconstruye cuando cambia el head
+    de la rama; ese head se consulta a lo más cada REPO_INDEX_HEAD_TTL_SECONDS
+    salvo con force_refresh. No toca st.*: si GitHub truncó el árbol lo marca
+    en "truncated" y avisa quien lo muestra (_warn_if_index_truncated).
+    """
+    state = _repo_index_state()
+    with state["lock"]:
+        now = time.monotonic()
+        if (
+            not force_refresh
+            and state["head"]
+            and now - state["checked_at"] < REPO_INDEX_HEAD_TTL_SECONDS
+        ):
+            return state
+        head_sha = repo.get_git_ref(f"heads/{REPO_BRANCH}").object.sha
+        if head_sha != state["head"]:
+            tree = repo.get_git_tree(head_sha, recursive=True)
+            files: dict[str, dict[str, Any]] = {}
+            dirs: set[str] = set()
+            for element in tree.tree:
+                if element.type == "blob":
+                    files[element.path] = {"sha": element.sha, "size": element.size}
+                elif element.type == "tree":
+                    dirs.add(element.path)
+            state.update(
+                head=head_sha,
+                files=files,
+                dirs=dirs,
+                truncated=bool(tree.raw_data.get("truncated")),
+            )
+        state["checked_at"] = now
+    return state
 
 
-def _find_first_column(frame: pd.DataFrame, candidates: list[str]) -> Optional[str]:
-    for candidate in candidates:
-        if candidate in frame.columns:
-            return candidate
-    return None
+def _invalidate_repo_index() -> None:
+    """Tras escribir en el repo, la próxima consulta revisa el head sin esperar el TTL."""
+    _repo_index_state()["checked_at"] = 0.0
 
 
-def _prepare_gaze_dataframe(gaze_df: pd.DataFrame) -> pd.DataFrame:
-    timestamp_col = _find_first_column(
-        gaze_df, ["timestamp", "gaze_timestamp", "world_timestamp", "time", "ts"]
-    )
-    if timestamp_col is None:
-        raise ValueError(
-            "gaze_positions.csv debe incluir una columna de tiempo reconocida (timestamp)."
-        )
+def _warn_if_index_truncated(index: dict) -> None:
+    if index.get("truncated"):
+        st.warning("⚠️ GitHub truncó el árbol del repositorio; el índice puede estar incompleto.")
 
-    x_col = _find_first_column(
-        gaze_df, ["norm_pos_x", "x", "gaze_x", "world_x", "px", "norm_pos_x [0]"]
-    )
-    y_col = _find_first_column(
-        gaze_df, ["norm_pos_y", "y", "gaze_y", "world_y", "py", "norm_pos_y [1]"]
-    )
-    conf_col = _find_first_column(
-        gaze_df, ["confidence", "gaze_confidence", "probability", "conf"]
-    )
 
-    normalized = pd.DataFrame()
-    normalized["timestamp"] = pd.to_numeric(gaze_df[timestamp_col], errors="coerce")
-    normalized["norm_pos_x"] = (
-        pd.to_numeric(gaze_df[x_col], errors="coerce") if x_col else np.nan
+def _report_index_error(gh_error: GithubException, accion: str) -> None:
+    datos_error = getattr(gh_error, "data", {})
+    mensaje_error = (
+        datos_error.get("message", str(gh_error))
+        if isinstance(datos_error, dict)
+        else str(gh_error)
     )
-    normalized["norm_pos_y"] = (
-        pd.to_numeric(gaze_df[y_col], errors="coerce") if y_col else np.nan
-    )
-    if conf_col:
-        normalized["confidence"] = (
-            pd.to_numeric(gaze_df[conf_col], errors="coerce").fillna(0)
-        )
-    else:
-        normalized["confidence"] = 1.0
-
-    normalized = normalized.dropna(subset=["timestamp"]).copy()
-    normalized = normalized[normalized["confidence"] >= 0.6]
-    normalized = normalized.sort_values("timestamp").reset_index(drop=True)
-    normalized["dt"] = normalized["timestamp"].diff().clip(lower=0, upper=1)
-    normalized["dt"].fillna(0.016, inplace=True)
-    return normalized
-
-
-def _timestamp_from_frame(
-    frame_value: Any, total_frames: int, world_ts: np.ndarray
-) -> Optional[float]:
-    try:
-        frame_index = int(frame_value)
-    except (TypeError, ValueError):
-        return None
-    if frame_index < 0 or frame_index >= total_frames:
-        return None
-    timestamp = world_ts[frame_index]
-    if not np.isfinite(timestamp):
-        return None
-    return float(timestamp)
-
-
-def integrate_app_with_pupil(
-    
-    excel_df,
-    gaze_df,
-    world_ts,
-    fixations_df=None,
-    fixation_report_df=None,
-    blink_df=None,
-    pupil_df=None,
-    export_info_df=None,
-):
-    world_array = np.asarray(world_ts).flatten()
-    if world_array.size == 0:
-        raise ValueError("Archivo world_timestamps.npy vacío o inválido.")
-
-    gaze_clean = _prepare_gaze_dataframe(gaze_df)
-    total_frames = world_array.shape[0]
-
-    framewise_rows: list[dict[str, Any]] = []
-    per_screen_rows: list[dict[str, Any]] = []
-    screen_intervals: list[tuple[str, float, float]] = []
-
-    for idx, row in excel_df.iterrows():
-        mode = str(row.get("Modo", "")).strip() or "Desconocido"
-        pantalla_id = str(row.get("Pantalla_ID") or "").strip()
-        if not pantalla_id:
-            continue
-
-        aois_by_screen = _normalize_aoi_block(row.get("AOIs"), idx + 1)
-        block_aois = aois_by_screen.get(pantalla_id) or {}
-        if not block_aois:
-            continue
-
-        t_start = _timestamp_from_frame(row.get("Frame_inicio"), total_frames, world_array)
-        t_end = _timestamp_from_frame(row.get("Frame_fin"), total_frames, world_array)
-        if t_start is None or t_end is None or t_end < t_start:
-            continue
-
-        screen_duration = float(t_end - t_start)
-        screen_intervals.append((mode, t_start, t_end))
-
-        segment = gaze_clean[
-            (gaze_clean["timestamp"] >= t_start)
-            & (gaze_clean["timestamp"] <= t_end)
-        ].copy()
-
-        for _, gaze_point in segment.iterrows():
-            aoi_hit = None
-            for aoi_name, bounds in block_aois.items():
-                if _point_inside_bounds(
-                    gaze_point.get("norm_pos_x"),
-                    gaze_point.get("norm_pos_y"),
-                    bounds,
-                ):
-                    aoi_hit = aoi_name
-                    break
-            framewise_rows.append(
-                {
-                    "timestamp": gaze_point["timestamp"],
-                    "norm_pos_x": gaze_point.get("norm_pos_x"),
-                    "norm_pos_y": gaze_point.get("norm_pos_y"),
-                    "dt": gaze_point.get("dt", 0.0),
-                    "AOI": aoi_hit,
-                    "Modo": mode,
-                    "Pantalla_ID": pantalla_id,
-                    "Pantalla": row.get("Pantalla", ""),
-                    "Producto_Seleccionado": row.get("Producto Seleccionado", ""),
-                }
-            )
+    st.error(f"❌ Error al {accion}: {mensaje_error}")
 
-        for aoi_name, bounds in block_aois.items():
-            mask = segment.apply(
-                lambda p: _point_inside_bounds(
-                    p.get("norm_pos_x"), p.get("norm_pos_y"), bounds
-                ),
-                axis=1,
-            ) if not segment.empty else pd.Series(dtype=bool)
-
-            dwell_time = float(segment.loc[mask, "dt"].sum()) if not segment.empty else 0.0
-            fixations = int(mask.sum()) if not segment.empty else 0
-            tff = (
-                float(segment.loc[mask, "timestamp"].min())
-                if not segment.empty and mask.any()
-                else np.nan
-            )
-            product, component = (
-                aoi_name.split("_", 1) + [""] if "_" in aoi_name else [aoi_name, ""]
-            )[:2]
-            per_screen_rows.append(
-                {
-                    "Modo": mode,
-                    "Pantalla_ID": pantalla_id,
-                    "Pantalla": row.get("Pantalla", ""),
-                    "AOI": aoi_name,
-                    "Producto": product,
-                    "Componente": component,
-                    "Dwell_Time": dwell_time,
-                    "Fixaciones": fixations,
-                    "TFF": tff,
-                    "Segment_Duration": screen_duration,
-                    "Frame_inicio": row.get("Frame_inicio"),
-                    "Frame_fin": row.get("Frame_fin"),
-                }
-            )
 
-    df_framewise = (
-        pd.DataFrame(framewise_rows)
-        .sort_values("timestamp")
-        .reset_index(drop=True)
-    )
-    df_per_screen = (
-        pd.DataFrame(per_screen_rows)
-        .sort_values(["Modo", "Pantalla_ID", "AOI"])
-        .reset_index(drop=True)
+def _participant_dirs(index: dict) -> list[str]:
+    prefix = "data_participantes/"
+    return sorted(
+        path[len(prefix):]
+        for path in index["dirs"]
+        if path.startswith(prefix) and "/" not in path[len(prefix):]
     )
 
-    if not df_per_screen.empty:
-        df_per_mode = (
-            df_per_screen.groupby("Modo", as_index=False)
-            .agg(
-                {
-                    "Dwell_Time": "sum",
-                    "Fixaciones": "sum",
-                    "TFF": "min",
-                    "Segment_Duration": "sum",
-                }
-            )
-            .rename(columns={"Segment_Duration": "Total_Duration"})
-            .sort_values("Modo")
-            .reset_index(drop=True)
-        )
-    else:
-        df_per_mode = pd.DataFrame(
-            columns=["Modo", "Dwell_Time", "Fixaciones", "TFF", "Total_Duration"]
-        )
-
-    blink_results = pd.DataFrame()
-    if blink_df is not None:
-        blink_start_col = _find_first_column(
-            blink_df,
-            [
-                "start_timestamp",
-                "start_time",
-                "start",
-                "t_start",
-                "timestamp_start",
-            ],
-        )
-        blink_end_col = _find_first_column(
-            blink_df,
-            ["end_timestamp", "end_time", "end", "t_end", "timestamp_end"],
-        )
-        if blink_start_col and blink_end_col:
-            blinks = blink_df[[blink_start_col, blink_end_col]].copy()
-            blinks.columns = ["start", "end"]
-            blinks = blinks.dropna()
-            per_mode_counts: list[dict[str, Any]] = []
-            for mode, start_ts, end_ts in screen_intervals:
-                duration = max(0.0, end_ts - start_ts)
-                overlap_count = 0
-                for _, blink in blinks.iterrows():
-                    blink_start = float(blink["start"])
-                    blink_end = float(blink["end"])
-                    overlap_start = max(start_ts, blink_start)
-                    overlap_end = min(end_ts, blink_end)
-                    if overlap_end > overlap_start:
-                        overlap_count += 1
-                per_mode_counts.append(
-                    {
-                        "Modo": mode,
-                        "Blinks": overlap_count,
-                        "Duration": duration,
-                    }
-                )
-            blink_results = pd.DataFrame(per_mode_counts)
-            if not blink_results.empty:
-                blink_results = (
-                    blink_results.groupby("Modo", as_index=False)
-                    .agg({"Blinks": "sum", "Duration": "sum"})
-                    .assign(
-                        Blink_Rate_Hz=lambda df: df.apply(
-                            lambda r: r["Blinks"] / r["Duration"]
-                            if r["Duration"] > 0
-                            else np.nan,
-                            axis=1,
-                        )
-                    )
-                    .sort_values("Modo")
-                    .reset_index(drop=True)
-                )
-
-    results = {
-        "df_app": excel_df,
-        "framewise_gaze": df_framewise,
-        "per_screen": df_per_screen,
-        "per_mode": df_per_mode,
-        "blinks_per_mode": blink_results,
-    }
-
-    if isinstance(pupil_df, pd.DataFrame):
-        results["pupil_raw"] = pupil_df
-    if isinstance(export_info_df, pd.DataFrame):
-        results["export_info"] = export_info_df
-
-    return results
-
-
-def export_final_excel(results_dict) -> bytes:
-    buffer = BytesIO()
-    sheet_order = [
-        ("Resumen_App", results_dict.get("excel_resumen") or results_dict.get("df_app")),
-        ("Gaze_Framewise", results_dict.get("framewise_gaze")),
-        ("AOI_Por_Pantalla", results_dict.get("per_screen")),
-        ("AOI_Por_Modo", results_dict.get("per_mode")),
-    ]
-
-    if isinstance(results_dict.get("blinks_per_mode"), pd.DataFrame):
-        sheet_order.append(("Blinks_Por_Modo", results_dict.get("blinks_per_mode")))
-    if isinstance(results_dict.get("pupil_raw"), pd.DataFrame):
-        sheet_order.append(("Pupil_Raw", results_dict.get("pupil_raw")))
-    if isinstance(results_dict.get("export_info"), pd.DataFrame):
-        sheet_order.append(("Export_Info", results_dict.get("export_info")))
-
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        for sheet_name, df_value in sheet_order:
-            if isinstance(df_value, pd.DataFrame) and not df_value.empty:
-                df_value.to_excel(writer, sheet_name=sheet_name, index=False)
-            else:
-                pd.DataFrame().to_excel(writer, sheet_name=sheet_name, index=False)
-
-    buffer.seek(0)
-    return buffer.getvalue()
-
-
-def _get_github_repo_instance():
-    if "GITHUB_TOKEN" not in st.secrets:
-        st.error("No se configuró el token de GitHub en st.secrets.")
-        return None
-    try:
-        github_client = Github(st.secrets["GITHUB_TOKEN"])
-        return github_client.get_repo(REPO_FULL_NAME)
-    except GithubException as gh_error:
-        datos_error = getattr(gh_error, "data", {})
-        mensaje_error = (
-            datos_error.get("message", str(gh_error))
-            if isinstance(datos_error, dict)
-            else str(gh_error)
-        )
-        st.error(f"❌ Error al conectar con GitHub: {mensaje_error}")
-    except Exception as generic_error:
-        st.error(f"❌ Error al conectar con GitHub: {generic_error}")
-    return None
-
 
 def _list_github_participants(repo, force_refresh: bool = False) -> list[str]:
-    cache_key = "admin_participant_ids"
-    if not force_refresh and st.session_state.get(cache_key):
-        return st.session_state[cache_key]
-
     if repo is None:
         return []
 
     try:
-        contents = repo.get_contents("data_participantes")
-        ids = sorted([item.name for item in contents if item.type == "dir"])
-        st.session_state[cache_key] = ids
-        return ids
+        index = _repo_tree_index(repo, force_refresh=force_refresh)
     except GithubException as gh_error:
-        if getattr(gh_error, "status", None) == 404:
-            st.error("No se encontró la carpeta 'data_participantes' en el repositorio.")
-            return []
-        datos_error = getattr(gh_error, "data", {})
-        mensaje_error = (
-            datos_error.get("message", str(gh_error))
-            if isinstance(datos_error, dict)
-            else str(gh_error)
-        )
-        st.error(f"❌ Error al listar participantes: {mensaje_error}")
+        _report_index_error(gh_error, "listar participantes")
+        return []
     except Exception as generic_error:
         st.error(f"❌ Error inesperado al listar participantes: {generic_error}")
-    return []
+        return []
+
+    _warn_if_index_truncated(index)
+    if "data_participantes" not in index["dirs"]:
+        st.error("No se encontró la carpeta 'data_participantes' en el repositorio.")
+        return []
+    return _participant_dirs(index)
 
 
 def _expected_participant_files(participant_id: str) -> dict[str, str]:
@@ -3000,43 +2773,35 @@ def _expected_participant_files(participant_id: str) -> dict[str, str]:
         "export_info": f"{base}/export_info.csv",
         "video": f"{base}/world.mp4",
         "excel_final": f"{base}/analisis_final_{participant_id}.xlsx",
+        "framewise_zip": f"{base}/gaze_framewise_{participant_id}.zip",
     }
 
 
 def _check_participant_files(repo, participant_id: str, force_refresh: bool = False):
-    cache_key = "admin_status_cache"
-    cache = st.session_state.setdefault(cache_key, {})
-    if not force_refresh and cache.get(participant_id):
-        return cache[participant_id]
-    
     status: dict[str, dict[str, Any]] = {}
     expected_files = _expected_participant_files(participant_id)
 
     if repo is None:
         return status
 
+    try:
+        index = _repo_tree_index(repo, force_refresh=force_refresh)
+    except GithubException as gh_error:
+        _report_index_error(gh_error, f"verificar los archivos de {participant_id}")
+        index = {"files": {}}
+    except Exception as generic_error:
+        st.error(f"❌ Error inesperado al verificar los archivos de {participant_id}: {generic_error}")
+        index = {"files": {}}
+    _warn_if_index_truncated(index)
+
     for key, path in expected_files.items():
-        try:
-            contents = repo.get_contents(path)
-            status[key] = {"exists": True, "path": path, "sha": contents.sha}
-        except GithubException as gh_error:
-            if getattr(gh_error, "status", None) == 404:
-                status[key] = {"exists": False, "path": path, "sha": None}
-            else:
-                datos_error = getattr(gh_error, "data", {})
-                mensaje_error = (
-                    datos_error.get("message", str(gh_error))
-                    if isinstance(datos_error, dict)
-                    else str(gh_error)
-                )
-                st.error(f"❌ Error al verificar {path}: {mensaje_error}")
-                status[key] = {"exists": False, "path": path, "sha": None}
-        except Exception as generic_error:
-            st.error(f"❌ Error inesperado al verificar {path}: {generic_error}")
-            status[key] = {"exists": False, "path": path, "sha": None}
-
-    cache[participant_id] = status
-    st.session_state[cache_key] = cache
+        entry = index["files"].get(path)
+        status[key] = {
+            "exists": entry is not None,
+            "path": path,
+            "sha": entry["sha"] if entry else None,
+            "size": entry["size"] if entry else None,
+        }
     return status
 
 
@@ -3047,9 +2812,9 @@ def _resolve_participant_folder(repo, participant_id: str) -> Optional[str]:
     """
     base_path = "data_participantes"
 
-    # Intentar leer la carpeta base
+    # Leer las carpetas desde el índice del repositorio
     try:
-        folders = repo.get_contents(base_path)
+        folders = _participant_dirs(_repo_tree_index(repo))
     except Exception as e:
         st.error(f"❌ No se pudo acceder a {base_path}: {e}")
         return None
@@ -3058,11 +2823,10 @@ def _resolve_participant_folder(repo, participant_id: str) -> Optional[str]:
     target = participant_id.replace(" ", "").replace("_", "").lower()
 
     # Buscar coincidencia
-    for item in folders:
-        if item.type == "dir":
-            clean = item.name.replace(" ", "").replace("_", "").lower()
-            if target in clean:
-                return item.name
+    for name in folders:
+        clean = name.replace(" ", "").replace("_", "").lower()
+        if target in clean:
+            return name
 
     st.error(f"❌ No se encontró carpeta real en GitHub para {participant_id}")
     return None
@@ -3124,10 +2888,188 @@ def _extract_content_bytes(contents, nombre_archivo):
 
 
 
-def _safe_read_csv(buffer, nombre_archivo: str) -> pd.DataFrame:
-    if str(nombre_archivo).lower().endswith((".mp4", ".npy")):
-        raise ValueError("Archivo no CSV detectado en lectura CSV.")
-
+def _fetch_repo_video(
+    repo, ruta: str, nombre_archivo: str, blob_sha: Optional[str] = None
+) -> Optional[Path]:
+    """
+    Ruta local de world.mp4 en la caché de videos (por SHA del blob). Si no
+    está, lo baja como _fetch_blob: por su SHA del índice, con la API de git en
+    formato crudo y por bloques directo a disco (get_contents no sirve
+    archivos de más de 100 MB). None si el video no está en el repo.
+    """
+    if blob_sha is None and repo is not None:
+        blob_sha = (_repo_tree_index(repo)["files"].get(ruta) or {}).get("sha")
+    cached = _cached_video_path(blob_sha)
+    if cached is not None or repo is None or not blob_sha:
+        return cached
+
+    with _span(f"Descarga GitHub · {nombre_archivo}") as span:
+        with _github_http_session().get(_blob_url(blob_sha), stream=True, timeout=60) as response:
+            response.raise_for_status()
+            video_path = _store_video_chunks(
+                blob_sha, response.iter_content(chunk_size=VIDEO_CHUNK_BYTES)
+            )
+        span["Bytes"] = video_path.stat().st_size if video_path is not None else 0
+    return video_path
+
+
+def _mirrored_repo_file(
+    repo, ruta: str, nombre_archivo: str, force_refresh: bool = False
+) -> tuple[Path, str]:
+    """
+    Ruta local de `ruta` en el espejo de blobs y su SHA. El SHA sale del índice
+    del repo, así que leer de nuevo un archivo sin cambios es abrir un archivo
+    local; solo se descarga lo que el espejo aún no tiene. Lanza la
+    GithubException de get_contents (404 incluido) si el archivo no está.
+    """
+    entry: dict[str, Any] = {}
+    try:
+        entry = _repo_tree_index(repo, force_refresh=force_refresh)["files"].get(ruta) or {}
+    except GithubException:
+        pass
+
+    blob_sha = entry.get("sha")
+    if blob_sha:
+        cached = _mirrored_blob_path(blob_sha)
+        if cached is not None:
+            return cached, blob_sha
+        try:
+            download = _fetch_blob(_github_http_session(), blob_sha)
+        except Exception:
+            pass
+        else:
+            _record_span(
+                f"Descarga GitHub · {nombre_archivo}",
+                download["seconds"],
+                n_bytes=download["bytes"],
+            )
+            return download["source"], blob_sha
+
+    # Fuera del índice (o falló la descarga cruda): la API de contenidos decide
+    with _span(f"Descarga GitHub · {nombre_archivo}") as span:
+        contents = repo.get_contents(ruta)
+        cached = _mirrored_blob_path(contents.sha)
+        if cached is None:
+            cached = _store_mirror_chunks(
+                contents.sha, [_extract_content_bytes(contents, nombre_archivo)]
+            )
+        span["Bytes"] = cached.stat().st_size
+    return cached, contents.sha
+
+
+def _read_mirrored_repo_file(
+    repo, ruta: str, nombre_archivo: str, force_refresh: bool = False
+) -> tuple[bytes, str]:
+    """Bytes de `ruta` y su SHA, leídos del espejo de blobs."""
+    local_path, blob_sha = _mirrored_repo_file(
+        repo, ruta, nombre_archivo, force_refresh=force_refresh
+    )
+    try:
+        return local_path.read_bytes(), blob_sha
+    except FileNotFoundError:
+        # Otra sesión lo expulsó entre la búsqueda y la lectura: se descarga de nuevo
+        local_path, blob_sha = _mirrored_repo_file(repo, ruta, nombre_archivo)
+        return local_path.read_bytes(), blob_sha
+
+
+def _blob_url(blob_sha: str) -> str:
+    return f"https://api.github.com/repos/{REPO_FULL_NAME}/git/blobs/{blob_sha}"
+
+
+def _fetch_blob(session, blob_sha: str) -> dict[str, Any]:
+    """
+    Ruta del blob en el espejo local; si no está, lo descarga por su SHA con la
+    API de git en formato crudo (sin base64), por bloques directo a disco.
+    Puede correr en un hilo del pool, así que no toca st.*.
+    """
+    started = time.perf_counter()
+    cached = _mirrored_blob_path(blob_sha)
+    if cached is not None:
+        return {
+            "source": cached,
+            "bytes": cached.stat().st_size,
+            "seconds": time.perf_counter() - started,
+            "remote": False,
+        }
+
+    with session.get(_blob_url(blob_sha), stream=True, timeout=60) as response:
+        response.raise_for_status()
+        source = _store_mirror_chunks(
+            blob_sha, response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES)
+        )
+    return {
+        "source": source,
+        "bytes": source.stat().st_size,
+        "seconds": time.perf_counter() - started,
+        "remote": True,
+    }
+
+
+def _download_participant_files(
+    keys: list[str], status_map: dict, file_labels: dict
+) -> dict[str, dict[str, Any]]:
+    """
+    Descarga a la vez, en un pool de hilos, los archivos de `keys` que el índice
+    del repo marca como existentes. Por archivo devuelve "source" (ruta en el
+    espejo local), "bytes", "seconds" o "error"; cada uno queda como sub-etapa con su
+    latencia, y el total se acerca al del archivo más lento. Las rutas devueltas
+    acaban de usarse, así que `_enforce_cache_budget` no las expulsa mientras
+    este análisis las lee (ver CACHE_PIN_SECONDS).
+    """
+    jobs = {
+        key: status_map[key]
+        for key in keys
+        if status_map.get(key, {}).get("exists") and status_map[key].get("sha")
+    }
+    downloads: dict[str, dict[str, Any]] = {}
+    if not jobs:
+        return downloads
+
+    session = _github_http_session()
+    with _span("Descarga paralela de archivos") as span:
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(jobs))) as pool:
+            futures = {
+                # copy_context: el hook de la sesión suma a la acción en curso
+                pool.submit(copy_context().run, _fetch_blob, session, entry["sha"]): key
+                for key, entry in jobs.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    downloads[key] = future.result()
+                except Exception as error:
+                    downloads[key] = {"error": error, "bytes": 0, "seconds": None}
+        for key in jobs:
+            download = downloads[key]
+            if download.get("seconds") is not None:
+                _record_span(
+                    f"Descarga GitHub · {file_labels.get(key, key)}",
+                    download["seconds"],
+                    n_bytes=download["bytes"],
+                )
+        span["Bytes"] = sum(download["bytes"] for download in downloads.values())
+    return downloads
+
+
+def _downloaded_source(downloads: dict[str, dict[str, Any]], key: str):
+    """Ruta ya descargada para `key`; None si falló y hay que ir por get_contents."""
+    download = downloads.get(key) or {}
+    if download.get("error") is not None:
+        st.caption(f":gray[Descarga directa de {key} falló ({download['error']}); se reintenta.]")
+        return None
+    return download.get("source")
+
+
+def _source_length(source) -> int:
+    if isinstance(source, Path):
+        return source.stat().st_size
+    return len(source) if source is not None else 0
+
+
+def _safe_read_csv(buffer, nombre_archivo: str) -> pd.DataFrame:
+    if str(nombre_archivo).lower().endswith((".mp4", ".npy")):
+        raise ValueError("Archivo no CSV detectado en lectura CSV.")
+
     encodings_to_try = ["utf-8", "utf-8-sig", "latin1", "iso-8859-1"]
 
     for enc in encodings_to_try:
@@ -3163,59 +3105,118 @@ def _read_upload_csv_flexible(file_obj: Any, nombre_archivo: str) -> pd.DataFram
         return pd.DataFrame()
 
 
-def _read_repo_csv(repo, ruta: str, nombre_archivo: str) -> pd.DataFrame:
-    """Lectura robusta para archivos obligatorios de Pupil Labs con fallback seguro."""
-    if repo is None:
-        raise ValueError(f"El archivo {nombre_archivo} no existe en GitHub.")
-
-    # Descargar archivo
-    try:
-        contents = repo.get_contents(ruta)
-    except GithubException as gh_error:
-        if getattr(gh_error, "status", None) == 404:
-            raise ValueError(f"El archivo {nombre_archivo} no fue subido.")
-        raise
+def _read_repo_csv(repo, ruta: str, nombre_archivo: str, source=None) -> pd.DataFrame:
+    """
+    Lectura robusta para archivos obligatorios de Pupil Labs con fallback seguro.
+    Con `source` (bytes o ruta ya descargados) no vuelve a descargar; sin él,
+    lee del espejo local de blobs.
+    """
+    raw = source
+    if raw is None:
+        if repo is None:
+            raise ValueError(f"El archivo {nombre_archivo} no existe en GitHub.")
 
-    # Extraer bytes correctamente
-    raw = _extract_content_bytes(contents, nombre_archivo)
+        # Descargar archivo (o abrirlo del espejo local si no cambió)
+        try:
+            raw, _ = _read_mirrored_repo_file(repo, ruta, nombre_archivo)
+        except GithubException as gh_error:
+            if getattr(gh_error, "status", None) == 404:
+                raise ValueError(f"El archivo {nombre_archivo} no fue subido.")
+            raise
 
-    if raw is None or len(raw) < 50:
+    if raw is None or _source_length(raw) < 50:
         raise ValueError(f"El archivo {nombre_archivo} está vacío o corrupto.")
 
-    st.write(f"DEBUG tamaño real {nombre_archivo}:", len(raw))
-
     # Lectura robusta
-    for enc in ["utf-8", "utf-8-sig", "latin1", "iso-8859-1"]:
-        try:
-            df = pd.read_csv(BytesIO(raw), encoding=enc)
-            if not df.empty:
-                return df
-        except Exception:
-            pass
+    with _span(f"Lectura CSV · {nombre_archivo}") as span:
+        for enc in ["utf-8", "utf-8-sig", "latin1", "iso-8859-1"]:
+            try:
+                df = pd.read_csv(_csv_source_handle(raw), encoding=enc)
+                if not df.empty:
+                    span["Filas"] = len(df)
+                    return df
+            except Exception:
+                pass
 
     raise ValueError(f"No se pudo leer correctamente el archivo {nombre_archivo}.")
 
 
 
-def _read_repo_csv_flexible(repo, ruta: str, nombre_archivo: str) -> pd.DataFrame:
+def _read_repo_gaze_csv(
+    repo, ruta: str, nombre_archivo: str, blob_sha: Optional[str] = None, source=None
+) -> pd.DataFrame:
+    """
+    Devuelve el gaze limpio de gaze_positions.csv. Si ya se procesó ese blob
+    (mismo SHA en GitHub) se abre desde la caché local sin descargar nada; con
+    `source` (bytes o ruta ya descargados) se lee de ahí.
+    """
+    with _span("Gaze desde caché local") as span:
+        cached = _load_cached_gaze(blob_sha)
+        span["Filas"] = len(cached) if cached is not None else 0
+    if cached is not None:
+        return cached
+
+    raw, downloaded_sha = (
+        (source, blob_sha)
+        if source is not None
+        else _get_repo_file_content(repo, ruta, nombre_archivo)
+    )
+    if _source_length(raw) < 50:
+        raise ValueError(f"El archivo {nombre_archivo} está vacío o corrupto.")
+    with _span(f"Lectura CSV por bloques · {nombre_archivo}") as span:
+        gaze_clean = _stream_gaze_csv(raw, nombre_archivo)
+        span["Filas"] = len(gaze_clean)
+    if gaze_clean.empty:
+        raise ValueError(
+            f"{nombre_archivo} no contiene muestras con confianza ≥ {GAZE_MIN_CONFIDENCE}."
+        )
+    _store_cached_gaze(downloaded_sha or blob_sha, gaze_clean)
+    return gaze_clean
+
+
+def _read_repo_pupil_csv(repo, ruta: str, nombre_archivo: str, source=None) -> pd.DataFrame:
+    """Versión opcional y por bloques de la lectura de pupil_positions.csv."""
+    try:
+        raw = source if source is not None else _get_repo_file_content(repo, ruta, nombre_archivo)[0]
+    except Exception:
+        st.warning(f"⚠️ Archivo opcional faltante: {nombre_archivo}. Se usará un DataFrame vacío.")
+        return pd.DataFrame()
+    try:
+        with _span(f"Lectura CSV por bloques · {nombre_archivo}") as span:
+            pupil_df = _stream_pupil_csv(raw, nombre_archivo)
+            span["Filas"] = len(pupil_df)
+        return pupil_df
+    except Exception as error:
+        st.warning(
+            f"⚠️ No se pudo leer {nombre_archivo}: {error}. Se usará un DataFrame vacío."
+        )
+        return pd.DataFrame()
+
+
+def _read_repo_csv_flexible(repo, ruta: str, nombre_archivo: str, source=None) -> pd.DataFrame:
     """
     Lee archivos CSV desde GitHub incluso si son opcionales.
-    Usa BytesIO para asegurar que pandas los lea correctamente.
+    Usa BytesIO (o la ruta ya descargada en `source`) para que pandas los lea.
     """
     try:
-        content, _ = _get_repo_file_content(repo, ruta, nombre_archivo)
+        content = (
+            source if source is not None else _get_repo_file_content(repo, ruta, nombre_archivo)[0]
+        )
 
-        if content is None or len(content) == 0:
+        if content is None or _source_length(content) == 0:
             st.warning(f"⚠️ Archivo opcional vacío: {nombre_archivo}. Se usará un DataFrame vacío.")
             return pd.DataFrame()
 
         # Intentar leer con varios encodings
         encodings = ["utf-8", "utf-8-sig", "latin1", "iso-8859-1"]
-        for enc in encodings:
-            try:
-                return pd.read_csv(BytesIO(content), encoding=enc)
-            except Exception:
-                continue
+        with _span(f"Lectura CSV · {nombre_archivo}") as span:
+            for enc in encodings:
+                try:
+                    df = pd.read_csv(_csv_source_handle(content), encoding=enc)
+                    span["Filas"] = len(df)
+                    return df
+                except Exception:
+                    continue
 
         st.warning(f"⚠️ No se pudo leer {nombre_archivo}. Se usará DataFrame vacío.")
         return pd.DataFrame()
@@ -3232,7 +3233,7 @@ def _get_repo_file_content(repo, ruta: str, nombre_archivo: str) -> tuple[bytes,
             f"El archivo {nombre_archivo} no fue subido ni existe en GitHub."
         )
     try:
-        contents = repo.get_contents(ruta)
+        content, blob_sha = _read_mirrored_repo_file(repo, ruta, nombre_archivo)
     except GithubException as gh_error:
         if getattr(gh_error, "status", None) == 404:
             raise ValueError(
@@ -3246,20 +3247,147 @@ def _get_repo_file_content(repo, ruta: str, nombre_archivo: str) -> tuple[bytes,
         )
         st.error(f"❌ Error al descargar {ruta}: {mensaje_error}")
         raise
-    content = _extract_content_bytes(contents, nombre_archivo)
     _validate_repo_content(content, nombre_archivo)
-    return content, contents.sha
+    return content, blob_sha
 
 
-def _upload_to_repo(repo, path: str, content_bytes: bytes, existing_sha: Optional[str] = None) -> bool:
-    if repo is None:
+def _git_blob_sha(content: bytes) -> str:
+    """SHA que git le asigna al blob (sha1 de "blob <len>\\0" + contenido)."""
+    digest = hashlib.sha1(f"blob {len(content)}\0".encode("ascii"))
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def _head_blob_shas(repo, head, paths) -> dict[str, Optional[str]]:
+    """SHA del blob de cada ruta en el árbol de `head` (None si no existe)."""
+    tree = repo.get_git_tree(head.tree.sha, recursive=True)
+    blobs = {element.path: element.sha for element in tree.tree if element.type == "blob"}
+    return {path: blobs.get(path) for path in paths}
+
+
+class _CommitConflict(Exception):
+    """Una ruta del commit cambió en GitHub respecto del blob con el que se partió."""
+
+    def __init__(self, paths: list[str]):
+        super().__init__(", ".join(paths))
+        self.paths = paths
+
+
+def _commit_files(
+    repo,
+    files: dict[str, Optional[bytes]],
+    message: str,
+    expected_shas: Optional[dict[str, Optional[str]]] = None,
+) -> None:
+    """
+    Sube varios archivos en un solo commit con la API de datos de git: crea los
+    blobs en paralelo, arma un árbol sobre el del head y mueve la rama una vez
+    (fast-forward). Los archivos idénticos a los del head se omiten y los
+    blobs que el repo ya tiene no se vuelven a subir; un contenido None borra
+    esa ruta en el mismo commit.
+
+    Cada ruta se escribe solo si en el head sigue el blob de partida (el del
+    índice recién refrescado, o el de `expected_shas`, p. ej. el SHA con el que
+    se leyó el archivo; None = la ruta no debe existir). Si la rama avanzó se
+    reintenta sobre el nuevo head siempre que esas rutas no hayan cambiado; si
+    cambiaron lanza _CommitConflict sin escribir nada. No toca st.*.
+    """
+    with _span(f"Commit GitHub · {len(files)} archivo(s)") as span:
+        span["Bytes"] = sum(len(content) for content in files.values() if content is not None)
+        index = _repo_tree_index(repo, force_refresh=True)
+        index_files = index["files"]
+        local_shas = {
+            path: _git_blob_sha(content) if content is not None else None
+            for path, content in files.items()
+        }
+        changed = {
+            path: blob_sha
+            for path, blob_sha in local_shas.items()
+            if index_files.get(path, {}).get("sha") != blob_sha
+        }
+        base_shas = {path: index_files.get(path, {}).get("sha") for path in changed}
+        base_shas.update(
+            {path: sha for path, sha in (expected_shas or {}).items() if path in files}
+        )
+        conflicts = [
+            path
+            for path, sha in base_shas.items()
+            if index_files.get(path, {}).get("sha") != sha
+        ]
+        if conflicts:
+            raise _CommitConflict(conflicts)
+        if not changed:
+            return
+
+        known_blobs = {entry["sha"] for entry in index_files.values()}
+        pending = {
+            path
+            for path, blob_sha in changed.items()
+            if blob_sha is not None and blob_sha not in known_blobs
+        }
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(pending))) as pool:
+                futures = {
+                    # copy_context: los hilos heredan la acción en curso para el conteo de llamadas
+                    pool.submit(
+                        copy_context().run,
+                        repo.create_git_blob,
+                        base64.b64encode(files[path]).decode("ascii"),
+                        "base64",
+                    ): path
+                    for path in pending
+                }
+                for future in as_completed(futures):
+                    created = future.result()
+                    if created.sha != changed[futures[future]]:
+                        raise ValueError(f"GitHub devolvió otro SHA para {futures[future]}.")
+
+        elements = [
+            InputGitTreeElement(path, "100644", "blob", sha=blob_sha)
+            for path, blob_sha in changed.items()
+        ]
+        for attempt in range(COMMIT_MAX_ATTEMPTS):
+            ref = repo.get_git_ref(f"heads/{REPO_BRANCH}")
+            head = repo.get_git_commit(ref.object.sha)
+            if head.sha != index["head"]:
+                # La rama avanzó: solo se rehace encima si nadie tocó estas rutas
+                conflicts = [
+                    path
+                    for path, sha in _head_blob_shas(repo, head, base_shas).items()
+                    if sha != base_shas[path]
+                ]
+                if conflicts:
+                    _invalidate_repo_index()
+                    raise _CommitConflict(conflicts)
+            tree = repo.create_git_tree(elements, base_tree=head.tree)
+            commit = repo.create_git_commit(message, tree, [head])
+            try:
+                ref.edit(commit.sha)
+                break
+            except GithubException as gh_error:
+                # 422: la rama se movió (no es fast-forward); reintentar sobre el nuevo head
+                if getattr(gh_error, "status", None) != 422 or attempt == COMMIT_MAX_ATTEMPTS - 1:
+                    raise
+    _invalidate_repo_index()
+
+
+def _commit_files_to_repo(
+    repo,
+    files: dict[str, Optional[bytes]],
+    message: str,
+    expected_shas: Optional[dict[str, Optional[str]]] = None,
+) -> bool:
+    """_commit_files con los errores (conflictos incluidos) mostrados en la página."""
+    if repo is None or not files:
         return False
     try:
-        if existing_sha:
-            repo.update_file(path, "Actualiza archivo de participante", content_bytes, existing_sha, branch="main")
-        else:
-            repo.create_file(path, "Agrega archivo de participante", content_bytes, branch="main")
+        _commit_files(repo, files, message, expected_shas)
         return True
+    except _CommitConflict as conflict:
+        st.error(
+            f"❌ Conflicto: {conflict} cambió en GitHub desde que se leyó; "
+            "no se sobrescribió. Refresca e inténtalo de nuevo."
+        )
     except GithubException as gh_error:
         datos_error = getattr(gh_error, "data", {})
         mensaje_error = (
@@ -3267,9 +3395,9 @@ def _upload_to_repo(repo, path: str, content_bytes: bytes, existing_sha: Optiona
             if isinstance(datos_error, dict)
             else str(gh_error)
         )
-        st.error(f"❌ Error al subir {path}: {mensaje_error}")
+        st.error(f"❌ Error al subir {', '.join(files)}: {mensaje_error}")
     except Exception as generic_error:
-        st.error(f"❌ Error inesperado al subir {path}: {generic_error}")
+        st.error(f"❌ Error inesperado al subir {', '.join(files)}: {generic_error}")
     return False
 
 
@@ -3277,8 +3405,7 @@ def _download_repo_file(repo, path: str) -> tuple[Optional[bytes], Optional[str]
     if repo is None:
         return None, None
     try:
-        contents = repo.get_contents(path)
-        return base64.b64decode(contents.content), contents.sha
+        return _read_mirrored_repo_file(repo, path, Path(path).name)
     except GithubException as gh_error:
         if getattr(gh_error, "status", None) != 404:
             datos_error = getattr(gh_error, "data", {})
@@ -3293,118 +3420,298 @@ def _download_repo_file(repo, path: str) -> tuple[Optional[bytes], Optional[str]
     return None, None
 
 
-def _load_results_dataframe(repo, force_refresh: bool = False) -> tuple[pd.DataFrame, Optional[str]]:
+def _result_record_path(persona_id: str) -> str:
+    nombre = re.sub(r"[^\w\-]+", "_", persona_id.strip()).strip("_") or "registro"
+    return f"{RESULTS_RECORDS_DIR}/{nombre}.json"
+
+
+def _is_result_record_path(path: str) -> bool:
+    return path.startswith(f"{RESULTS_RECORDS_DIR}/") and path.endswith(".json")
+
+
+def _normalizar_genero(valor: str) -> str:
+    genero = (
+        unicodedata.normalize("NFKD", str(valor))
+        .encode("ascii", "ignore")
+        .decode("ascii")
+        .strip()
+        .upper()
+    )
+    if genero in {"M", "MALE", "HOMBRE", "MASCULINO"}:
+        return "MASCULINO"
+    if genero in {"F", "FEMALE", "MUJER", "FEMENINO", "FEMENINA"}:
+        return "FEMENINO"
+    return "OTRO"
+
+
+def _asignacion_grupos(df: pd.DataFrame) -> dict:
+    """Balancea Con/Sin SmartScore por género y cuartil de edad; no toca `df`."""
+    columnas_minimas = ["Nombre Completo", "Edad", "Género", "Grupo_Experimental"]
+    for columna in columnas_minimas:
+        if columna not in df.columns:
+            return {"status": "error", "msg": f"Falta columna: {columna}"}
+
+    df_clean = df.dropna(subset=["Edad", "Género"]).copy()
+    df_clean.loc[:, "Edad"] = pd.to_numeric(df_clean["Edad"], errors="coerce")
+    df_clean = df_clean.dropna(subset=["Edad"]).copy()
+
+    if df_clean.empty:
+        return {
+            "status": "error",
+            "msg": "No hay registros válidos para asignar grupos.",
+        }
+
+    df_clean.loc[:, "Género_Normalizado"] = df_clean["Género"].map(_normalizar_genero)
+
+    max_cuartiles = min(4, df_clean["Edad"].nunique())
+    if max_cuartiles <= 1:
+        df_clean.loc[:, "Edad_Cuartil"] = 0
+    else:
+        try:
+            df_clean.loc[:, "Edad_Cuartil"] = pd.qcut(
+                df_clean["Edad"],
+                q=max_cuartiles,
+                labels=False,
+                duplicates="drop",
+            )
+        except ValueError:
+            df_clean = df_clean.sort_values("Edad").reset_index()
+            df_clean.loc[:, "Edad_Cuartil"] = pd.cut(
+                np.arange(len(df_clean)),
+                bins=max_cuartiles,
+                labels=False,
+                include_lowest=True,
+            )
+            df_clean = df_clean.set_index("index")
+
+    df_clean.loc[:, "Edad_Cuartil"] = df_clean["Edad_Cuartil"].astype(int)
+
+    asignacion: dict[int, str] = {}
+    con_indices: list[int] = []
+    sin_indices: list[int] = []
+    rng = random.Random(42)
+
+    for (genero, cuartil), group in df_clean.groupby(
+        ["Género_Normalizado", "Edad_Cuartil"],
+        sort=True,
+    ):
+        indices = list(group.index)
+        if not indices:
+            continue
+
+        rng.shuffle(indices)
+        base = len(indices) // 2
+        con_count = base
+        sin_count = base
+
+        if len(indices) % 2:
+            if len(con_indices) <= len(sin_indices):
+                con_count += 1
+            else:
+                sin_count += 1
+
+        for idx in indices[:con_count]:
+            asignacion[idx] = "Con SmartScore"
+            con_indices.append(idx)
+
+        for idx in indices[con_count : con_count + sin_count]:
+            asignacion[idx] = "Sin SmartScore"
+            sin_indices.append(idx)
+
+    while abs(len(con_indices) - len(sin_indices)) > 1:
+        if len(con_indices) > len(sin_indices):
+            idx = con_indices.pop()
+            asignacion[idx] = "Sin SmartScore"
+            sin_indices.append(idx)
+        else:
+            idx = sin_indices.pop()
+            asignacion[idx] = "Con SmartScore"
+            con_indices.append(idx)
+
+    return {"status": "ok", "asignacion": asignacion}
+
+
+def _reequilibrar_grupos(df: pd.DataFrame) -> pd.DataFrame:
+    """Copia de `df` con Grupo_Experimental reequilibrado; `df` tal cual si no se puede."""
+    resultado = _asignacion_grupos(df)
+    if resultado["status"] != "ok":
+        return df
+    df = df.copy()
+    df["Grupo_Experimental"] = df["Grupo_Experimental"].astype(object)
+    for idx, grupo in resultado["asignacion"].items():
+        df.at[idx, "Grupo_Experimental"] = grupo
+    return df
+
+
+def _load_result_records(repo) -> tuple[pd.DataFrame, dict[str, str]]:
+    """
+    Registros del cuestionario aún no compactados (un JSON por envío), en
+    orden de envío, y el SHA de cada uno. Salen del espejo de blobs, así que
+    solo los nuevos se descargan.
+    """
+    index_files = _repo_tree_index(repo)["files"]
+    record_shas = {
+        path: index_files[path]["sha"] for path in sorted(index_files) if _is_result_record_path(path)
+    }
+    registros = []
+    for path in record_shas:
+        contenido, _ = _read_mirrored_repo_file(repo, path, Path(path).name)
+        registros.append(json.loads(contenido.decode("utf-8")))
+    records = pd.DataFrame(registros)
+    if "Fecha" in records.columns:
+        # El reequilibrio depende del orden de las filas: el mismo en que se agregaban al Excel
+        records = records.sort_values("Fecha", kind="stable").reset_index(drop=True)
+    return records, record_shas
+
+
+def _merge_result_records(compacted: pd.DataFrame, records: pd.DataFrame) -> pd.DataFrame:
+    """Excel compactado más los registros cuyo ID todavía no está en él."""
+    if records.empty:
+        return compacted
+    if "ID_Participante" in compacted.columns and "ID_Participante" in records.columns:
+        records = records[~records["ID_Participante"].isin(compacted["ID_Participante"])]
+    merged = pd.concat([compacted, records], ignore_index=True)
+    return _reorder_person_columns(merged)
+
+
+def _read_results_table(
+    repo, force_refresh: bool = False
+) -> tuple[pd.DataFrame, dict[str, Optional[str]]]:
+    """
+    Tabla de resultados vigente: Resultados_SmartScore.xlsx compactado unido a
+    los registros más nuevos. Cada envío reequilibraba los grupos de toda la
+    tabla; si hay registros pendientes ese reequilibrio se aplica aquí, así
+    que la tabla es la misma que si cada envío hubiera reescrito el Excel.
+    Devuelve también las versiones leídas (ruta → SHA del blob; None si no
+    existe) del Excel y de cada registro, para compactar sin pisar cambios
+    concurrentes.
+    """
+    try:
+        contenido, results_sha = _read_mirrored_repo_file(
+            repo, RESULTS_PATH_IN_REPO, "Resultados_SmartScore.xlsx", force_refresh=force_refresh
+        )
+        compacted = pd.read_excel(BytesIO(contenido))
+    except GithubException as gh_error:
+        if getattr(gh_error, "status", None) != 404:
+            raise
+        compacted, results_sha = pd.DataFrame(), None
+    records, record_shas = _load_result_records(repo)
+    tabla = _merge_result_records(compacted, records)
+    if record_shas:
+        tabla = _reequilibrar_grupos(tabla)
+    return tabla, {RESULTS_PATH_IN_REPO: results_sha, **record_shas}
+
+
+def _write_results_workbook(
+    repo, df: pd.DataFrame, versiones: dict[str, Optional[str]], message: str
+) -> bool:
+    """
+    Compactación: escribe el Excel con `df` y borra en el mismo commit los
+    registros leídos. Falla con conflicto si el Excel o alguno de esos
+    registros cambió; los registros nuevos quedan pendientes.
+    """
+    files: dict[str, Optional[bytes]] = {
+        RESULTS_PATH_IN_REPO: _df_to_excel_bytes(_reorder_person_columns(df)),
+    }
+    files.update({path: None for path in versiones if _is_result_record_path(path)})
+    return _commit_files_to_repo(repo, files, message, expected_shas=versiones)
+
+
+def _load_results_dataframe(
+    repo, force_refresh: bool = False
+) -> tuple[pd.DataFrame, dict[str, Optional[str]]]:
     cache_key = "admin_results_cache"
     cache = st.session_state.get(cache_key)
     if not force_refresh and isinstance(cache, dict):
         cached_df = cache.get("df")
-        cached_sha = cache.get("sha")
         if isinstance(cached_df, pd.DataFrame):
-            return cached_df, cached_sha
+            return cached_df, cache.get("versiones", {})
 
     if repo is None:
-        return pd.DataFrame(), None
+        return pd.DataFrame(), {}
 
     try:
-        contents = repo.get_contents(RESULTS_PATH_IN_REPO)
-        excel_bytes = base64.b64decode(contents.content)
-        df = pd.read_excel(BytesIO(excel_bytes))
+        # force_refresh también revisa el head del repo sin esperar el TTL del índice
+        df, versiones = _read_results_table(repo, force_refresh=force_refresh)
+        if df.empty and versiones.get(RESULTS_PATH_IN_REPO) is None:
+            st.error("No se encontró 'Resultados_SmartScore.xlsx' en el repositorio.")
+            return pd.DataFrame(), {}
         df = _reorder_person_columns(df)
-        st.session_state[cache_key] = {"df": df, "sha": contents.sha}
-        return df, contents.sha
+        st.session_state[cache_key] = {"df": df, "versiones": versiones}
+        return df, versiones
     except GithubException as gh_error:
-        status = getattr(gh_error, "status", None)
-        if status == 404:
-            st.error("No se encontró 'Resultados_SmartScore.xlsx' en el repositorio.")
-        else:
-            datos_error = getattr(gh_error, "data", {})
-            mensaje_error = (
-                datos_error.get("message", str(gh_error))
-                if isinstance(datos_error, dict)
-                else str(gh_error)
-            )
-            st.error(
-                f"❌ Error al leer 'Resultados_SmartScore.xlsx' desde GitHub: {mensaje_error}"
-            )
+        datos_error = getattr(gh_error, "data", {})
+        mensaje_error = (
+            datos_error.get("message", str(gh_error))
+            if isinstance(datos_error, dict)
+            else str(gh_error)
+        )
+        st.error(
+            f"❌ Error al leer 'Resultados_SmartScore.xlsx' desde GitHub: {mensaje_error}"
+        )
     except Exception as generic_error:
         st.error(
             f"❌ Error inesperado al leer 'Resultados_SmartScore.xlsx': {generic_error}"
         )
 
-    return pd.DataFrame(), None
+    return pd.DataFrame(), {}
 
 
 def _save_results_dataframe(
-    repo, df: pd.DataFrame, sha: Optional[str], message: str
+    repo, df: pd.DataFrame, versiones: dict[str, Optional[str]], message: str
 ) -> bool:
-    if repo is None:
-        return False
-    if not sha:
+    """Guarda la tabla completa (compactando los registros leídos) si nada de lo leído cambió."""
+    if repo is None or not versiones:
         st.error("No se pudo determinar la versión actual del archivo en GitHub.")
         return False
+    return _write_results_workbook(repo, df, versiones, message)
+
 
+def _compact_result_records(repo) -> dict:
+    """
+    Pasa los registros pendientes al Excel de resultados, con los grupos
+    reequilibrados que ya muestra _read_results_table.
+    """
     try:
-        repo.update_file(
-            RESULTS_PATH_IN_REPO,
-            message,
-            _df_to_excel_bytes(_reorder_person_columns(df)),
-            sha,
-            branch="main",
-        )
-        return True
+        df, versiones = _read_results_table(repo, force_refresh=True)
     except GithubException as gh_error:
         datos_error = getattr(gh_error, "data", {})
-        mensaje_error = (
+        mensaje = (
             datos_error.get("message", str(gh_error))
             if isinstance(datos_error, dict)
             else str(gh_error)
         )
-        st.error(
-            "❌ No se pudo guardar el Excel de resultados en GitHub. "
-            f"Detalle: {mensaje_error}"
-        )
-    except Exception as generic_error:
-        st.error(
-            "❌ Ocurrió un error inesperado al guardar el Excel de resultados. "
-            f"Detalle: {generic_error}"
-        )
-    return False
+        return {"status": "error", "msg": mensaje}
+    except Exception as read_error:
+        return {"status": "error", "msg": f"No se pudo leer el archivo: {read_error}"}
+
+    if df.empty:
+        return {"status": "error", "msg": "No hay registros para compactar."}
+
+    if not _write_results_workbook(
+        repo, df, versiones, "Compactación de registros de resultados"
+    ):
+        return {"status": "error", "msg": "No se pudo guardar el Excel de resultados compactado."}
+    return {"status": "ok", "compactados": sum(1 for path in versiones if _is_result_record_path(path))}
 
 
 def append_record_to_results(
     repo, ruta_archivo: str, nuevo_registro: pd.DataFrame, persona_nombre: str
 ) -> None:
-    try:
-        contents = repo.get_contents(ruta_archivo)
-    except GithubException as gh_error:
-        if gh_error.status == 404:
-            repo.create_file(
-                path=ruta_archivo,
-                message=f"Creación inicial de {ruta_archivo} ({persona_nombre})",
-                content=_df_to_excel_bytes(nuevo_registro),
-            )
-            return
-        raise
-
-    for intento in range(2):
-        excel_data = base64.b64decode(contents.content)
-        df_existente = pd.read_excel(BytesIO(excel_data))
-        df_existente = _reorder_person_columns(df_existente)
-        df_nuevo = pd.concat([df_existente, nuevo_registro], ignore_index=True)
-        df_nuevo = _reorder_person_columns(df_nuevo)
-        try:
-            repo.update_file(
-                path=ruta_archivo,
-                message=f"Actualización SmartScore desde Streamlit ({persona_nombre})",
-                content=_df_to_excel_bytes(df_nuevo),
-                sha=contents.sha,
-            )
-            return
-        except GithubException as update_error:
-            if update_error.status == 409 and intento == 0:
-                contents = repo.get_contents(ruta_archivo)
-                continue
-            raise
+    """
+    Guarda el envío como un registro JSON propio en `ruta_archivo` con un solo
+    create_file: no lee ni reescribe el Excel ni ningún otro archivo
+    compartido, así que envíos simultáneos no compiten por un mismo SHA.
+    Grupo_Experimental se reequilibra al leer la tabla (_read_results_table).
+    """
+    registro = nuevo_registro.iloc[0].to_dict()
+    repo.create_file(
+        path=ruta_archivo,
+        message=f"Registro SmartScore desde Streamlit ({persona_nombre})",
+        content=json.dumps(registro, ensure_ascii=False, indent=2, default=str).encode("utf-8"),
+        branch=REPO_BRANCH,
+    )
+    _invalidate_repo_index()
 
 
 def show_success_message(path: str) -> None:
@@ -3414,14 +3721,10 @@ def show_success_message(path: str) -> None:
     _trigger_streamlit_rerun()
 
 
-def _load_registered_names(path: Path) -> tuple[list[str], Optional[str]]:
-    if not path.exists():
-        return [], f"El archivo '{path}' no existe aún."
-
-    try:
-        df = pd.read_excel(path)
-    except Exception as error:
-        return [], f"No se pudo leer el archivo '{path}': {error}"
+def _load_registered_names() -> tuple[list[str], Optional[str]]:
+    df, error = _current_results_table()
+    if error:
+        return [], error
 
     if "Nombre Completo" not in df.columns:
         return [], "El archivo no contiene la columna 'Nombre Completo'."
@@ -3442,178 +3745,12 @@ def _load_registered_names(path: Path) -> tuple[list[str], Optional[str]]:
     return nombres_unicos, None
 
 
-def asignar_grupos_experimentales():
-    def _normalizar_genero(valor: str) -> str:
-        genero = (
-            unicodedata.normalize("NFKD", str(valor))
-            .encode("ascii", "ignore")
-            .decode("ascii")
-            .strip()
-            .upper()
-        )
-        if genero in {"M", "MALE", "HOMBRE", "MASCULINO"}:
-            return "MASCULINO"
-        if genero in {"F", "FEMALE", "MUJER", "FEMENINO", "FEMENINA"}:
-            return "FEMENINO"
-        return "OTRO"
-
-    if "GITHUB_TOKEN" not in st.secrets:
-        return {"status": "error", "msg": "Falta configurar GITHUB_TOKEN."}
-
-    try:
-        github_client = Github(st.secrets["GITHUB_TOKEN"])
-        repo = github_client.get_repo(REPO_FULL_NAME)
-    except GithubException as gh_error:
-        datos_error = getattr(gh_error, "data", {})
-        mensaje = (
-            datos_error.get("message", str(gh_error))
-            if isinstance(datos_error, dict)
-            else str(gh_error)
-        )
-        return {"status": "error", "msg": mensaje}
-    except Exception as generic_error:
-        return {"status": "error", "msg": str(generic_error)}
-
-    for intento in range(2):
-        try:
-            contents = repo.get_contents(RESULTS_PATH_IN_REPO)
-        except GithubException as gh_error:
-            if gh_error.status == 404:
-                return {
-                    "status": "error",
-                    "msg": "Archivo Resultados_SmartScore.xlsx no encontrado en GitHub.",
-                }
-            datos_error = getattr(gh_error, "data", {})
-            mensaje = (
-                datos_error.get("message", str(gh_error))
-                if isinstance(datos_error, dict)
-                else str(gh_error)
-            )
-            return {"status": "error", "msg": mensaje}
-
-        try:
-            excel_data = base64.b64decode(contents.content)
-            df = pd.read_excel(BytesIO(excel_data))
-        except Exception as read_error:
-            return {"status": "error", "msg": f"No se pudo leer el archivo: {read_error}"}
-
-        columnas_minimas = ["Nombre Completo", "Edad", "Género", "Grupo_Experimental"]
-        for columna in columnas_minimas:
-            if columna not in df.columns:
-                return {"status": "error", "msg": f"Falta columna: {columna}"}
-
-        df_clean = df.dropna(subset=["Edad", "Género"]).copy()
-        df_clean.loc[:, "Edad"] = pd.to_numeric(df_clean["Edad"], errors="coerce")
-        df_clean = df_clean.dropna(subset=["Edad"]).copy()
-
-        if df_clean.empty:
-            return {
-                "status": "error",
-                "msg": "No hay registros válidos para asignar grupos.",
-            }
-
-        df_clean.loc[:, "Género_Normalizado"] = df_clean["Género"].map(_normalizar_genero)
-
-        max_cuartiles = min(4, df_clean["Edad"].nunique())
-        if max_cuartiles <= 1:
-            df_clean.loc[:, "Edad_Cuartil"] = 0
-        else:
-            try:
-                df_clean.loc[:, "Edad_Cuartil"] = pd.qcut(
-                    df_clean["Edad"],
-                    q=max_cuartiles,
-                    labels=False,
-                    duplicates="drop",
-                )
-            except ValueError:
-                df_clean = df_clean.sort_values("Edad").reset_index()
-                df_clean.loc[:, "Edad_Cuartil"] = pd.cut(
-                    np.arange(len(df_clean)),
-                    bins=max_cuartiles,
-                    labels=False,
-                    include_lowest=True,
-                )
-                df_clean = df_clean.set_index("index")
-
-        df_clean.loc[:, "Edad_Cuartil"] = df_clean["Edad_Cuartil"].astype(int)
-
-        asignacion: dict[int, str] = {}
-        con_indices: list[int] = []
-        sin_indices: list[int] = []
-        rng = random.Random(42)
-
-        for (genero, cuartil), group in df_clean.groupby(
-            ["Género_Normalizado", "Edad_Cuartil"],
-            sort=True,
-        ):
-            indices = list(group.index)
-            if not indices:
-                continue
-
-            rng.shuffle(indices)
-            base = len(indices) // 2
-            con_count = base
-            sin_count = base
-
-            if len(indices) % 2:
-                if len(con_indices) <= len(sin_indices):
-                    con_count += 1
-                else:
-                    sin_count += 1
-
-            for idx in indices[:con_count]:
-                asignacion[idx] = "Con SmartScore"
-                con_indices.append(idx)
-
-            for idx in indices[con_count : con_count + sin_count]:
-                asignacion[idx] = "Sin SmartScore"
-                sin_indices.append(idx)
-
-        while abs(len(con_indices) - len(sin_indices)) > 1:
-            if len(con_indices) > len(sin_indices):
-                idx = con_indices.pop()
-                asignacion[idx] = "Sin SmartScore"
-                sin_indices.append(idx)
-            else:
-                idx = sin_indices.pop()
-                asignacion[idx] = "Con SmartScore"
-                con_indices.append(idx)
-
-        for idx, grupo in asignacion.items():
-            df.at[idx, "Grupo_Experimental"] = grupo
-
-        try:
-            repo.update_file(
-                path=RESULTS_PATH_IN_REPO,
-                message="Actualización automática de grupos experimentales",
-                content=_df_to_excel_bytes(df),
-                sha=contents.sha,
-            )
-            return {"status": "ok"}
-        except GithubException as update_error:
-            if update_error.status == 409 and intento == 0:
-                continue
-            datos_error = getattr(update_error, "data", {})
-            mensaje = (
-                datos_error.get("message", str(update_error))
-                if isinstance(datos_error, dict)
-                else str(update_error)
-            )
-            return {"status": "error", "msg": mensaje}
-        except Exception as generic_error:
-            return {"status": "error", "msg": str(generic_error)}
-
-    return {
-        "status": "error",
-        "msg": "Conflicto al guardar los cambios en GitHub tras múltiples intentos.",
-    }
-
-
-
-
 # =========================================================
 # INTERFACES
 # =========================================================
+if "GITHUB_TOKEN" in st.secrets:
+    _begin_github_action("Rerun de la página")
+
 tab_sequence = (
     [
         ("tab2", t("tab2_title")),
@@ -3801,7 +3938,9 @@ with tab1:
             persona_nombre = nombre_completo.strip()
             persona_edad = int(edad)
             persona_genero = GENDER_LABELS[st.session_state["language"]][genero]
-            persona_id = f"{persona_nombre}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            persona_id = (
+                f"{persona_nombre}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            )
             persona_grupo = ""
 
             st.session_state["tab1_persona_id"] = persona_id
@@ -3810,9 +3949,9 @@ with tab1:
             if "GITHUB_TOKEN" not in st.secrets:
                 st.warning(t("warning_github_token"))
             else:
+                _begin_github_action("Registro del cuestionario")
                 try:
-                    github_client = Github(st.secrets["GITHUB_TOKEN"])
-                    repo = github_client.get_repo(REPO_FULL_NAME)
+                    repo = _github_repo()
                 except GithubException as gh_error:
                     datos_repo = getattr(gh_error, "data", {})
                     mensaje_repo = (
@@ -3824,7 +3963,7 @@ with tab1:
                 except Exception as generic_error:
                     st.error(t("error_github_connection", error=generic_error))
                 else:
-                    ruta_archivo = RESULTS_PATH_IN_REPO
+                    ruta_archivo = _result_record_path(persona_id)
                     pesos_actuales = weights.copy()
                     topk_df = topk.sort_values(["Categoría__App", "SmartScore"], ascending=[True, False])
 
@@ -3873,31 +4012,11 @@ with tab1:
                     except Exception as update_error:
                         st.error(t("error_update_file", path=ruta_archivo, error=update_error))
                     else:
-                        assignment_feedback = None
-                        try:
-                            resultado_asignacion = asignar_grupos_experimentales()
-                        except Exception as assignment_error:
-                            assignment_feedback = (
-                                "warning",
-                                f"No se pudo reequilibrar 'Grupo_Experimental': {assignment_error}",
-                            )
-                        else:
-                            if resultado_asignacion.get("status") == "ok":
-                                assignment_feedback = (
-                                    "success",
-                                    "'Grupo_Experimental' reequilibrado para todos los participantes.",
-                                )
-                            else:
-                                assignment_feedback = (
-                                    "warning",
-                                    resultado_asignacion.get(
-                                        "msg",
-                                        "No se pudo completar el reequilibrio de grupos.",
-                                    ),
-                                )
-                        finally:
-                            if assignment_feedback:
-                                st.session_state["auto_assignment_feedback"] = assignment_feedback
+                        # La compactación al Excel corre desde el panel de administración
+                        st.session_state["auto_assignment_feedback"] = (
+                            "success",
+                            "'Grupo_Experimental' reequilibrado para todos los participantes.",
+                        )
                         show_success_message(ruta_archivo)
 
     st.markdown("---")
@@ -3916,7 +4035,7 @@ with tab2:
         st.header(t("tab2_header"))
         st.caption(t("tab2_caption"))
 
-    registered_names, names_error = _load_registered_names(Path(RESULTS_PATH_IN_REPO))
+    registered_names, names_error = _load_registered_names()
 
     if names_error:
         st.warning(names_error)
@@ -3976,6 +4095,7 @@ with tab2:
             if not participant_id:
                 participant_id = st.session_state.get("tab1_persona_id", "")
             persona_id = participant_id
+            _begin_github_action("Inicio del experimento")
             grupo = get_user_group(selected_name)
             if not grupo:
                 grupo = participant_group
@@ -4050,6 +4170,7 @@ with tab2:
                 upload_key = f"github_upload_{participant_id}"
                 if not st.session_state.get(upload_key, False):
                     excel_filename = f"experimento_{participant_id}.xlsx"
+                    _begin_github_action("Guardar resultados del experimento")
                     upload_success = guardar_excel_en_github(
                         excel_bytes, participant_id, excel_filename
                     )
@@ -4365,6 +4486,7 @@ file_labels = {
     "export_info": "export_info.csv",
     "video": "world.mp4",
     "excel_final": "Excel Final del Análisis",
+    "framewise_zip": "Gaze Framewise (ZIP)",
 }
 
 
@@ -4391,6 +4513,13 @@ with tab_admin:
     repo = _get_github_repo_instance()
     participant_ids = _list_github_participants(repo)
 
+    with st.expander("📡 Llamadas a la API de GitHub en esta sesión"):
+        st.caption(
+            "Peticiones por acción (cliente y repositorio compartidos por el proceso); "
+            "las del rerun actual se siguen sumando"
+        )
+        st.dataframe(_github_call_log(), hide_index=True)
+
     tab_delete, tab_participants = st.tabs(
         ["🗑️ Eliminar participantes", "👥 Participantes disponibles"]
     )
@@ -4400,10 +4529,29 @@ with tab_admin:
         refresh_results = st.button(
             "🔄 Refrescar resultados", key="refresh_results_excel"
         )
-        results_df, results_sha = _load_results_dataframe(
+        results_df, results_versions = _load_results_dataframe(
             repo, force_refresh=refresh_results
         )
 
+        pending_records = sum(1 for path in results_versions if _is_result_record_path(path))
+        if pending_records:
+            st.caption(
+                f"{pending_records} registro(s) del cuestionario aún no están en el Excel; "
+                f"se compactan automáticamente a partir de {RESULTS_COMPACT_EVERY}."
+            )
+            compact_now = st.button("🗜️ Compactar registros ahora", key="compact_result_records")
+            if compact_now or pending_records >= RESULTS_COMPACT_EVERY:
+                resultado_compactacion = _compact_result_records(repo)
+                if resultado_compactacion.get("status") == "ok":
+                    st.success(
+                        f"{resultado_compactacion['compactados']} registro(s) "
+                        "pasados a 'Resultados_SmartScore.xlsx'."
+                    )
+                    st.session_state.pop("admin_results_cache", None)
+                    results_df, results_versions = _load_results_dataframe(repo, force_refresh=True)
+                else:
+                    st.warning(resultado_compactacion.get("msg", "No se pudo compactar."))
+
         if results_df.empty:
             st.info(
                 "Aún no hay registros para mostrar o no se pudo leer el Excel de resultados."
@@ -4480,7 +4628,7 @@ with tab_admin:
                         guardado = _save_results_dataframe(
                             repo,
                             df_actualizado,
-                            results_sha,
+                            results_versions,
                             "Elimina participante desde panel de administración",
                         )
                         if guardado:
@@ -4503,14 +4651,13 @@ with tab_admin:
         with cols_top[1]:
             if st.button("🔄 Refrescar lista"):
                 participant_ids = _list_github_participants(repo, force_refresh=True)
-                st.session_state.pop("admin_status_cache", None)
                 _trigger_streamlit_rerun()
 
         if st.session_state.get("analysis_participant") != selected_id:
             st.session_state["analysis_participant"] = selected_id
             st.session_state.pop("analysis_result", None)
             st.session_state.pop("analysis_final_excel", None)
-            st.session_state.pop("analysis_video", None)
+            st.session_state.pop("analysis_framewise_zip", None)
     
         if not selected_id:
             st.info("Selecciona un participante para revisar sus archivos.")
@@ -4526,7 +4673,14 @@ with tab_admin:
         for key, label in file_labels.items():
             exists = status_map.get(key, {}).get("exists", False)
             symbol = "✔️" if exists else "❌"
-            status_rows.append({"Archivo": label, "Estado": symbol})
+            size = status_map.get(key, {}).get("size")
+            status_rows.append(
+                {
+                    "Archivo": label,
+                    "Estado": symbol,
+                    "Tamaño (KB)": round(size / 1024, 1) if size is not None else None,
+                }
+            )
         st.dataframe(pd.DataFrame(status_rows), hide_index=True)
     
         st.markdown("### ⬆️ Subir/actualizar archivos de Pupil Labs")
@@ -4565,15 +4719,15 @@ with tab_admin:
             submitted = st.form_submit_button("💾 Guardar archivos en GitHub")
     
         if submitted:
-            any_uploaded = False
-            for key, file_obj in uploaded_files.items():
-                if file_obj is None:
-                    continue
-                path = expected_paths[key]
-                sha = status_map.get(key, {}).get("sha")
-                success = _upload_to_repo(repo, path, file_obj.getvalue(), sha)
-                if success:
-                    any_uploaded = True
+            # Todo el export de Pupil Labs va en un solo commit
+            files_to_commit = {
+                expected_paths[key]: file_obj.getvalue()
+                for key, file_obj in uploaded_files.items()
+                if file_obj is not None
+            }
+            any_uploaded = bool(files_to_commit) and _commit_files_to_repo(
+                repo, files_to_commit, f"Archivos de Pupil Labs de {selected_id}"
+            )
             if any_uploaded:
                 st.success("Archivos subidos correctamente. Actualizando estado...")
                 status_map = _check_participant_files(repo, selected_id, force_refresh=True)
@@ -4595,111 +4749,189 @@ with tab_admin:
                 "Sube al menos gaze_positions.csv y world_timestamps.npy para poder ejecutar el análisis."
             )
     
+        framewise_in_excel = st.checkbox(
+            "Incluir Gaze_Framewise dentro del Excel final (más lento)",
+            value=False,
+            key="analysis_framewise_in_excel",
+            help="Por defecto el gaze por muestra se guarda aparte en un ZIP.",
+        )
         run_analysis = st.button(
             "🚀 Ejecutar análisis del participante",
             disabled=not analysis_ready,
         )
     
         if run_analysis and analysis_ready:
-            st.write("DEBUG ruta gaze →", expected_paths["gaze"])
-
-            try:
-                # === CARGA DE ARCHIVOS OBLIGATORIOS ===
-                excel_bytes, _ = _get_repo_file_content(
-                    repo, expected_paths["excel_experimento"], file_labels["excel_experimento"]
-                )
-
-                gaze_df = _read_repo_csv(
-                    repo, expected_paths["gaze"], file_labels["gaze"]
-                )
-
-                # === FIX: aceptar múltiples nombres de columna de tiempo ===
-                time_candidates = ["timestamp", "gaze_timestamp", "world_timestamp", "time", "gaze_time", "ts"]
-                found = None
-
-                for c in time_candidates:
-                    if c in gaze_df.columns:
-                        found = c
-                        break
-
-                if found is None:
-                    raise ValueError(
-                        "gaze_positions.csv no contiene una columna válida de tiempo."
-                    )
-
-                # renombrar siempre a 'timestamp'
-                if found != "timestamp":
-                    gaze_df = gaze_df.rename(columns={found: "timestamp"})
-
-                # validación final
-                if "timestamp" not in gaze_df.columns:
-                    raise ValueError("No se pudo crear columna timestamp en gaze_positions.csv.")
-
-                ts_bytes, _ = _get_repo_file_content(
-                    repo, expected_paths["timestamps"], file_labels["timestamps"]
-                )
-
-                fixations_df = _read_repo_csv(
-                    repo, expected_paths["fixations"], file_labels["fixations"]
-                )
-                if "start_timestamp" in fixations_df.columns:
-                    fixations_df = fixations_df.rename(columns={"start_timestamp": "timestamp"})
-
-                fixation_report_df = _read_repo_csv(
-                    repo, expected_paths["fixation_report"], file_labels["fixation_report"]
-                )
-                if "start_timestamp" in fixation_report_df.columns and "timestamp" not in fixation_report_df.columns:
-                    fixation_report_df = fixation_report_df.rename(columns={"start_timestamp": "timestamp"})
-
-                # === ARCHIVOS OPCIONALES ===
+            _begin_github_action(f"Análisis · {selected_id}")
+            # Tiempo, filas y memoria por etapa (descargas, lectura, análisis, exportación)
+            results = None
+            with _recording_spans() as spans:
                 try:
-                    video_bytes, _ = _get_repo_file_content(
-                        repo, expected_paths["video"], file_labels["video"]
+                    # world_timestamps.npy: caché local por SHA, abierto con mmap
+                    timestamps_sha = status_map.get("timestamps", {}).get("sha")
+                    with _span("world_timestamps desde caché local"):
+                        world_ts = _cached_world_timestamps(timestamps_sha)
+                    gaze_sha = status_map.get("gaze", {}).get("sha")
+                    gaze_cached = _load_cached_gaze(gaze_sha) is not None
+
+                    # Todo lo que no está en caché local se descarga a la vez
+                    downloads = _download_participant_files(
+                        [
+                            key
+                            for key in [
+                                "excel_experimento",
+                                "gaze",
+                                "timestamps",
+                                "fixations",
+                                "fixation_report",
+                                "pupil",
+                                "blink_report",
+                                "blinks_file",
+                                "export_info",
+                            ]
+                            if not (key == "gaze" and gaze_cached)
+                            and not (key == "timestamps" and world_ts is not None)
+                        ],
+                        status_map,
+                        file_labels,
                     )
-                except:
-                    st.warning("⚠️ No se encontró world.mp4. El análisis continuará sin video.")
-                    video_bytes = None
 
-                pupil_df = _read_repo_csv_flexible(repo, expected_paths["pupil"], file_labels["pupil"])
-                if not pupil_df.empty and "pupil_timestamp" in pupil_df.columns:
-                    pupil_df = pupil_df.rename(columns={"pupil_timestamp": "timestamp"})
+                    # === CARGA DE ARCHIVOS OBLIGATORIOS ===
+                    excel_source = _downloaded_source(downloads, "excel_experimento")
+                    if excel_source is None:
+                        excel_source, _ = _get_repo_file_content(
+                            repo, expected_paths["excel_experimento"], file_labels["excel_experimento"]
+                        )
 
-                blink_df = _read_repo_csv_flexible(
-                    repo, expected_paths["blink_report"], file_labels["blink_report"]
-                )
-                blinks_file_df = _read_repo_csv_flexible(
-                    repo, expected_paths["blinks_file"], file_labels["blinks_file"]
-                )
-                export_info_df = _read_repo_csv_flexible(
-                    repo, expected_paths["export_info"], file_labels["export_info"]
-                )
+                    # Lectura por bloques: columnas mínimas, filtro de confianza y dt
+                    gaze_df = _read_repo_gaze_csv(
+                        repo,
+                        expected_paths["gaze"],
+                        file_labels["gaze"],
+                        blob_sha=gaze_sha,
+                        source=_downloaded_source(downloads, "gaze"),
+                    )
 
-                # === PROCESAMIENTO ===
-                excel_df = pd.read_excel(BytesIO(excel_bytes), sheet_name="Resumen")
-                world_ts = np.load(BytesIO(ts_bytes), allow_pickle=False)
-
-                results = integrate_app_with_pupil(
-                    excel_df=excel_df,
-                    gaze_df=gaze_df,
-                    world_ts=world_ts,
-                    fixations_df=fixations_df,
-                    fixation_report_df=fixation_report_df,
-                    blink_df=blink_df,
-                    pupil_df=pupil_df,
-                    export_info_df=export_info_df,
-                )
+                    if world_ts is None:
+                        ts_source = _downloaded_source(downloads, "timestamps")
+                        downloaded_sha = timestamps_sha
+                        if ts_source is None:
+                            ts_source, downloaded_sha = _get_repo_file_content(
+                                repo, expected_paths["timestamps"], file_labels["timestamps"]
+                            )
+                        world_ts = _cached_world_timestamps(
+                            downloaded_sha or timestamps_sha,
+                            ts_source.read_bytes() if isinstance(ts_source, Path) else ts_source,
+                        )
 
-                st.success("Análisis completado correctamente.")
-                st.session_state["analysis_result"] = results
-                st.session_state["analysis_video"] = video_bytes
+                    fixations_df = _read_repo_csv(
+                        repo,
+                        expected_paths["fixations"],
+                        file_labels["fixations"],
+                        source=_downloaded_source(downloads, "fixations"),
+                    )
+                    if "start_timestamp" in fixations_df.columns:
+                        fixations_df = fixations_df.rename(columns={"start_timestamp": "timestamp"})
+
+                    fixation_report_df = _read_repo_csv(
+                        repo,
+                        expected_paths["fixation_report"],
+                        file_labels["fixation_report"],
+                        source=_downloaded_source(downloads, "fixation_report"),
+                    )
+                    if "start_timestamp" in fixation_report_df.columns and "timestamp" not in fixation_report_df.columns:
+                        fixation_report_df = fixation_report_df.rename(columns={"start_timestamp": "timestamp"})
+
+                    # === ARCHIVOS OPCIONALES ===
+                    # world.mp4 no se descarga aquí: solo al abrir la vista previa
+                    if not status_map.get("video", {}).get("exists"):
+                        st.warning("⚠️ No se encontró world.mp4. El análisis continuará sin video.")
+
+                    pupil_df = _read_repo_pupil_csv(
+                        repo,
+                        expected_paths["pupil"],
+                        file_labels["pupil"],
+                        source=_downloaded_source(downloads, "pupil"),
+                    )
 
-                final_excel_bytes = export_final_excel(results)
-                _upload_to_repo(repo, expected_paths["excel_final"], final_excel_bytes, None)
+                    blink_df = _read_repo_csv_flexible(
+                        repo,
+                        expected_paths["blink_report"],
+                        file_labels["blink_report"],
+                        source=_downloaded_source(downloads, "blink_report"),
+                    )
+                    blinks_file_df = _read_repo_csv_flexible(
+                        repo,
+                        expected_paths["blinks_file"],
+                        file_labels["blinks_file"],
+                        source=_downloaded_source(downloads, "blinks_file"),
+                    )
+                    export_info_df = _read_repo_csv_flexible(
+                        repo,
+                        expected_paths["export_info"],
+                        file_labels["export_info"],
+                        source=_downloaded_source(downloads, "export_info"),
+                    )
 
-                st.session_state["analysis_final_excel"] = final_excel_bytes
+                    # === PROCESAMIENTO ===
+                    with _span("Lectura Excel del experimento") as span:
+                        excel_df = pd.read_excel(_csv_source_handle(excel_source), sheet_name="Resumen")
+                        span["Filas"] = len(excel_df)
+
+                    with _span("integrate_app_with_pupil") as span:
+                        results = integrate_app_with_pupil(
+                            excel_df=excel_df,
+                            gaze_df=gaze_df,
+                            world_ts=world_ts,
+                            fixations_df=fixations_df,
+                            fixation_report_df=fixation_report_df,
+                            blink_df=blink_df,
+                            pupil_df=pupil_df,
+                            export_info_df=export_info_df,
+                            input_shas={
+                                "gaze": status_map.get("gaze", {}).get("sha"),
+                                "timestamps": status_map.get("timestamps", {}).get("sha"),
+                                "fixations": status_map.get("fixations", {}).get("sha"),
+                                "pupil": status_map.get("pupil", {}).get("sha"),
+                            },
+                        )
+                        span["Filas"] = len(results["framewise_gaze"])
+
+                    st.success("Análisis completado correctamente.")
+                    cache_stats = results.get("analysis_cache") or {}
+                    if cache_stats.get("screens"):
+                        st.caption(
+                            f"Pantallas recalculadas: {cache_stats['screens_recomputed']} de "
+                            f"{cache_stats['screens']} (el resto se reutilizó de la caché)."
+                        )
+                    st.session_state["analysis_result"] = results
 
-            except Exception as error:
-                st.error(f"No se pudo procesar el análisis: {error}")
+                    with _span("Exportación Excel final") as span:
+                        final_excel_bytes = export_final_excel(
+                            results, include_framewise=framewise_in_excel
+                        )
+                        span["Bytes"] = len(final_excel_bytes)
+                    analysis_files = {expected_paths["excel_final"]: final_excel_bytes}
+                    framewise_zip_bytes = None
+                    if not framewise_in_excel:
+                        with _span("Exportación Gaze_Framewise (ZIP)") as span:
+                            framewise_zip_bytes = export_framewise_archive(results)
+                            span["Filas"] = len(results["framewise_gaze"])
+                            span["Bytes"] = len(framewise_zip_bytes)
+                        analysis_files[expected_paths["framewise_zip"]] = framewise_zip_bytes
+                    _commit_files_to_repo(
+                        repo, analysis_files, f"Análisis final de {selected_id}"
+                    )
+                    st.session_state["analysis_final_excel"] = final_excel_bytes
+                    st.session_state["analysis_framewise_zip"] = framewise_zip_bytes
+
+                except Exception as error:
+                    st.error(f"No se pudo procesar el análisis: {error}")
+            stage_timings = _spans_table(spans)
+            if isinstance(results, dict):
+                results["stage_timings"] = stage_timings
+            else:
+                st.caption("Tiempos por etapa hasta el error:")
+                st.dataframe(stage_timings, hide_index=True)
 
 
 
@@ -4714,9 +4946,28 @@ with tab_admin:
             blinks_mode = analysis_result.get("blinks_per_mode", pd.DataFrame())
     
             st.markdown("#### 🔥 Heatmap simple")
-            heatmap_df = framewise.dropna(subset=["norm_pos_x", "norm_pos_y"]).copy()
-            if not heatmap_df.empty:
-                st.scatter_chart(heatmap_df, x="norm_pos_x", y="norm_pos_y")
+            # Solo la rejilla binned viaja al navegador; se calcula una vez por resultado
+            heatmaps = analysis_result.get("gaze_heatmaps")
+            if not isinstance(heatmaps, pd.DataFrame):
+                heatmaps = _compute_gaze_heatmaps(framewise)
+                analysis_result["gaze_heatmaps"] = heatmaps
+            if not heatmaps.empty:
+                heatmap_views = list(dict.fromkeys(heatmaps["Vista"]))
+                selected_view = st.selectbox(
+                    "Vista del heatmap", heatmap_views, key="analysis_heatmap_view"
+                )
+                heatmap_cell = 1.0 / HEATMAP_BINS
+                heatmap_chart = (
+                    alt.Chart(heatmaps[heatmaps["Vista"] == selected_view])
+                    .mark_rect()
+                    .encode(
+                        x=alt.X("x:Q", bin=alt.Bin(step=heatmap_cell), scale=alt.Scale(domain=[0, 1]), title="norm_pos_x"),
+                        y=alt.Y("y:Q", bin=alt.Bin(step=heatmap_cell), scale=alt.Scale(domain=[0, 1]), title="norm_pos_y"),
+                        color=alt.Color("Intensidad:Q", scale=alt.Scale(scheme="inferno")),
+                        tooltip=["x", "y", "Intensidad"],
+                    )
+                )
+                st.altair_chart(heatmap_chart, use_container_width=True)
             else:
                 st.caption(":gray[Sin muestras de gaze para graficar.]")
     
@@ -4725,15 +4976,22 @@ with tab_admin:
                 dwell_product = (
                     per_screen.groupby("Producto", as_index=False)["Dwell_Time"].sum()
                 )
+                fixation_column = (
+                    "Fixation_Count" if "Fixation_Count" in per_screen.columns else "Fixaciones"
+                )
                 fix_product = (
-                    per_screen.groupby("Producto", as_index=False)["Fixaciones"].sum()
+                    per_screen.groupby("Producto", as_index=False)[fixation_column].sum()
                 )
                 cols = st.columns(2)
                 with cols[0]:
                     st.caption("Tiempo de observación por producto")
                     st.bar_chart(dwell_product.set_index("Producto"))
                 with cols[1]:
-                    st.caption("Fijaciones por producto")
+                    st.caption(
+                        "Fijaciones por producto (fixations.csv)"
+                        if fixation_column == "Fixation_Count"
+                        else "Muestras de gaze por producto"
+                    )
                     st.bar_chart(fix_product.set_index("Producto"))
                 st.dataframe(per_screen)
             else:
@@ -4759,20 +5017,133 @@ with tab_admin:
             if isinstance(blinks_mode, pd.DataFrame) and not blinks_mode.empty:
                 st.dataframe(blinks_mode)
                 st.bar_chart(blinks_mode.set_index("Modo")["Blink_Rate_Hz"])
+                blinks_screen = analysis_result.get("blinks_per_screen", pd.DataFrame())
+                if isinstance(blinks_screen, pd.DataFrame) and not blinks_screen.empty:
+                    st.caption("Parpadeos y tiempo en parpadeo por pantalla")
+                    st.dataframe(blinks_screen)
             else:
                 st.caption(":gray[No se cargó archivo de parpadeos o no se detectaron eventos.]")
+
+            st.markdown("#### 🔀 Secuencia de mirada entre AOIs")
+            scanpath_mode = analysis_result.get("scanpath_per_mode", pd.DataFrame())
+            if isinstance(scanpath_mode, pd.DataFrame) and not scanpath_mode.empty:
+                st.caption(
+                    "Entropía estacionaria (reparto de visitas) y de transición (previsibilidad del recorrido)"
+                )
+                st.dataframe(scanpath_mode)
+                st.bar_chart(
+                    scanpath_mode.set_index("Modo")[["Stationary_Entropy", "Transition_Entropy"]]
+                )
+                transitions_mode = analysis_result.get("transitions_per_mode", pd.DataFrame())
+                if isinstance(transitions_mode, pd.DataFrame) and not transitions_mode.empty:
+                    selected_mode = st.selectbox(
+                        "Matriz de transiciones del modo",
+                        sorted(transitions_mode["Modo"].unique()),
+                        key="analysis_transition_mode",
+                    )
+                    st.dataframe(
+                        transitions_mode[transitions_mode["Modo"] == selected_mode]
+                        .pivot_table(
+                            index="From_AOI",
+                            columns="To_AOI",
+                            values="Transitions",
+                            aggfunc="sum",
+                            fill_value=0,
+                        )
+                    )
+            else:
+                st.caption(":gray[No hay visitas a AOIs para construir la secuencia.]")
+
+            stimuli = _screen_stimuli(analysis_result.get("df_app"))
+            stimuli = {
+                pantalla: stimulus for pantalla, stimulus in stimuli.items() if stimulus["block_aois"]
+            }
+            if stimuli:
+                st.markdown("#### 🖼️ Scanpath sobre el estímulo")
+                selected_screen = st.selectbox(
+                    "Pantalla", list(stimuli), key="analysis_overlay_screen"
+                )
+                stimulus = stimuli[selected_screen]
+                fixations_screen = analysis_result.get("fixations_per_screen", pd.DataFrame())
+                if isinstance(fixations_screen, pd.DataFrame) and not fixations_screen.empty:
+                    fixations_screen = fixations_screen[
+                        fixations_screen["Pantalla_ID"] == selected_screen
+                    ]
+                gaze_screen = (
+                    framewise[framewise["Pantalla_ID"] == selected_screen]
+                    if isinstance(framewise, pd.DataFrame) and "Pantalla_ID" in framewise.columns
+                    else None
+                )
+                try:
+                    overlay_path = render_scanpath_overlay(
+                        _sanitize_participant_id(analysis_result.get("df_app")),
+                        selected_screen,
+                        stimulus["block_aois"],
+                        _stimulus_images_for_products(stimulus["mode"], stimulus["products"]),
+                        fixations=fixations_screen,
+                        gaze=gaze_screen,
+                    )
+                except ImportError:
+                    st.info("Instala Pillow para dibujar el scanpath sobre las imágenes.")
+                except Exception as error:
+                    st.warning(f"⚠️ No se pudo dibujar el scanpath: {error}")
+                else:
+                    st.caption(
+                        "Fijaciones numeradas (tamaño ∝ duración) y sacadas sobre los productos de la pantalla"
+                        if isinstance(fixations_screen, pd.DataFrame) and not fixations_screen.empty
+                        else "Sin fixations.csv: se dibuja el gaze muestreado de la pantalla"
+                    )
+                    st.image(str(overlay_path), use_container_width=True)
+
+            st.markdown("#### 🔵 Diámetro de pupila")
+            pupil_screen = analysis_result.get("pupil_per_screen", pd.DataFrame())
+            if isinstance(pupil_screen, pd.DataFrame) and not pupil_screen.empty:
+                st.caption(
+                    "Media y pico por pantalla; *_Change descuenta la línea base de los primeros 500 ms"
+                )
+                st.dataframe(pupil_screen)
+                pupil_aoi = analysis_result.get("pupil_per_aoi", pd.DataFrame())
+                if isinstance(pupil_aoi, pd.DataFrame) and not pupil_aoi.empty:
+                    st.caption("Diámetro de pupila por AOI")
+                    st.dataframe(pupil_aoi)
+            else:
+                st.caption(":gray[No se cargó pupil_positions.csv o no hay muestras válidas.]")
     
-            if st.session_state.get("analysis_video"):
+            stage_timings = analysis_result.get("stage_timings")
+            if isinstance(stage_timings, pd.DataFrame) and not stage_timings.empty:
+                with st.expander("⏱️ Tiempos por etapa del análisis"):
+                    st.caption(
+                        "Tiempo de reloj, filas procesadas y pico de memoria trazada (tracemalloc) por etapa"
+                    )
+                    st.dataframe(stage_timings, hide_index=True)
+
+            video_status = status_map.get("video", {})
+            if video_status.get("exists"):
                 st.markdown("#### 🎬 Vista previa de world.mp4")
-                st.video(st.session_state["analysis_video"])
+                if st.checkbox("Mostrar video", key="analysis_show_video"):
+                    try:
+                        with st.spinner("Preparando world.mp4..."):
+                            video_path = _fetch_repo_video(
+                                repo,
+                                expected_paths["video"],
+                                file_labels["video"],
+                                blob_sha=video_status.get("sha"),
+                            )
+                    except Exception as error:
+                        video_path = None
+                        st.warning(f"⚠️ No se pudo descargar world.mp4: {error}")
+                    if video_path is not None:
+                        st.video(str(video_path))
     
             st.markdown("### 💾 Exportar resultados")
+            resumen_df = analysis_result.get("excel_resumen")
+            if not isinstance(resumen_df, pd.DataFrame):
+                resumen_df = analysis_result.get("df_app")
             participant_id = _sanitize_participant_id(
-                analysis_result.get("excel_resumen") or analysis_result.get("df_app")
-                or pd.DataFrame()
+                resumen_df if isinstance(resumen_df, pd.DataFrame) else pd.DataFrame()
             )
             excel_final = st.session_state.get("analysis_final_excel") or export_final_excel(
-                analysis_result
+                analysis_result, include_framewise=False
             )
             st.download_button(
                 "📥 Descargar Excel Final del Participante",
@@ -4781,3 +5152,12 @@ with tab_admin:
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 key="analysis_download_button",
             )
+            framewise_zip = st.session_state.get("analysis_framewise_zip")
+            if framewise_zip:
+                st.download_button(
+                    "📦 Descargar Gaze_Framewise (ZIP)",
+                    data=framewise_zip,
+                    file_name=f"gaze_framewise_{participant_id}.zip",
+                    mime="application/zip",
+                    key="analysis_framewise_download_button",
+                )
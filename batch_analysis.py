@@ -0,0 +1,247 @@
+# batch_analysis.py
+"""Análisis por lotes (sin Streamlit) de las carpetas en data_participantes/.
+
+Ejemplo:
+    python batch_analysis.py --workers 4 --output resultados_lote
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Optional
+
+import pandas as pd
+
+from pupil_analysis import (
+    _load_world_timestamps,
+    _stream_gaze_csv,
+    _stream_pupil_csv,
+    export_final_excel,
+    export_framewise_archive,
+    integrate_app_with_pupil,
+)
+
+DEFAULT_DATA_DIR = Path("data_participantes")
+DEFAULT_OUTPUT_DIR = Path("resultados_lote")
+COHORT_FILENAME = "cohorte_analisis.xlsx"
+COHORT_TABLES = [
+    ("AOI_Por_Pantalla", "per_screen"),
+    ("AOI_Por_Modo", "per_mode"),
+    ("Blinks_Por_Modo", "blinks_per_mode"),
+    ("Scanpath_Por_Modo", "scanpath_per_mode"),
+    ("Transiciones_Por_Modo", "transitions_per_mode"),
+    ("Pupil_Por_Pantalla", "pupil_per_screen"),
+    ("Pupil_Por_AOI", "pupil_per_aoi"),
+]
+
+logger = logging.getLogger("batch_analysis")
+
+
+def _find_participant_file(folder: Path, *names: str) -> Optional[Path]:
+    for name in names:
+        candidate = folder / name
+        if candidate.is_file() and candidate.stat().st_size > 0:
+            return candidate
+    return None
+
+
+def _read_optional_csv(path: Optional[Path]) -> Optional[pd.DataFrame]:
+    if path is None:
+        return None
+    try:
+        return pd.read_csv(path)
+    except Exception as error:
+        logger.warning("No se pudo leer %s: %s", path, error)
+        return None
+
+
+def analyze_participant_folder(
+    folder: str, output_dir: str, framewise_in_excel: bool = False
+) -> dict[str, Any]:
+    """
+    Corre integrate_app_with_pupil para una carpeta de participante y guarda su
+    Excel final (el gaze por muestra va aparte en un ZIP salvo que
+    `framewise_in_excel` sea True). Devuelve las tablas agregadas (no el gaze por muestra) para el
+    consolidado de la cohorte.
+    """
+    folder_path = Path(folder)
+    participant_id = folder_path.name
+    started = time.perf_counter()
+    summary: dict[str, Any] = {"ID_Participante": participant_id, "Estado": "ok", "Detalle": ""}
+
+    excel_path = _find_participant_file(folder_path, f"experimento_{participant_id}.xlsx")
+    if excel_path is None:
+        excel_path = next(iter(sorted(folder_path.glob("experimento_*.xlsx"))), None)
+    gaze_path = _find_participant_file(folder_path, "gaze_positions.csv")
+    timestamps_path = _find_participant_file(folder_path, "world_timestamps.npy")
+
+    missing = [
+        label
+        for label, path in (
+            ("experimento_*.xlsx", excel_path),
+            ("gaze_positions.csv", gaze_path),
+            ("world_timestamps.npy", timestamps_path),
+        )
+        if path is None
+    ]
+    if missing:
+        summary.update({"Estado": "omitido", "Detalle": "Faltan: " + ", ".join(missing)})
+        summary["Segundos"] = round(time.perf_counter() - started, 3)
+        return {"summary": summary, "tables": {}}
+
+    try:
+        excel_df = pd.read_excel(excel_path, sheet_name="Resumen")
+        gaze_df = _stream_gaze_csv(gaze_path, gaze_path.name)
+        world_ts = _load_world_timestamps(timestamps_path)
+        if world_ts is None:
+            raise ValueError("world_timestamps.npy vacío o inválido.")
+        fixations_df = _read_optional_csv(_find_participant_file(folder_path, "fixations.csv"))
+        fixation_report_df = _read_optional_csv(
+            _find_participant_file(folder_path, "fixation_report.csv")
+        )
+        blink_df = _read_optional_csv(
+            _find_participant_file(folder_path, "blinks.csv", "blink_detection_report.csv")
+        )
+        pupil_path = _find_participant_file(folder_path, "pupil_positions.csv")
+        pupil_df = _stream_pupil_csv(pupil_path, pupil_path.name) if pupil_path else None
+        export_info_df = _read_optional_csv(
+            _find_participant_file(folder_path, "export_info.csv")
+        )
+
+        results = integrate_app_with_pupil(
+            excel_df=excel_df,
+            gaze_df=gaze_df,
+            world_ts=world_ts,
+            fixations_df=fixations_df,
+            fixation_report_df=fixation_report_df,
+            blink_df=blink_df,
+            pupil_df=pupil_df,
+            export_info_df=export_info_df,
+        )
+
+        participant_output = Path(output_dir) / participant_id
+        participant_output.mkdir(parents=True, exist_ok=True)
+        (participant_output / f"analisis_final_{participant_id}.xlsx").write_bytes(
+            export_final_excel(results, include_framewise=framewise_in_excel)
+        )
+        if not framewise_in_excel:
+            (participant_output / f"gaze_framewise_{participant_id}.zip").write_bytes(
+                export_framewise_archive(results)
+            )
+    except Exception as error:
+        summary.update({"Estado": "error", "Detalle": str(error)})
+        summary["Segundos"] = round(time.perf_counter() - started, 3)
+        return {"summary": summary, "tables": {}}
+
+    tables = {}
+    for _, key in COHORT_TABLES:
+        table = results.get(key)
+        if isinstance(table, pd.DataFrame) and not table.empty:
+            tables[key] = table.assign(ID_Participante=participant_id)
+    summary["Muestras_Gaze"] = int(len(gaze_df))
+    summary["Segundos"] = round(time.perf_counter() - started, 3)
+    return {"summary": summary, "tables": tables}
+
+
+def _write_cohort_workbook(output_dir: Path, outcomes: list[dict[str, Any]]) -> Path:
+    cohort_path = output_dir / COHORT_FILENAME
+    summaries = pd.DataFrame([outcome["summary"] for outcome in outcomes])
+    with pd.ExcelWriter(cohort_path, engine="openpyxl") as writer:
+        summaries.to_excel(writer, sheet_name="Resumen_Lote", index=False)
+        for sheet_name, key in COHORT_TABLES:
+            frames = [outcome["tables"][key] for outcome in outcomes if key in outcome["tables"]]
+            combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            if not combined.empty:
+                combined = combined[
+                    ["ID_Participante"]
+                    + [column for column in combined.columns if column != "ID_Participante"]
+                ]
+            combined.to_excel(writer, sheet_name=sheet_name, index=False)
+    return cohort_path
+
+
+def run_batch(
+    data_dir: Path,
+    output_dir: Path,
+    workers: int,
+    only: Optional[list[str]] = None,
+    framewise_in_excel: bool = False,
+) -> list[dict[str, Any]]:
+    folders = sorted(path for path in data_dir.iterdir() if path.is_dir())
+    if only:
+        wanted = [value.casefold() for value in only]
+        folders = [
+            folder for folder in folders if any(value in folder.name.casefold() for value in wanted)
+        ]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logger.info("Analizando %d participantes con %d procesos", len(folders), workers)
+
+    batch_started = time.perf_counter()
+    outcomes: list[dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                analyze_participant_folder, str(folder), str(output_dir), framewise_in_excel
+            ): folder
+            for folder in folders
+        }
+        for future in as_completed(futures):
+            outcome = future.result()
+            summary = outcome["summary"]
+            logger.info(
+                "%-45s %-8s %7.2f s %s",
+                summary["ID_Participante"],
+                summary["Estado"],
+                summary["Segundos"],
+                summary["Detalle"],
+            )
+            outcomes.append(outcome)
+
+    outcomes.sort(key=lambda outcome: outcome["summary"]["ID_Participante"])
+    cohort_path = _write_cohort_workbook(output_dir, outcomes)
+    logger.info(
+        "Lote terminado en %.2f s. Consolidado: %s",
+        time.perf_counter() - batch_started,
+        cohort_path,
+    )
+    return outcomes
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Análisis App + Pupil Labs por lotes sobre data_participantes/."
+    )
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Número de procesos (por defecto, uno por CPU).",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="*",
+        help="Procesa solo las carpetas cuyo nombre contenga alguno de estos textos.",
+    )
+    parser.add_argument(
+        "--framewise-excel",
+        action="store_true",
+        help="Incluye Gaze_Framewise en el Excel final en lugar de un ZIP aparte.",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if not args.data_dir.is_dir():
+        parser.error(f"No existe la carpeta {args.data_dir}")
+
+    outcomes = run_batch(
+        args.data_dir, args.output, max(1, args.workers), args.only, args.framewise_excel
+    )
+    return 1 if any(outcome["summary"]["Estado"] == "error" for outcome in outcomes) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,450 @@
+# benchmark.py
+"""Mediciones de rendimiento del pipeline de pupil_analysis (sin Streamlit).
+
+Ejemplos:
+    python benchmark.py aoi --aois 12 50 200 --samples 250000
+    python benchmark.py generate --minutes 10 --output /tmp/smartcore_bench
+    python benchmark.py pipeline --minutes 1 10 60 --csv bench_main.csv
+    python benchmark.py pipeline --minutes 1 10 --compare bench_main.csv
+"""
+import argparse
+import json
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from pupil_analysis import (
+    _compute_aoi_hits,
+    _load_world_timestamps,
+    _prepare_gaze_dataframe,
+    _stream_gaze_csv,
+    _stream_pupil_csv,
+    export_final_excel,
+    export_framewise_archive,
+    integrate_app_with_pupil,
+)
+
+DEFAULT_BENCH_DIR = Path("/tmp/smartcore_bench")
+SYNTHETIC_CLOCK_START = 8171.0
+SYNTHETIC_MODES = ["A/B", "Grid", "Sequential"]
+
+
+def _best_of(function: Callable[[], Any], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeats)):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _shelf_aois(n_aois: int, rng: np.random.Generator) -> dict[str, dict[str, float]]:
+    """AOIs tipo góndola: una cuadrícula de productos con huecos y algo de jitter."""
+    columns = int(np.ceil(np.sqrt(n_aois * 2)))
+    rows = int(np.ceil(n_aois / columns))
+    cell_w = 1.0 / columns
+    cell_h = 1.0 / rows
+    aois = {}
+    for index in range(n_aois):
+        row, column = divmod(index, columns)
+        margin_x, margin_y = rng.uniform(0.05, 0.2, 2)
+        aois[f"Producto{index}_Frente"] = {
+            "x_min": (column + margin_x) * cell_w,
+            "x_max": (column + 1 - margin_x) * cell_w,
+            "y_min": (row + margin_y) * cell_h,
+            "y_max": (row + 1 - margin_y) * cell_h,
+        }
+    return aois
+
+
+def benchmark_aoi_index(
+    aoi_counts: list[int], n_samples: int, repeats: int = 3, seed: int = 0
+) -> pd.DataFrame:
+    """Compara la matriz muestras × AOIs con la rejilla espacial y verifica que coinciden."""
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(n_samples) * 0.004
+    x = rng.normal(0.5, 0.25, n_samples)
+    y = rng.normal(0.5, 0.25, n_samples)
+    dt = np.full(n_samples, 0.004)
+
+    rows = []
+    for n_aois in aoi_counts:
+        block_aois = _shelf_aois(n_aois, rng)
+        brute = _compute_aoi_hits(timestamps, x, y, dt, block_aois, use_grid=False)
+        grid = _compute_aoi_hits(timestamps, x, y, dt, block_aois, use_grid=True)
+        if not np.array_equal(brute["label_codes"], grid["label_codes"]):
+            raise AssertionError(f"La rejilla no coincide con la matriz para {n_aois} AOIs")
+
+        brute_seconds = _best_of(
+            lambda: _compute_aoi_hits(timestamps, x, y, dt, block_aois, use_grid=False),
+            repeats,
+        )
+        grid_seconds = _best_of(
+            lambda: _compute_aoi_hits(timestamps, x, y, dt, block_aois, use_grid=True),
+            repeats,
+        )
+        rows.append(
+            {
+                "AOIs": n_aois,
+                "Muestras": n_samples,
+                "Matriz_s": round(brute_seconds, 4),
+                "Rejilla_s": round(grid_seconds, 4),
+                "Aceleracion": round(brute_seconds / grid_seconds, 2) if grid_seconds else np.nan,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def _shelf_aoi_lists(n_aois: int, rng: np.random.Generator) -> dict[str, list[float]]:
+    """Los mismos AOIs tipo góndola en el formato del Excel: [x1, y1, x2, y2]."""
+    return {
+        name: [
+            round(bounds["x_min"], 4),
+            round(bounds["y_min"], 4),
+            round(bounds["x_max"], 4),
+            round(bounds["y_max"], 4),
+        ]
+        for name, bounds in _shelf_aois(n_aois, rng).items()
+    }
+
+
+def generate_synthetic_export(
+    output_dir: Path,
+    minutes: float,
+    gaze_hz: float = 200.0,
+    pupil_hz: float = 120.0,
+    world_fps: float = 30.0,
+    screens_per_minute: float = 6.0,
+    aois_per_screen: int = 8,
+    seed: int = 0,
+    participant_id: Optional[str] = None,
+) -> Path:
+    """
+    Escribe una carpeta de participante falsa con el mismo formato que
+    data_participantes/<id>: experimento_<id>.xlsx (hoja Resumen con AOIs y
+    frames), world_timestamps.npy, gaze_positions.csv, fixations.csv,
+    blinks.csv y pupil_positions.csv. Devuelve la carpeta.
+    """
+    rng = np.random.default_rng(seed)
+    participant_id = participant_id or f"Sintetico_{minutes:g}min"
+    folder = Path(output_dir) / participant_id
+    folder.mkdir(parents=True, exist_ok=True)
+    duration = float(minutes) * 60.0
+    clock_start = SYNTHETIC_CLOCK_START
+    clock_end = clock_start + duration
+
+    world_ts = clock_start + np.arange(0.0, duration, 1.0 / world_fps)
+    world_ts += rng.normal(0.0, 0.0005, world_ts.size)
+    world_ts.sort()
+    np.save(folder / "world_timestamps.npy", world_ts)
+
+    # Fijaciones: duraciones de 100–600 ms separadas por sacadas de ~30 ms
+    n_fixations = int(duration / 0.2) + 1
+    fix_durations = rng.uniform(0.1, 0.6, n_fixations)
+    fix_starts = clock_start + np.concatenate([[0.0], np.cumsum(fix_durations[:-1] + 0.03)])
+    keep = fix_starts < clock_end
+    fix_starts, fix_durations = fix_starts[keep], fix_durations[keep]
+    fix_x = rng.uniform(0.02, 0.98, fix_starts.size)
+    fix_y = rng.uniform(0.02, 0.98, fix_starts.size)
+    frame_of = lambda ts: np.clip(np.searchsorted(world_ts, ts), 0, world_ts.size - 1)
+    pd.DataFrame(
+        {
+            "id": np.arange(fix_starts.size),
+            "start_timestamp": fix_starts,
+            "duration": fix_durations * 1000.0,
+            "start_frame_index": frame_of(fix_starts),
+            "end_frame_index": frame_of(fix_starts + fix_durations),
+            "norm_pos_x": fix_x,
+            "norm_pos_y": fix_y,
+            "dispersion": rng.uniform(0.2, 1.5, fix_starts.size),
+            "confidence": rng.uniform(0.8, 1.0, fix_starts.size),
+            "method": "2d gaze",
+        }
+    ).to_csv(folder / "fixations.csv", index=False)
+
+    gaze_ts = clock_start + np.arange(0.0, duration, 1.0 / gaze_hz)
+    gaze_ts = np.sort(gaze_ts + rng.normal(0.0, 0.0004, gaze_ts.size))
+    current = np.clip(np.searchsorted(fix_starts, gaze_ts, side="right") - 1, 0, None)
+    in_saccade = gaze_ts > fix_starts[current] + fix_durations[current]
+    noise = np.where(in_saccade, 0.05, 0.008)
+    confidence = np.clip(rng.beta(8.0, 1.5, gaze_ts.size), 0.0, 1.0)
+    pd.DataFrame(
+        {
+            "gaze_timestamp": gaze_ts,
+            "world_index": frame_of(gaze_ts),
+            "confidence": confidence,
+            "norm_pos_x": fix_x[current] + rng.normal(0.0, 1.0, gaze_ts.size) * noise,
+            "norm_pos_y": fix_y[current] + rng.normal(0.0, 1.0, gaze_ts.size) * noise,
+            "gaze_point_3d_x": rng.normal(0.0, 50.0, gaze_ts.size),
+            "gaze_point_3d_y": rng.normal(0.0, 50.0, gaze_ts.size),
+            "gaze_point_3d_z": rng.normal(500.0, 20.0, gaze_ts.size),
+        }
+    ).to_csv(folder / "gaze_positions.csv", index=False)
+
+    # ~15 parpadeos por minuto de 100–400 ms
+    n_blinks = max(1, int(minutes * 15))
+    blink_starts = np.sort(rng.uniform(clock_start, clock_end - 0.5, n_blinks))
+    blink_durations = rng.uniform(0.1, 0.4, n_blinks)
+    pd.DataFrame(
+        {
+            "id": np.arange(n_blinks),
+            "start_timestamp": blink_starts,
+            "duration": blink_durations,
+            "end_timestamp": blink_starts + blink_durations,
+            "start_frame_index": frame_of(blink_starts),
+            "end_frame_index": frame_of(blink_starts + blink_durations),
+            "confidence": rng.uniform(0.5, 1.0, n_blinks),
+        }
+    ).to_csv(folder / "blinks.csv", index=False)
+
+    # Dos ojos y dos detectores (2d c++ sin diámetro 3D, pye3d con él), como Pupil Player
+    pupil_step = np.arange(0.0, duration, 1.0 / pupil_hz)
+    pupil_frames = []
+    for eye_id in (0, 1):
+        eye_ts = clock_start + pupil_step + rng.normal(0.0, 0.0003, pupil_step.size)
+        diameter_3d = 3.5 + 0.4 * np.sin(eye_ts / 7.0) + rng.normal(0.0, 0.08, eye_ts.size)
+        for method, with_3d in (("2d c++", False), ("pye3d 0.3.0 real-time", True)):
+            pupil_frames.append(
+                pd.DataFrame(
+                    {
+                        "pupil_timestamp": eye_ts,
+                        "world_index": frame_of(eye_ts),
+                        "eye_id": eye_id,
+                        "confidence": np.clip(rng.beta(8.0, 1.5, eye_ts.size), 0.0, 1.0),
+                        "norm_pos_x": rng.uniform(0.3, 0.7, eye_ts.size),
+                        "norm_pos_y": rng.uniform(0.3, 0.7, eye_ts.size),
+                        "diameter": diameter_3d * 9.0,
+                        "method": method,
+                        "diameter_3d": diameter_3d if with_3d else np.nan,
+                    }
+                )
+            )
+    pd.concat(pupil_frames, ignore_index=True).sort_values(
+        "pupil_timestamp", kind="stable"
+    ).to_csv(folder / "pupil_positions.csv", index=False)
+
+    n_screens = max(1, int(round(minutes * screens_per_minute)))
+    bounds = np.linspace(0, world_ts.size - 1, n_screens + 1).astype(int)
+    rows = []
+    for index in range(n_screens):
+        mode = SYNTHETIC_MODES[index % len(SYNTHETIC_MODES)]
+        pantalla_id = f"{mode}-Pantalla{index + 1}"
+        aois = _shelf_aoi_lists(aois_per_screen, rng)
+        rows.append(
+            {
+                "Usuario": participant_id,
+                "ID_Participante": participant_id,
+                "Modo": mode,
+                "Pantalla": f"{mode} · Pantalla {index + 1}",
+                "Pantalla_ID": pantalla_id,
+                "Producto Seleccionado": next(iter(aois)).rsplit("_", 1)[0],
+                "Frame_inicio": int(bounds[index]),
+                "Frame_fin": int(bounds[index + 1]),
+                "AOIs": json.dumps({pantalla_id: aois}, ensure_ascii=False),
+            }
+        )
+    pd.DataFrame(rows).to_excel(
+        folder / f"experimento_{participant_id}.xlsx", sheet_name="Resumen", index=False
+    )
+    return folder
+
+
+def _measure(
+    function: Callable[[], Any], rows: Callable[[Any], int], with_memory: bool
+) -> tuple[Any, dict[str, Any]]:
+    """Tiempo sin tracemalloc (que frena el código Python) y, aparte, el pico de memoria."""
+    started = time.perf_counter()
+    value = function()
+    seconds = time.perf_counter() - started
+    peak_mb = np.nan
+    if with_memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    return value, {"Filas": rows(value), "Segundos": round(seconds, 3), "Pico_MB": round(peak_mb, 1)}
+
+
+def _version_label() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "local"
+
+
+def benchmark_pipeline(
+    minutes_list: list[float],
+    work_dir: Path = DEFAULT_BENCH_DIR,
+    with_memory: bool = True,
+    framewise_excel: bool = True,
+) -> pd.DataFrame:
+    """
+    Genera (o reutiliza) un export sintético por duración y mide cada etapa
+    del pipeline: lectura de CSVs, limpieza de gaze, integración y exportación.
+    """
+    label = _version_label()
+    table_rows = []
+    for minutes in minutes_list:
+        folder = Path(work_dir) / f"Sintetico_{minutes:g}min"
+        if not (folder / "pupil_positions.csv").exists():
+            generate_synthetic_export(Path(work_dir), minutes)
+        excel_path = next(folder.glob("experimento_*.xlsx"))
+
+        def _stage(name: str, function: Callable[[], Any], rows=len) -> Any:
+            value, metrics = _measure(function, rows, with_memory)
+            table_rows.append({"Version": label, "Minutos": minutes, "Etapa": name, **metrics})
+            return value
+
+        excel_df = _stage("leer_resumen", lambda: pd.read_excel(excel_path, sheet_name="Resumen"))
+        world_ts = _stage(
+            "world_timestamps", lambda: _load_world_timestamps(folder / "world_timestamps.npy")
+        )
+        raw_gaze = _stage("gaze_csv_completo", lambda: pd.read_csv(folder / "gaze_positions.csv"))
+        _stage("prepare_gaze_dataframe", lambda: _prepare_gaze_dataframe(raw_gaze))
+        raw_gaze = None
+        gaze_df = _stage(
+            "gaze_csv_por_bloques", lambda: _stream_gaze_csv(folder / "gaze_positions.csv")
+        )
+        fixations_df = _stage("fixations_csv", lambda: pd.read_csv(folder / "fixations.csv"))
+        blink_df = _stage("blinks_csv", lambda: pd.read_csv(folder / "blinks.csv"))
+        pupil_df = _stage(
+            "pupil_csv_por_bloques", lambda: _stream_pupil_csv(folder / "pupil_positions.csv")
+        )
+        results = _stage(
+            "integrate_app_with_pupil",
+            lambda: integrate_app_with_pupil(
+                excel_df=excel_df,
+                gaze_df=gaze_df,
+                world_ts=world_ts,
+                fixations_df=fixations_df,
+                blink_df=blink_df,
+                pupil_df=pupil_df,
+            ),
+            rows=lambda value: len(value["framewise_gaze"]),
+        )
+        framewise_rows = len(results["framewise_gaze"])
+        summary_rows = sum(
+            len(value)
+            for key, value in results.items()
+            if isinstance(value, pd.DataFrame) and key not in ("framewise_gaze", "pupil_raw")
+        )
+        _stage(
+            "export_final_excel",
+            lambda: export_final_excel(results, include_framewise=False),
+            rows=lambda _: summary_rows,
+        )
+        _stage(
+            "export_framewise_archive",
+            lambda: export_framewise_archive(results),
+            rows=lambda _: framewise_rows,
+        )
+        if framewise_excel:
+            _stage(
+                "export_final_excel_con_framewise",
+                lambda: export_final_excel(results, include_framewise=True),
+                rows=lambda _: summary_rows + framewise_rows,
+            )
+    return pd.DataFrame(table_rows)
+
+
+def _compare_with_baseline(table: pd.DataFrame, baseline_path: Path) -> pd.DataFrame:
+    """Agrega los tiempos y picos de una corrida anterior y el cambio porcentual."""
+    baseline = pd.read_csv(baseline_path)[["Minutos", "Etapa", "Segundos", "Pico_MB"]]
+    merged = table.merge(
+        baseline, on=["Minutos", "Etapa"], how="left", suffixes=("", "_base")
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        merged["Cambio_Tiempo_%"] = (
+            (merged["Segundos"] / merged["Segundos_base"] - 1.0) * 100.0
+        ).round(1)
+        merged["Cambio_Memoria_%"] = (
+            (merged["Pico_MB"] / merged["Pico_MB_base"] - 1.0) * 100.0
+        ).round(1)
+    return merged
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de pupil_analysis.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    aoi_parser = subparsers.add_parser(
+        "aoi", help="Hit-testing de AOIs: matriz completa contra rejilla espacial."
+    )
+    aoi_parser.add_argument("--aois", type=int, nargs="+", default=[4, 12, 24, 50, 100, 200])
+    aoi_parser.add_argument("--samples", type=int, default=250_000)
+    aoi_parser.add_argument("--repeats", type=int, default=3)
+
+    generate_parser = subparsers.add_parser(
+        "generate", help="Escribe exports sintéticos de Pupil Labs para las duraciones dadas."
+    )
+    generate_parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60])
+    generate_parser.add_argument("--output", type=Path, default=DEFAULT_BENCH_DIR)
+    generate_parser.add_argument("--gaze-hz", type=float, default=200.0)
+    generate_parser.add_argument("--pupil-hz", type=float, default=120.0)
+    generate_parser.add_argument("--aois", type=int, default=8, help="AOIs por pantalla.")
+
+    pipeline_parser = subparsers.add_parser(
+        "pipeline", help="Tiempo y memoria por etapa sobre exports sintéticos."
+    )
+    pipeline_parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60])
+    pipeline_parser.add_argument("--work-dir", type=Path, default=DEFAULT_BENCH_DIR)
+    pipeline_parser.add_argument(
+        "--no-memory", action="store_true", help="Omite la segunda pasada con tracemalloc."
+    )
+    pipeline_parser.add_argument(
+        "--skip-framewise-excel",
+        action="store_true",
+        help="No mide el Excel con Gaze_Framewise (la etapa más lenta).",
+    )
+    pipeline_parser.add_argument("--csv", type=Path, help="Guarda la tabla para comparar versiones.")
+    pipeline_parser.add_argument("--compare", type=Path, help="CSV de una corrida anterior.")
+
+    args = parser.parse_args(argv)
+    if args.command == "aoi":
+        table = benchmark_aoi_index(args.aois, args.samples, args.repeats)
+    elif args.command == "generate":
+        table = pd.DataFrame(
+            {
+                "Minutos": minutes,
+                "Carpeta": str(
+                    generate_synthetic_export(
+                        args.output,
+                        minutes,
+                        gaze_hz=args.gaze_hz,
+                        pupil_hz=args.pupil_hz,
+                        aois_per_screen=args.aois,
+                    )
+                ),
+            }
+            for minutes in args.minutes
+        )
+    else:
+        table = benchmark_pipeline(
+            args.minutes,
+            args.work_dir,
+            with_memory=not args.no_memory,
+            framewise_excel=not args.skip_framewise_excel,
+        )
+        if args.csv:
+            table.to_csv(args.csv, index=False)
+        if args.compare:
+            table = _compare_with_baseline(table, args.compare)
+    print(table.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,2506 @@
+# pupil_analysis.py
+"""Pipeline de análisis App + Pupil Labs, sin dependencias de Streamlit.
+
+Lo usan la pestaña de administración de app.py y el análisis por lotes
+(batch_analysis.py), por eso aquí no se llama a `st`.
+"""
+import io
+import re
+import os
+import json
+import hashlib
+import codecs
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+import importlib.util
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Any
+import pandas as pd
+import numpy as np
+from openpyxl import Workbook
+
+
+# Grabación de etapas (tiempo, filas y pico de memoria trazada). Solo está activa
+# dentro de `_recording_spans()`; fuera de ella `_span` no hace nada.
+_SPAN_STATE: ContextVar[Optional[dict[str, Any]]] = ContextVar("smartcore_spans", default=None)
+
+
+@contextmanager
+def _recording_spans():
+    """
+    Activa la grabación en el hilo actual y entrega la lista de spans. Arranca
+    tracemalloc si no estaba activo (es global al proceso: dos corridas a la vez
+    comparten el mismo pico).
+    """
+    spans: list[dict[str, Any]] = []
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _SPAN_STATE.set({"spans": spans, "stack": []})
+    try:
+        yield spans
+    finally:
+        _SPAN_STATE.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def _span(name: str, rows: Optional[int] = None):
+    """Mide un bloque; el llamador puede fijar span["Filas"] / span["Bytes"] dentro."""
+    state = _SPAN_STATE.get()
+    if state is None or not tracemalloc.is_tracing():
+        yield {}
+        return
+
+    stack = state["stack"]
+    current, peak = tracemalloc.get_traced_memory()
+    # El pico acumulado hasta aquí pertenece al span padre
+    if stack:
+        stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+    tracemalloc.reset_peak()
+    span = {
+        "Etapa": "· " * len(stack) + name,
+        "Filas": rows,
+        "Bytes": None,
+        "Segundos": None,
+        "Pico_MB": None,
+        "_base": current,
+        "_peak": current,
+    }
+    state["spans"].append(span)
+    stack.append(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        peak = max(span.pop("_peak"), tracemalloc.get_traced_memory()[1])
+        span["Segundos"] = round(elapsed, 3)
+        span["Pico_MB"] = round(max(peak - span.pop("_base"), 0) / (1024 * 1024), 2)
+        if stack:
+            stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+        tracemalloc.reset_peak()
+
+
+def _record_span(
+    name: str, seconds: float, rows: Optional[int] = None, n_bytes: Optional[int] = None
+) -> None:
+    """
+    Agrega un span ya medido en otro hilo (p. ej. una descarga del pool), colgado
+    del span abierto actual. No trae pico de memoria: tracemalloc es global.
+    """
+    state = _SPAN_STATE.get()
+    if state is None:
+        return
+    state["spans"].append(
+        {
+            "Etapa": "· " * len(state["stack"]) + name,
+            "Filas": rows,
+            "Bytes": n_bytes,
+            "Segundos": round(seconds, 3),
+            "Pico_MB": None,
+        }
+    )
+
+
+def _spans_table(spans: list[dict[str, Any]]) -> pd.DataFrame:
+    table = pd.DataFrame(spans, columns=["Etapa", "Segundos", "Filas", "Bytes", "Pico_MB"])
+    for column in ("Filas", "Bytes"):
+        table[column] = pd.to_numeric(table[column], errors="coerce").astype("Int64")
+    return table
+
+
+def _sanitize_participant_id(df_app: pd.DataFrame) -> str:
+    """Return a safe identifier for filenames based on the participant ID."""
+
+    if "ID_Participante" not in df_app.columns or df_app.empty:
+        return "sin_id"
+
+    raw_value = df_app["ID_Participante"].iloc[0]
+    if pd.isna(raw_value):
+        return "sin_id"
+
+    sanitized = re.sub(r"[^A-Za-z0-9_-]+", "_", str(raw_value).strip())
+    sanitized = sanitized.strip("_")
+    return sanitized or "sin_id"
+
+
+def _parse_aoi_payload(aoi_payload) -> dict[str, dict]:
+    if aoi_payload is None or (isinstance(aoi_payload, float) and np.isnan(aoi_payload)):
+        return {}
+    parsed = aoi_payload
+    if isinstance(aoi_payload, str):
+        aoi_payload = aoi_payload.strip()
+        if not aoi_payload:
+            return {}
+        try:
+            parsed = json.loads(aoi_payload)
+        except json.JSONDecodeError:
+            return {}
+    if isinstance(parsed, list):
+        result: dict[str, dict] = {}
+        for entry in parsed:
+            if not isinstance(entry, dict):
+                continue
+            name = entry.get("name") or entry.get("producto") or entry.get("Producto")
+            if not name:
+                continue
+            result[str(name)] = entry
+        return result
+    if isinstance(parsed, dict):
+        return parsed
+    return {}
+
+
+def _first_float(data: dict, keys: list[str]) -> Optional[float]:
+    for key in keys:
+        if key in data and data[key] is not None:
+            try:
+                return float(data[key])
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def _aoi_bounds_from_dict(raw_data: dict) -> Optional[dict[str, float]]:
+    if not isinstance(raw_data, dict):
+        return None
+    x_min = _first_float(raw_data, ["x_min", "xmin", "left", "x"])
+    y_min = _first_float(raw_data, ["y_min", "ymin", "top", "y"])
+    x_max = _first_float(raw_data, ["x_max", "xmax", "right"])
+    y_max = _first_float(raw_data, ["y_max", "ymax", "bottom"])
+    width = _first_float(raw_data, ["width", "ancho"])
+    height = _first_float(raw_data, ["height", "alto"])
+    if x_min is None or y_min is None:
+        return None
+    if x_max is None and width is not None:
+        x_max = x_min + width
+    if y_max is None and height is not None:
+        y_max = y_min + height
+    if x_max is None or y_max is None:
+        return None
+    return {
+        "x_min": min(x_min, x_max),
+        "x_max": max(x_min, x_max),
+        "y_min": min(y_min, y_max),
+        "y_max": max(y_min, y_max),
+    }
+
+
+def _normalize_aoi_block(raw_value, row_number: int) -> dict[str, dict[str, float]]:
+    if raw_value is None or (isinstance(raw_value, float) and np.isnan(raw_value)):
+        return {}
+    try:
+        parsed = json.loads(raw_value) if isinstance(raw_value, str) else raw_value
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, dict) or not parsed:
+        return {}
+
+    def _normalize_bounds(bounds) -> Optional[dict[str, float]]:
+        if isinstance(bounds, dict):
+            return _aoi_bounds_from_dict(bounds)
+        if isinstance(bounds, (list, tuple)) and len(bounds) >= 4:
+            try:
+                x1, y1, x2, y2 = [float(value) for value in bounds[:4]]
+            except (TypeError, ValueError):
+                return None
+            return {
+                "x_min": min(x1, x2),
+                "x_max": max(x1, x2),
+                "y_min": min(y1, y2),
+                "y_max": max(y1, y2),
+            }
+        return None
+
+    cleaned: dict[str, dict[str, float]] = {}
+    treat_as_flat = all(_normalize_bounds(bounds) for bounds in parsed.values())
+    if treat_as_flat:
+        block_entries: dict[str, dict[str, float]] = {}
+        for name, bounds in parsed.items():
+            normalized = _normalize_bounds(bounds)
+            if normalized:
+                block_entries[str(name)] = normalized
+        if block_entries:
+            cleaned["default"] = block_entries
+        return cleaned
+
+    for block_name, block_data in parsed.items():
+        if not isinstance(block_data, dict):
+            continue
+        normalized_block: dict[str, dict[str, float]] = {}
+        for aoi_name, bounds in block_data.items():
+            normalized = _normalize_bounds(bounds)
+            if normalized:
+                normalized_block[str(aoi_name)] = normalized
+        if normalized_block:
+            cleaned[str(block_name)] = normalized_block
+    return cleaned
+
+
+def _point_inside_bounds(x: Optional[float], y: Optional[float], bounds: dict[str, float]) -> bool:
+    return (
+        x is not None
+        and y is not None
+        and bounds["x_min"] <= x <= bounds["x_max"]
+        and bounds["y_min"] <= y <= bounds["y_max"]
+    )
+
+
+def _compile_aoi_bounds(
+    block_aois: dict[str, dict[str, float]]
+) -> tuple[list[str], np.ndarray]:
+    """Compila los AOIs de una pantalla en una matriz (n_aoi × 4): x_min, y_min, x_max, y_max."""
+    names = [str(name) for name in block_aois.keys()]
+    bounds = np.array(
+        [
+            [bounds["x_min"], bounds["y_min"], bounds["x_max"], bounds["y_max"]]
+            for bounds in block_aois.values()
+        ],
+        dtype=float,
+    ).reshape(-1, 4)
+    return names, bounds
+
+
+def _aoi_hit_matrix(x: np.ndarray, y: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    """Matriz booleana muestras × AOIs con un solo broadcast (NaN nunca cae dentro)."""
+    x_col = np.asarray(x, dtype=float)[:, None]
+    y_col = np.asarray(y, dtype=float)[:, None]
+    return (
+        (x_col >= bounds[:, 0])
+        & (x_col <= bounds[:, 2])
+        & (y_col >= bounds[:, 1])
+        & (y_col <= bounds[:, 3])
+    )
+
+
+AOI_GRID_MIN_AOIS = 16
+AOI_GRID_MAX_CELLS = 32
+
+
+def _grid_cell(values: np.ndarray, cells: int) -> np.ndarray:
+    # Los puntos fuera de [0,1] caen en la celda del borde; el test exacto decide
+    return np.clip(np.floor(values * cells), 0, cells - 1).astype(np.int64)
+
+
+def _build_aoi_grid(bounds: np.ndarray) -> dict[str, Any]:
+    """
+    Índice espacial de rejilla uniforme sobre [0,1]²: cada celda guarda (en
+    formato CSR, ordenados por índice) los AOIs cuyo rectángulo la toca.
+    """
+    cells = int(np.clip(np.ceil(np.sqrt(bounds.shape[0])), 1, AOI_GRID_MAX_CELLS))
+    valid = (
+        np.isfinite(bounds).all(axis=1)
+        & (bounds[:, 0] <= bounds[:, 2])
+        & (bounds[:, 1] <= bounds[:, 3])
+    )
+    aoi_ids = np.flatnonzero(valid)
+    x0 = _grid_cell(bounds[aoi_ids, 0], cells)
+    y0 = _grid_cell(bounds[aoi_ids, 1], cells)
+    width = _grid_cell(bounds[aoi_ids, 2], cells) - x0 + 1
+    covered = width * (_grid_cell(bounds[aoi_ids, 3], cells) - y0 + 1)
+
+    local = np.arange(covered.sum()) - np.repeat(np.cumsum(covered) - covered, covered)
+    cell_x = np.repeat(x0, covered) + local % np.repeat(width, covered)
+    cell_y = np.repeat(y0, covered) + local // np.repeat(width, covered)
+    cell_ids = cell_y * cells + cell_x
+    cell_aois = np.repeat(aoi_ids, covered)
+    order = np.lexsort((cell_aois, cell_ids))
+
+    pointers = np.zeros(cells * cells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell_ids, minlength=cells * cells), out=pointers[1:])
+    return {"cells": cells, "pointers": pointers, "aois": cell_aois[order]}
+
+
+def _aoi_hit_pairs(
+    x: np.ndarray, y: np.ndarray, bounds: np.ndarray, grid: Optional[dict[str, Any]] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pares (muestra, AOI) con la muestra dentro del AOI, probando cada muestra
+    solo contra los AOIs de su celda. Salen ordenados por muestra y, dentro de
+    cada muestra, por índice de AOI (el primero es el del recorrido en orden).
+    """
+    grid = grid or _build_aoi_grid(bounds)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    samples = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    cells = grid["cells"]
+    sample_cells = _grid_cell(y[samples], cells) * cells + _grid_cell(x[samples], cells)
+
+    first = grid["pointers"][sample_cells]
+    candidates = grid["pointers"][sample_cells + 1] - first
+    pair_samples = np.repeat(samples, candidates)
+    offsets = np.arange(candidates.sum()) - np.repeat(
+        np.cumsum(candidates) - candidates, candidates
+    )
+    pair_aois = grid["aois"][np.repeat(first, candidates) + offsets]
+
+    pair_bounds = bounds[pair_aois]
+    pair_x = x[pair_samples]
+    pair_y = y[pair_samples]
+    inside = (
+        (pair_x >= pair_bounds[:, 0])
+        & (pair_x <= pair_bounds[:, 2])
+        & (pair_y >= pair_bounds[:, 1])
+        & (pair_y <= pair_bounds[:, 3])
+    )
+    return pair_samples[inside], pair_aois[inside]
+
+
+def _compute_aoi_hits(
+    timestamps: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    dt: np.ndarray,
+    block_aois: dict[str, dict[str, float]],
+    use_grid: Optional[bool] = None,
+) -> dict[str, Any]:
+    """
+    Motor vectorizado de hit-testing para una pantalla.
+    Devuelve el código AOI por muestra (índice en "names" del primer AOI que
+    contiene el punto, igual que el recorrido en orden original; -1 si ninguno)
+    y Dwell_Time, Fixaciones y TFF por AOI.
+    Con pocos AOIs usa la matriz muestras × AOIs; desde AOI_GRID_MIN_AOIS
+    (estímulos tipo góndola) usa la rejilla espacial, con el mismo resultado.
+    """
+    names, bounds = _compile_aoi_bounds(block_aois)
+    timestamps = np.asarray(timestamps, dtype=float)
+    n_samples = timestamps.shape[0]
+    n_aois = len(names)
+    dt_values = np.nan_to_num(np.asarray(dt, dtype=float), nan=0.0)
+    label_codes = np.full(n_samples, -1, dtype=np.int32)
+    tff = np.full(n_aois, np.nan)
+    if use_grid is None:
+        use_grid = n_aois >= AOI_GRID_MIN_AOIS
+
+    if use_grid and n_samples and n_aois:
+        pair_samples, pair_aois = _aoi_hit_pairs(x, y, bounds)
+        first_pair = np.ones(pair_samples.shape[0], dtype=bool)
+        first_pair[1:] = pair_samples[1:] != pair_samples[:-1]
+        label_codes[pair_samples[first_pair]] = pair_aois[first_pair]
+
+        dwell = np.bincount(pair_aois, weights=dt_values[pair_samples], minlength=n_aois)
+        counts = np.bincount(pair_aois, minlength=n_aois).astype(int)
+        first_ts = np.full(n_aois, np.inf)
+        np.minimum.at(first_ts, pair_aois, timestamps[pair_samples])
+        tff[counts > 0] = first_ts[counts > 0]
+    else:
+        hits = _aoi_hit_matrix(x, y, bounds)
+        if n_samples and names:
+            any_hit = hits.any(axis=1)
+            label_codes[any_hit] = hits.argmax(axis=1)[any_hit]
+
+        dwell = dt_values @ hits if n_samples else np.zeros(n_aois)
+        counts = hits.sum(axis=0).astype(int)
+        hit_columns = counts > 0
+        if hit_columns.any():
+            masked_ts = np.where(hits[:, hit_columns], timestamps[:, None], np.inf)
+            tff[hit_columns] = masked_ts.min(axis=0)
+
+    return {
+        "names": names,
+        "label_codes": label_codes,
+        "dwell": dwell,
+        "counts": counts,
+        "tff": tff,
+    }
+
+
+def _find_first_column(frame: pd.DataFrame, candidates: list[str]) -> Optional[str]:
+    for candidate in candidates:
+        if candidate in frame.columns:
+            return candidate
+    return None
+
+
+GAZE_TIMESTAMP_COLUMNS = ["timestamp", "gaze_timestamp", "world_timestamp", "time", "ts"]
+GAZE_X_COLUMNS = ["norm_pos_x", "x", "gaze_x", "world_x", "px", "norm_pos_x [0]"]
+GAZE_Y_COLUMNS = ["norm_pos_y", "y", "gaze_y", "world_y", "py", "norm_pos_y [1]"]
+GAZE_CONFIDENCE_COLUMNS = ["confidence", "gaze_confidence", "probability", "conf"]
+GAZE_MIN_CONFIDENCE = 0.6
+GAZE_DEFAULT_DT = 0.016
+
+
+def _prepare_gaze_dataframe(gaze_df: pd.DataFrame) -> pd.DataFrame:
+    if gaze_df.attrs.get("gaze_clean"):
+        # Ya viene limpio desde la lectura por bloques (_stream_gaze_csv)
+        return gaze_df
+
+    timestamp_col = _find_first_column(gaze_df, GAZE_TIMESTAMP_COLUMNS)
+    if timestamp_col is None:
+        raise ValueError(
+            "gaze_positions.csv debe incluir una columna de tiempo reconocida (timestamp)."
+        )
+
+    x_col = _find_first_column(gaze_df, GAZE_X_COLUMNS)
+    y_col = _find_first_column(gaze_df, GAZE_Y_COLUMNS)
+    conf_col = _find_first_column(gaze_df, GAZE_CONFIDENCE_COLUMNS)
+
+    normalized = pd.DataFrame()
+    normalized["timestamp"] = pd.to_numeric(gaze_df[timestamp_col], errors="coerce")
+    normalized["norm_pos_x"] = (
+        pd.to_numeric(gaze_df[x_col], errors="coerce") if x_col else np.nan
+    )
+    normalized["norm_pos_y"] = (
+        pd.to_numeric(gaze_df[y_col], errors="coerce") if y_col else np.nan
+    )
+    if conf_col:
+        normalized["confidence"] = (
+            pd.to_numeric(gaze_df[conf_col], errors="coerce").fillna(0)
+        )
+    else:
+        normalized["confidence"] = 1.0
+
+    normalized = normalized.dropna(subset=["timestamp"]).copy()
+    normalized = normalized[normalized["confidence"] >= GAZE_MIN_CONFIDENCE]
+    normalized = normalized.sort_values("timestamp").reset_index(drop=True)
+    normalized["dt"] = normalized["timestamp"].diff().clip(lower=0, upper=1)
+    normalized["dt"] = normalized["dt"].fillna(GAZE_DEFAULT_DT)
+    return normalized
+
+
+def _timestamp_from_frame(
+    frame_value: Any, total_frames: int, world_ts: np.ndarray
+) -> Optional[float]:
+    try:
+        frame_index = int(frame_value)
+    except (TypeError, ValueError):
+        return None
+    if frame_index < 0 or frame_index >= total_frames:
+        return None
+    timestamp = world_ts[frame_index]
+    if not np.isfinite(timestamp):
+        return None
+    return float(timestamp)
+
+
+def _build_screen_interval_index(
+    sample_ts: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Índice de intervalos de pantalla sobre muestras ordenadas por tiempo.
+    Ordena los intervalos (t_start, t_end) una sola vez y asigna a cada muestra
+    su pantalla con np.searchsorted (-1 si no cae en ninguna). "lo"/"hi" son los
+    límites [lo, hi) de cada pantalla en el orden original, para recortar vistas
+    de los arreglos de gaze sin copiarlos (intervalos cerrados, como antes).
+    """
+    sample_ts = np.asarray(sample_ts, dtype=float)
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+
+    labels = np.full(sample_ts.shape[0], -1, dtype=np.int64)
+    if starts.size and sample_ts.size:
+        order = np.argsort(starts, kind="stable")
+        sorted_starts = starts[order]
+        sorted_ends = ends[order]
+        position = np.searchsorted(sorted_starts, sample_ts, side="right") - 1
+        inside = position >= 0
+        inside[inside] = sample_ts[inside] <= sorted_ends[position[inside]]
+        labels[inside] = order[position[inside]]
+
+    return {
+        "labels": labels,
+        "lo": np.searchsorted(sample_ts, starts, side="left"),
+        "hi": np.searchsorted(sample_ts, ends, side="right"),
+    }
+
+
+def _count_interval_overlaps(
+    event_starts: np.ndarray,
+    event_ends: np.ndarray,
+    interval_starts: np.ndarray,
+    interval_ends: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cuenta, para todos los intervalos a la vez, los eventos (p. ej. parpadeos)
+    que se traslapan con cada uno y la duración total del traslape.
+    Barrido con inicios y finales ordenados + sumas acumuladas: O((n + m) log n).
+    Un evento cuenta si min(fin) > max(inicio), igual que el recorrido anterior.
+    """
+    event_starts = np.asarray(event_starts, dtype=float)
+    event_ends = np.asarray(event_ends, dtype=float)
+    interval_starts = np.asarray(interval_starts, dtype=float)
+    interval_ends = np.asarray(interval_ends, dtype=float)
+
+    valid = (
+        np.isfinite(event_starts) & np.isfinite(event_ends) & (event_ends > event_starts)
+    )
+    if not valid.any():
+        zeros = np.zeros(interval_starts.shape[0])
+        return zeros.astype(int), zeros
+
+    # Referencia común para no perder precisión con timestamps grandes
+    origin = float(event_starts[valid].min())
+    sorted_starts = np.sort(event_starts[valid] - origin)
+    sorted_ends = np.sort(event_ends[valid] - origin)
+    query_starts = interval_starts - origin
+    query_ends = interval_ends - origin
+
+    counts = np.searchsorted(sorted_starts, query_ends, side="left") - np.searchsorted(
+        sorted_ends, query_starts, side="right"
+    )
+    counts = np.where(query_ends > query_starts, counts, 0)
+
+    start_cumsum = np.concatenate(([0.0], np.cumsum(sorted_starts)))
+    end_cumsum = np.concatenate(([0.0], np.cumsum(sorted_ends)))
+
+    def _covered_until(t: np.ndarray) -> np.ndarray:
+        # Tiempo total cubierto por eventos en (-inf, t]
+        started = np.searchsorted(sorted_starts, t, side="right")
+        ended = np.searchsorted(sorted_ends, t, side="right")
+        return (started * t - start_cumsum[started]) - (ended * t - end_cumsum[ended])
+
+    overlap = np.where(
+        query_ends > query_starts,
+        _covered_until(query_ends) - _covered_until(query_starts),
+        0.0,
+    )
+    return counts.astype(int), np.maximum(overlap, 0.0)
+
+
+FIXATION_START_COLUMNS = ["start_timestamp", "timestamp", "start_time", "start"]
+FIXATION_DURATION_COLUMNS = ["duration", "duration_ms"]
+
+
+def _prepare_fixation_arrays(fixations_df: Optional[pd.DataFrame]) -> Optional[dict[str, np.ndarray]]:
+    """
+    Extrae de fixations.csv (Pupil Player) inicio, duración en segundos y centroide,
+    ordenados por inicio. Devuelve None si el archivo no trae esas columnas.
+    """
+    if not isinstance(fixations_df, pd.DataFrame) or fixations_df.empty:
+        return None
+    start_col = _find_first_column(fixations_df, FIXATION_START_COLUMNS)
+    duration_col = _find_first_column(fixations_df, FIXATION_DURATION_COLUMNS)
+    x_col = _find_first_column(fixations_df, GAZE_X_COLUMNS)
+    y_col = _find_first_column(fixations_df, GAZE_Y_COLUMNS)
+    if not all([start_col, duration_col, x_col, y_col]):
+        return None
+
+    starts = pd.to_numeric(fixations_df[start_col], errors="coerce").to_numpy(dtype=float)
+    # Pupil Player exporta la duración de las fijaciones en milisegundos
+    durations = (
+        pd.to_numeric(fixations_df[duration_col], errors="coerce").to_numpy(dtype=float)
+        / 1000.0
+    )
+    x = pd.to_numeric(fixations_df[x_col], errors="coerce").to_numpy(dtype=float)
+    y = pd.to_numeric(fixations_df[y_col], errors="coerce").to_numpy(dtype=float)
+
+    valid = np.isfinite(starts) & np.isfinite(durations)
+    order = np.argsort(starts[valid], kind="stable")
+    return {
+        "start": starts[valid][order],
+        "duration": np.maximum(durations[valid][order], 0.0),
+        "x": x[valid][order],
+        "y": y[valid][order],
+    }
+
+
+def _compute_fixation_aoi_metrics(
+    starts: np.ndarray,
+    durations: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    block_aois: dict[str, dict[str, float]],
+    screen_start: float,
+) -> dict[str, Any]:
+    """
+    Métricas por AOI a nivel de fijación para una pantalla: número real de
+    fijaciones cuyo centroide cae en el AOI, dwell ponderado por su duración y
+    latencia de la primera fijación desde el inicio de la pantalla.
+    """
+    names, bounds = _compile_aoi_bounds(block_aois)
+    hits = _aoi_hit_matrix(x, y, bounds)
+    counts = hits.sum(axis=0).astype(int)
+    dwell = (
+        np.asarray(durations, dtype=float) @ hits
+        if hits.shape[0]
+        else np.zeros(len(names))
+    )
+    latency = np.full(len(names), np.nan)
+    hit_columns = counts > 0
+    if hit_columns.any():
+        first_start = np.where(
+            hits[:, hit_columns], np.asarray(starts, dtype=float)[:, None], np.inf
+        ).min(axis=0)
+        latency[hit_columns] = np.maximum(first_start - screen_start, 0.0)
+    return {"names": names, "counts": counts, "dwell": dwell, "latency": latency}
+
+
+FIXATIONS_PER_SCREEN_COLUMNS = [
+    "Modo",
+    "Pantalla_ID",
+    "Fixation_Index",
+    "Start",
+    "Duration",
+    "norm_pos_x",
+    "norm_pos_y",
+]
+
+
+def _fixations_per_screen_table(
+    fixation_data: Optional[dict[str, np.ndarray]],
+    fixation_index: Optional[dict[str, np.ndarray]],
+    screens: list[dict[str, Any]],
+) -> pd.DataFrame:
+    """Fijaciones de cada pantalla en orden temporal (centroide, inicio y duración)."""
+    if fixation_data is None or not screens:
+        return pd.DataFrame(columns=FIXATIONS_PER_SCREEN_COLUMNS)
+    lo = np.asarray(fixation_index["lo"], dtype=np.int64)
+    hi = np.asarray(fixation_index["hi"], dtype=np.int64)
+    counts = np.maximum(hi - lo, 0)
+    screen_codes = np.repeat(np.arange(len(screens)), counts)
+    # Posición de cada fila dentro de su pantalla: arange global menos el offset del grupo
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    within = np.arange(counts.sum()) - offsets
+    rows = lo[screen_codes] + within
+    return pd.DataFrame(
+        {
+            "Modo": _per_screen_categorical([screen["mode"] for screen in screens], screen_codes),
+            "Pantalla_ID": _per_screen_categorical(
+                [screen["pantalla_id"] for screen in screens], screen_codes
+            ),
+            "Fixation_Index": within + 1,
+            "Start": fixation_data["start"][rows],
+            "Duration": fixation_data["duration"][rows],
+            "norm_pos_x": fixation_data["x"][rows],
+            "norm_pos_y": fixation_data["y"][rows],
+        },
+        columns=FIXATIONS_PER_SCREEN_COLUMNS,
+    )
+
+
+FRAMEWISE_GAZE_COLUMNS = [
+    "timestamp",
+    "norm_pos_x",
+    "norm_pos_y",
+    "dt",
+    "AOI",
+    "Modo",
+    "Pantalla_ID",
+    "Pantalla",
+    "Producto_Seleccionado",
+]
+
+
+def _per_screen_categorical(values: list[Any], screen_codes: np.ndarray) -> pd.Categorical:
+    """Expande un valor por pantalla a una columna categórica por muestra sin repetir strings."""
+    per_screen = pd.Categorical(
+        [None if pd.isna(value) else str(value) for value in values]
+    )
+    codes = per_screen.codes[screen_codes] if screen_codes.size else np.array([], dtype=np.int8)
+    return pd.Categorical.from_codes(codes, categories=per_screen.categories)
+
+
+def _build_framewise_table(
+    gaze_arrays: dict[str, np.ndarray],
+    screen_lo: np.ndarray,
+    screen_hi: np.ndarray,
+    aoi_codes: list[np.ndarray],
+    aoi_names: list[str],
+    screens: list[dict[str, Any]],
+) -> pd.DataFrame:
+    """
+    Construye Gaze_Framewise columna a columna desde arreglos NumPy: float32 para
+    coordenadas y dt, timestamp en float64 y `category` para las etiquetas que se
+    repiten por muestra (Modo, Pantalla_ID, Pantalla, Producto_Seleccionado, AOI).
+    """
+    lengths = np.asarray(screen_hi, dtype=np.int64) - np.asarray(screen_lo, dtype=np.int64)
+    if not screens or lengths.sum() == 0:
+        return pd.DataFrame(columns=FRAMEWISE_GAZE_COLUMNS)
+
+    positions = np.concatenate(
+        [np.arange(lo, hi) for lo, hi in zip(screen_lo, screen_hi)]
+    )
+    screen_codes = np.repeat(np.arange(len(screens)), lengths)
+    sample_aoi_codes = np.concatenate(aoi_codes)
+    order = np.argsort(gaze_arrays["timestamp"][positions], kind="stable")
+    positions = positions[order]
+    screen_codes = screen_codes[order]
+    sample_aoi_codes = sample_aoi_codes[order]
+
+    return pd.DataFrame(
+        {
+            "timestamp": gaze_arrays["timestamp"][positions],
+            "norm_pos_x": gaze_arrays["norm_pos_x"][positions].astype(np.float32),
+            "norm_pos_y": gaze_arrays["norm_pos_y"][positions].astype(np.float32),
+            "dt": gaze_arrays["dt"][positions].astype(np.float32),
+            "AOI": pd.Categorical.from_codes(sample_aoi_codes, categories=aoi_names),
+            "Modo": _per_screen_categorical(
+                [screen["mode"] for screen in screens], screen_codes
+            ),
+            "Pantalla_ID": _per_screen_categorical(
+                [screen["pantalla_id"] for screen in screens], screen_codes
+            ),
+            "Pantalla": _per_screen_categorical(
+                [screen["row"].get("Pantalla", "") for screen in screens], screen_codes
+            ),
+            "Producto_Seleccionado": _per_screen_categorical(
+                [screen["row"].get("Producto Seleccionado", "") for screen in screens],
+                screen_codes,
+            ),
+        }
+    )
+
+
+def _run_length_visits(
+    screen_codes: np.ndarray, aoi_codes: np.ndarray, dt: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Codifica por tramos (RLE) la etiqueta AOI por muestra en visitas. Las
+    muestras fuera de todo AOI se descartan antes, así que A, (nada), A cuenta
+    como una sola visita; una visita nunca cruza de una pantalla a otra.
+    """
+    keep = aoi_codes >= 0
+    screen_codes = screen_codes[keep]
+    aoi_codes = aoi_codes[keep]
+    dt = dt[keep]
+    if screen_codes.size == 0:
+        empty = np.array([], dtype=np.int64)
+        return {"screen": empty, "aoi": empty, "duration": np.array([], dtype=float)}
+
+    boundary = np.ones(screen_codes.shape[0], dtype=bool)
+    boundary[1:] = (screen_codes[1:] != screen_codes[:-1]) | (aoi_codes[1:] != aoi_codes[:-1])
+    starts = np.flatnonzero(boundary)
+    return {
+        "screen": screen_codes[starts].astype(np.int64),
+        "aoi": aoi_codes[starts].astype(np.int64),
+        "duration": np.add.reduceat(dt, starts),
+    }
+
+
+def _grouped_entropies(
+    visit_groups: np.ndarray,
+    visit_aois: np.ndarray,
+    from_groups: np.ndarray,
+    from_aois: np.ndarray,
+    to_aois: np.ndarray,
+    n_groups: int,
+    n_aois: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, pd.DataFrame]:
+    """
+    AOIs distintos visitados, entropía estacionaria H_s = -Σ π_i log2 π_i (π: proporción de visitas por
+    AOI) y de transición H_t = -Σ_i π_i Σ_j p_ij log2 p_ij por grupo, más la
+    tabla larga de conteos y probabilidades de transición.
+    """
+    stride = max(n_aois, 1)
+    visit_keys, visit_counts = np.unique(visit_groups * stride + visit_aois, return_counts=True)
+    visit_key_groups = visit_keys // stride
+    group_visits = np.bincount(visit_key_groups, weights=visit_counts, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = visit_counts / group_visits[visit_key_groups]
+    stationary = np.bincount(
+        visit_key_groups, weights=-share * np.log2(share), minlength=n_groups
+    ).astype(float)
+    stationary[group_visits == 0] = np.nan
+
+    row_keys = from_groups * stride + from_aois
+    pair_keys, pair_counts = np.unique(row_keys * stride + to_aois, return_counts=True)
+    pair_rows = pair_keys // stride
+    row_ids, row_codes = np.unique(pair_rows, return_inverse=True)
+    row_totals = np.bincount(row_codes.reshape(-1), weights=pair_counts)
+    probability = pair_counts / row_totals[row_codes.reshape(-1)]
+    # π_i de la fila (grupo, AOI de origen)
+    row_share = share[np.searchsorted(visit_keys, pair_rows)]
+    transition = np.bincount(
+        pair_rows // stride,
+        weights=-row_share * probability * np.log2(probability),
+        minlength=n_groups,
+    ).astype(float)
+    transition[group_visits == 0] = np.nan
+
+    transitions = pd.DataFrame(
+        {
+            "group": pair_rows // stride,
+            "from": pair_rows % stride,
+            "to": pair_keys % stride,
+            "Transitions": pair_counts,
+            "Probability": probability,
+        }
+    )
+    distinct_aois = np.bincount(visit_key_groups, minlength=n_groups)
+    return distinct_aois, stationary, transition, transitions
+
+
+def _compute_scanpath_metrics(
+    screens: list[dict[str, Any]],
+    aoi_codes: list[np.ndarray],
+    gaze_dt: np.ndarray,
+    screen_lo: np.ndarray,
+    screen_hi: np.ndarray,
+    aoi_names: list[str],
+) -> dict[str, pd.DataFrame]:
+    """
+    Secuencia de visitas a AOIs por pantalla: matrices de transición AOI→AOI
+    (formato largo) y entropías estacionaria y de transición, por pantalla y
+    por modo. Las entropías normalizadas dividen por log2 del número de AOIs
+    definidos (en la pantalla o en el modo).
+    """
+    n_screens = len(screens)
+    n_aois = len(aoi_names)
+    lengths = np.maximum(np.asarray(screen_hi) - np.asarray(screen_lo), 0)
+    sample_screens = np.repeat(np.arange(n_screens), lengths)
+    sample_aois = np.concatenate(aoi_codes or [np.array([], np.int32)])
+    sample_dt = np.concatenate(
+        [gaze_dt[lo:hi] for lo, hi in zip(screen_lo, screen_hi)] or [np.array([], float)]
+    )
+    visits = _run_length_visits(sample_screens, sample_aois, sample_dt)
+
+    same_screen = visits["screen"][1:] == visits["screen"][:-1]
+    from_screens = visits["screen"][:-1][same_screen]
+    from_aois = visits["aoi"][:-1][same_screen]
+    to_aois = visits["aoi"][1:][same_screen]
+
+    mode_names = sorted({screen["mode"] for screen in screens})
+    screen_modes = np.array(
+        [mode_names.index(screen["mode"]) for screen in screens], dtype=np.int64
+    )
+    screen_aoi_sets = [set(str(name) for name in screen["block_aois"]) for screen in screens]
+    mode_aoi_sets: list[set[str]] = [set() for _ in mode_names]
+    for aois, mode_idx in zip(screen_aoi_sets, screen_modes):
+        mode_aoi_sets[mode_idx] |= aois
+    mode_aoi_counts = np.array([len(aois) for aois in mode_aoi_sets], dtype=float)
+    names = np.asarray(aoi_names, dtype=object)
+
+    def _summaries(visit_groups, from_groups, n_groups, defined_aois):
+        distinct_aois, stationary, transition, pairs = _grouped_entropies(
+            visit_groups, visits["aoi"], from_groups, from_aois, to_aois, n_groups, n_aois
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            max_entropy = np.where(defined_aois > 1, np.log2(defined_aois), np.nan)
+        visit_counts = np.bincount(visit_groups, minlength=n_groups)
+        visit_time = np.bincount(visit_groups, weights=visits["duration"], minlength=n_groups)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_visit = np.where(visit_counts > 0, visit_time / visit_counts, np.nan)
+        summary = {
+            "Visits": visit_counts,
+            "Transitions": np.bincount(from_groups, minlength=n_groups),
+            "AOIs_Visited": distinct_aois,
+            "Mean_Visit_Duration": mean_visit,
+            "Stationary_Entropy": stationary,
+            "Transition_Entropy": transition,
+            "Stationary_Entropy_Norm": stationary / max_entropy,
+            "Transition_Entropy_Norm": transition / max_entropy,
+        }
+        pairs["From_AOI"] = names[pairs["from"].to_numpy()]
+        pairs["To_AOI"] = names[pairs["to"].to_numpy()]
+        return summary, pairs
+
+    screen_summary, screen_pairs = _summaries(
+        visits["screen"],
+        from_screens,
+        n_screens,
+        np.array([len(aois) for aois in screen_aoi_sets], dtype=float),
+    )
+    scanpath_per_screen = pd.DataFrame(
+        {
+            "Modo": [screen["mode"] for screen in screens],
+            "Pantalla_ID": [screen["pantalla_id"] for screen in screens],
+            "Pantalla": [screen["row"].get("Pantalla", "") for screen in screens],
+            **screen_summary,
+        }
+    )
+    transitions_per_screen = pd.DataFrame(
+        {
+            "Modo": scanpath_per_screen["Modo"].to_numpy()[screen_pairs["group"].to_numpy()],
+            "Pantalla_ID": scanpath_per_screen["Pantalla_ID"].to_numpy()[
+                screen_pairs["group"].to_numpy()
+            ],
+            "Pantalla": scanpath_per_screen["Pantalla"].to_numpy()[
+                screen_pairs["group"].to_numpy()
+            ],
+            "From_AOI": screen_pairs["From_AOI"],
+            "To_AOI": screen_pairs["To_AOI"],
+            "Transitions": screen_pairs["Transitions"],
+            "Probability": screen_pairs["Probability"],
+        }
+    )
+
+    mode_summary, mode_pairs = _summaries(
+        screen_modes[visits["screen"]],
+        screen_modes[from_screens],
+        len(mode_names),
+        mode_aoi_counts,
+    )
+    scanpath_per_mode = pd.DataFrame({"Modo": mode_names, **mode_summary})
+    transitions_per_mode = pd.DataFrame(
+        {
+            "Modo": np.asarray(mode_names, dtype=object)[mode_pairs["group"].to_numpy()],
+            "From_AOI": mode_pairs["From_AOI"],
+            "To_AOI": mode_pairs["To_AOI"],
+            "Transitions": mode_pairs["Transitions"],
+            "Probability": mode_pairs["Probability"],
+        }
+    )
+
+    return {
+        "scanpath_per_screen": scanpath_per_screen,
+        "scanpath_per_mode": scanpath_per_mode,
+        "transitions_per_screen": transitions_per_screen.sort_values(
+            ["Modo", "Pantalla_ID", "From_AOI", "To_AOI"]
+        ).reset_index(drop=True),
+        "transitions_per_mode": transitions_per_mode.sort_values(
+            ["Modo", "From_AOI", "To_AOI"]
+        ).reset_index(drop=True),
+    }
+
+
+PUPIL_DIAMETER_COLUMNS = [("diameter_3d", "mm"), ("diameter", "px")]
+PUPIL_BASELINE_SECONDS = 0.5
+PUPIL_GAZE_TOLERANCE = 0.05
+PUPIL_SCREEN_COLUMNS = [
+    "Modo",
+    "Pantalla_ID",
+    "Pantalla",
+    "Pupil_Samples",
+    "Pupil_Baseline",
+    "Pupil_Mean",
+    "Pupil_Peak",
+    "Pupil_Mean_Change",
+    "Pupil_Peak_Change",
+    "Pupil_Unit",
+]
+
+
+def _prepare_pupil_arrays(pupil_df: Optional[pd.DataFrame]) -> Optional[dict[str, Any]]:
+    """
+    Timestamp y diámetro de pupila ordenados por tiempo. Usa diameter_3d (mm)
+    si el modelo 3D trae valores y si no el diámetro 2D en píxeles; ambos ojos
+    se agregan juntos.
+    """
+    if not isinstance(pupil_df, pd.DataFrame) or pupil_df.empty:
+        return None
+    timestamp_col = _find_first_column(pupil_df, PUPIL_TIMESTAMP_COLUMNS)
+    if timestamp_col is None:
+        return None
+    timestamps = pd.to_numeric(pupil_df[timestamp_col], errors="coerce").to_numpy(dtype=float)
+
+    for column, unit in PUPIL_DIAMETER_COLUMNS:
+        if column not in pupil_df.columns:
+            continue
+        diameters = pd.to_numeric(pupil_df[column], errors="coerce").to_numpy(dtype=float)
+        valid = np.isfinite(timestamps) & np.isfinite(diameters) & (diameters > 0)
+        if valid.any():
+            order = np.argsort(timestamps[valid], kind="stable")
+            return {
+                "timestamp": timestamps[valid][order],
+                "diameter": diameters[valid][order],
+                "unit": unit,
+            }
+    return None
+
+
+def _grouped_mean_peak(
+    codes: np.ndarray, values: np.ndarray, n_groups: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Conteo, media y máximo de `values` por grupo (NaN en grupos vacíos)."""
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=values, minlength=n_groups)
+    peaks = np.full(n_groups, -np.inf)
+    np.maximum.at(peaks, codes, values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    peaks[counts == 0] = np.nan
+    return counts, means, peaks
+
+
+def _compute_pupil_metrics(
+    pupil: dict[str, Any],
+    screens: list[dict[str, Any]],
+    screen_starts: np.ndarray,
+    screen_ends: np.ndarray,
+    gaze_ts: np.ndarray,
+    gaze_lo: np.ndarray,
+    gaze_hi: np.ndarray,
+    gaze_aoi_codes: list[np.ndarray],
+    aoi_names: list[str],
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Diámetro de pupila por pantalla y por AOI. Cada muestra se asigna a su
+    pantalla con el índice de intervalos (searchsorted) y a un AOI con el gaze
+    más cercano de la misma pantalla (merge_asof). La línea base es la media de
+    los primeros PUPIL_BASELINE_SECONDS de cada pantalla; los *_Change restan
+    esa línea base a la media y al pico.
+    """
+    n_screens = len(screens)
+    index = _build_screen_interval_index(pupil["timestamp"], screen_starts, screen_ends)
+    lengths = np.maximum(index["hi"] - index["lo"], 0)
+    positions = np.concatenate(
+        [np.arange(lo, hi) for lo, hi in zip(index["lo"], index["hi"])] or [np.array([], int)]
+    ).astype(np.int64)
+    screen_codes = np.repeat(np.arange(n_screens), lengths)
+    sample_ts = pupil["timestamp"][positions]
+    diameters = pupil["diameter"][positions]
+
+    in_baseline = sample_ts < screen_starts[screen_codes] + PUPIL_BASELINE_SECONDS
+    _, baseline, _ = _grouped_mean_peak(
+        screen_codes[in_baseline], diameters[in_baseline], n_screens
+    )
+    counts, means, peaks = _grouped_mean_peak(screen_codes, diameters, n_screens)
+
+    per_screen = pd.DataFrame(
+        {
+            "Modo": [screen["mode"] for screen in screens],
+            "Pantalla_ID": [screen["pantalla_id"] for screen in screens],
+            "Pantalla": [screen["row"].get("Pantalla", "") for screen in screens],
+            "Pupil_Samples": counts,
+            "Pupil_Baseline": baseline,
+            "Pupil_Mean": means,
+            "Pupil_Peak": peaks,
+            "Pupil_Mean_Change": means - baseline,
+            "Pupil_Peak_Change": peaks - baseline,
+            "Pupil_Unit": pupil["unit"],
+        },
+        columns=PUPIL_SCREEN_COLUMNS,
+    )
+
+    # AOI de cada muestra de pupila: gaze más cercano dentro de la misma pantalla
+    gaze_lengths = np.maximum(np.asarray(gaze_hi) - np.asarray(gaze_lo), 0)
+    gaze_positions = np.concatenate(
+        [np.arange(lo, hi) for lo, hi in zip(gaze_lo, gaze_hi)] or [np.array([], int)]
+    ).astype(np.int64)
+    gaze_side = pd.DataFrame(
+        {
+            "timestamp": np.asarray(gaze_ts, dtype=float)[gaze_positions],
+            "screen": np.repeat(np.arange(n_screens), gaze_lengths),
+            "aoi": np.concatenate(gaze_aoi_codes or [np.array([], np.int32)]).astype(np.int64),
+        }
+    ).sort_values("timestamp", kind="stable")
+    pupil_side = pd.DataFrame(
+        {
+            "timestamp": sample_ts,
+            "screen": screen_codes,
+            "sample": np.arange(sample_ts.shape[0]),
+        }
+    ).sort_values("timestamp", kind="stable")
+    joined = pd.merge_asof(
+        pupil_side,
+        gaze_side,
+        on="timestamp",
+        by="screen",
+        direction="nearest",
+        tolerance=PUPIL_GAZE_TOLERANCE,
+    )
+    sample_aoi = np.full(sample_ts.shape[0], -1, dtype=np.int64)
+    sample_aoi[joined["sample"].to_numpy()] = joined["aoi"].fillna(-1).to_numpy(dtype=np.int64)
+
+    on_aoi = sample_aoi >= 0
+    n_aois = max(len(aoi_names), 1)
+    group_keys, group_codes = np.unique(
+        screen_codes[on_aoi] * n_aois + sample_aoi[on_aoi], return_inverse=True
+    )
+    aoi_counts, aoi_means, aoi_peaks = _grouped_mean_peak(
+        group_codes.reshape(-1), diameters[on_aoi], group_keys.shape[0]
+    )
+    group_screens = group_keys // n_aois
+    aoi_baseline = baseline[group_screens]
+    per_aoi = pd.DataFrame(
+        {
+            "Modo": per_screen["Modo"].to_numpy()[group_screens],
+            "Pantalla_ID": per_screen["Pantalla_ID"].to_numpy()[group_screens],
+            "Pantalla": per_screen["Pantalla"].to_numpy()[group_screens],
+            "AOI": np.asarray(aoi_names + [""], dtype=object)[group_keys % n_aois],
+            "Pupil_Samples": aoi_counts,
+            "Pupil_Mean": aoi_means,
+            "Pupil_Peak": aoi_peaks,
+            "Pupil_Mean_Change": aoi_means - aoi_baseline,
+            "Pupil_Peak_Change": aoi_peaks - aoi_baseline,
+            "Pupil_Unit": pupil["unit"],
+        }
+    )
+    if not per_aoi.empty:
+        per_aoi = per_aoi.sort_values(["Modo", "Pantalla_ID", "AOI"]).reset_index(drop=True)
+    return per_screen, per_aoi
+
+
+def _screen_block_aois(row, pantalla_id: str, idx: int) -> dict[str, dict[str, float]]:
+    """AOIs de la pantalla según su fila de "Resumen"; el bloque "default" no se usa."""
+    return _normalize_aoi_block(row.get("AOIs"), idx + 1).get(pantalla_id) or {}
+
+
+def _cached_unit(key: Optional[str], compute) -> tuple[Any, bool]:
+    """Devuelve (resultado, recalculado) reutilizando la caché de análisis si hay clave."""
+    value = _load_analysis_cache(key)
+    if value is not None:
+        return value, False
+    value = compute()
+    _store_analysis_cache(key, value)
+    return value, True
+
+
+def _analysis_cache_key(payload: dict[str, Any]) -> str:
+    encoded = json.dumps(
+        {"version": ANALYSIS_CACHE_VERSION, **payload}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _screen_unit_keys(
+    screens: list[dict[str, Any]],
+    input_shas: Optional[dict[str, Optional[str]]],
+) -> list[dict[str, Optional[str]]]:
+    """
+    Claves de caché por pantalla a partir del JSON de sus AOIs, su rango de
+    frames y los SHAs de los archivos de entrada: "gaze" (gaze_positions +
+    world_timestamps) y "fixations" (fixations + world_timestamps), por separado
+    para que cambiar uno no invalide el otro. None si falta algún SHA.
+    """
+    shas = input_shas or {}
+    keys = []
+    for screen in screens:
+        # sort_keys no fija el orden de los AOIs; los resultados se indexan por ese orden
+        aoi_names, _ = _compile_aoi_bounds(screen["block_aois"])
+        screen_payload = {
+            "pantalla_id": screen["pantalla_id"],
+            "aois": screen["block_aois"],
+            "aoi_names": aoi_names,
+            "frames": [screen["row"].get("Frame_inicio"), screen["row"].get("Frame_fin")],
+            "timestamps": shas.get("timestamps"),
+        }
+        unit_keys = {}
+        for unit, source in [("gaze", "gaze"), ("fixations", "fixations")]:
+            if shas.get("timestamps") and shas.get(source):
+                unit_keys[unit] = _analysis_cache_key(
+                    {
+                        **screen_payload,
+                        "unit": unit,
+                        "source": shas[source],
+                        "min_confidence": GAZE_MIN_CONFIDENCE,
+                    }
+                )
+            else:
+                unit_keys[unit] = None
+        keys.append(unit_keys)
+    return keys
+
+
+def _pupil_stage_key(
+    unit_keys: list[dict[str, Optional[str]]],
+    input_shas: Optional[dict[str, Optional[str]]],
+    aoi_names: list[str],
+) -> Optional[str]:
+    """La etapa de pupila depende del archivo de pupila y de las etiquetas de gaze de cada pantalla."""
+    pupil_sha = (input_shas or {}).get("pupil")
+    gaze_keys = [keys["gaze"] for keys in unit_keys]
+    if not pupil_sha or not gaze_keys or any(key is None for key in gaze_keys):
+        return None
+    return _analysis_cache_key(
+        {"unit": "pupil", "pupil": pupil_sha, "screens": gaze_keys, "aoi_names": aoi_names}
+    )
+
+
+def integrate_app_with_pupil(
+    
+    excel_df,
+    gaze_df,
+    world_ts,
+    fixations_df=None,
+    fixation_report_df=None,
+    blink_df=None,
+    pupil_df=None,
+    export_info_df=None,
+    input_shas: Optional[dict[str, Optional[str]]] = None,
+):
+    """
+    Integra el Excel de la app con el export de Pupil Labs.
+    Con `input_shas` (SHA de blob por archivo: gaze, timestamps, fixations,
+    pupil) cada pantalla se analiza como una unidad cacheada en disco, y una
+    nueva corrida solo recalcula las pantallas y flujos cuyas entradas cambiaron.
+    """
+    # reshape(-1) en lugar de flatten(): no copia arreglos memory-mapped
+    world_array = np.asarray(world_ts).reshape(-1)
+    if world_array.size == 0:
+        raise ValueError("Archivo world_timestamps.npy vacío o inválido.")
+
+    with _span("Limpieza de gaze") as span:
+        gaze_clean = _prepare_gaze_dataframe(gaze_df)
+        span["Filas"] = len(gaze_clean)
+    total_frames = world_array.shape[0]
+
+    framewise_aoi_codes: list[np.ndarray] = []
+    aoi_categories: dict[str, int] = {}
+    per_screen_rows: list[dict[str, Any]] = []
+    screens: list[dict[str, Any]] = []
+
+    with _span("Unión con pantallas") as span:
+        for idx, row in excel_df.iterrows():
+            mode = str(row.get("Modo", "")).strip() or "Desconocido"
+            pantalla_id = str(row.get("Pantalla_ID") or "").strip()
+            if not pantalla_id:
+                continue
+
+            block_aois = _screen_block_aois(row, pantalla_id, idx)
+            if not block_aois:
+                continue
+
+            t_start = _timestamp_from_frame(row.get("Frame_inicio"), total_frames, world_array)
+            t_end = _timestamp_from_frame(row.get("Frame_fin"), total_frames, world_array)
+            if t_start is None or t_end is None or t_end < t_start:
+                continue
+
+            screens.append(
+                {
+                    "mode": mode,
+                    "pantalla_id": pantalla_id,
+                    "block_aois": block_aois,
+                    "t_start": t_start,
+                    "t_end": t_end,
+                    "row": row,
+                }
+            )
+
+        gaze_ts = gaze_clean["timestamp"].to_numpy(dtype=float)
+        gaze_x = gaze_clean["norm_pos_x"].to_numpy(dtype=float)
+        gaze_y = gaze_clean["norm_pos_y"].to_numpy(dtype=float)
+        gaze_dt = gaze_clean["dt"].to_numpy(dtype=float)
+        screen_starts = np.array([screen["t_start"] for screen in screens], dtype=float)
+        screen_ends = np.array([screen["t_end"] for screen in screens], dtype=float)
+        screen_index = _build_screen_interval_index(gaze_ts, screen_starts, screen_ends)
+
+        fixation_data = _prepare_fixation_arrays(fixations_df)
+        fixation_index = (
+            _build_screen_interval_index(fixation_data["start"], screen_starts, screen_ends)
+            if fixation_data is not None
+            else None
+        )
+        span["Filas"] = len(screens)
+
+    unit_keys = _screen_unit_keys(screens, input_shas)
+    cache_stats = {"screens": len(screens), "screens_recomputed": 0, "pupil_recomputed": False}
+
+    with _span("Hit-test AOI por pantalla") as span:
+        for screen_pos, screen in enumerate(screens):
+            mode = screen["mode"]
+            pantalla_id = screen["pantalla_id"]
+            block_aois = screen["block_aois"]
+            row = screen["row"]
+            screen_duration = float(screen["t_end"] - screen["t_start"])
+
+            # Vistas (sin copia) sobre los arreglos ordenados de gaze
+            lo = screen_index["lo"][screen_pos]
+            hi = screen_index["hi"][screen_pos]
+            aoi_hits, gaze_recomputed = _cached_unit(
+                unit_keys[screen_pos]["gaze"],
+                lambda: _compute_aoi_hits(
+                    gaze_ts[lo:hi], gaze_x[lo:hi], gaze_y[lo:hi], gaze_dt[lo:hi], block_aois
+                ),
+            )
+
+            fixation_hits = None
+            fixations_recomputed = False
+            if fixation_data is not None:
+                fix_lo = fixation_index["lo"][screen_pos]
+                fix_hi = fixation_index["hi"][screen_pos]
+                fixation_hits, fixations_recomputed = _cached_unit(
+                    unit_keys[screen_pos]["fixations"],
+                    lambda: _compute_fixation_aoi_metrics(
+                        fixation_data["start"][fix_lo:fix_hi],
+                        fixation_data["duration"][fix_lo:fix_hi],
+                        fixation_data["x"][fix_lo:fix_hi],
+                        fixation_data["y"][fix_lo:fix_hi],
+                        block_aois,
+                        screen["t_start"],
+                    ),
+                )
+            if gaze_recomputed or fixations_recomputed:
+                cache_stats["screens_recomputed"] += 1
+
+            aoi_global_codes = np.array(
+                [aoi_categories.setdefault(name, len(aoi_categories)) for name in aoi_hits["names"]]
+                + [-1],
+                dtype=np.int32,
+            )
+            # -1 indexa el último elemento (-1): las muestras sin AOI siguen sin AOI
+            framewise_aoi_codes.append(aoi_global_codes[aoi_hits["label_codes"]])
+
+            for aoi_idx, aoi_name in enumerate(aoi_hits["names"]):
+                product, component = (
+                    aoi_name.split("_", 1) + [""] if "_" in aoi_name else [aoi_name, ""]
+                )[:2]
+                screen_row = {
+                    "Modo": mode,
+                    "Pantalla_ID": pantalla_id,
+                    "Pantalla": row.get("Pantalla", ""),
+                    "AOI": aoi_name,
+                    "Producto": product,
+                    "Componente": component,
+                    "Dwell_Time": float(aoi_hits["dwell"][aoi_idx]),
+                    "Fixaciones": int(aoi_hits["counts"][aoi_idx]),
+                    "TFF": float(aoi_hits["tff"][aoi_idx]),
+                    "Segment_Duration": screen_duration,
+                    "Frame_inicio": row.get("Frame_inicio"),
+                    "Frame_fin": row.get("Frame_fin"),
+                }
+                if fixation_hits is not None:
+                    screen_row["Fixation_Count"] = int(fixation_hits["counts"][aoi_idx])
+                    screen_row["Fixation_Dwell_Time"] = float(fixation_hits["dwell"][aoi_idx])
+                    screen_row["First_Fixation_Latency"] = float(
+                        fixation_hits["latency"][aoi_idx]
+                    )
+                per_screen_rows.append(screen_row)
+        span["Filas"] = int(sum(codes.shape[0] for codes in framewise_aoi_codes))
+
+    with _span("Tablas por muestra, pantalla y modo") as span:
+        df_framewise = _build_framewise_table(
+            {"timestamp": gaze_ts, "norm_pos_x": gaze_x, "norm_pos_y": gaze_y, "dt": gaze_dt},
+            screen_index["lo"],
+            screen_index["hi"],
+            framewise_aoi_codes,
+            list(aoi_categories),
+            screens,
+        )
+        df_fixations = _fixations_per_screen_table(fixation_data, fixation_index, screens)
+        df_per_screen = pd.DataFrame(per_screen_rows)
+        if not df_per_screen.empty:
+            df_per_screen = df_per_screen.sort_values(
+                ["Modo", "Pantalla_ID", "AOI"]
+            ).reset_index(drop=True)
+
+        if not df_per_screen.empty:
+            per_mode_aggregations = {
+                "Dwell_Time": "sum",
+                "Fixaciones": "sum",
+                "TFF": "min",
+                "Segment_Duration": "sum",
+            }
+            if "Fixation_Count" in df_per_screen.columns:
+                per_mode_aggregations.update(
+                    {
+                        "Fixation_Count": "sum",
+                        "Fixation_Dwell_Time": "sum",
+                        "First_Fixation_Latency": "min",
+                    }
+                )
+            df_per_mode = (
+                df_per_screen.groupby("Modo", as_index=False)
+                .agg(per_mode_aggregations)
+                .rename(columns={"Segment_Duration": "Total_Duration"})
+                .sort_values("Modo")
+                .reset_index(drop=True)
+            )
+        else:
+            df_per_mode = pd.DataFrame(
+                columns=["Modo", "Dwell_Time", "Fixaciones", "TFF", "Total_Duration"]
+            )
+        span["Filas"] = len(df_framewise)
+
+    blink_results = pd.DataFrame()
+    blinks_per_screen = pd.DataFrame()
+    with _span("Conteo de parpadeos") as span:
+        if blink_df is not None:
+            blink_start_col = _find_first_column(
+                blink_df,
+                [
+                    "start_timestamp",
+                    "start_time",
+                    "start",
+                    "t_start",
+                    "timestamp_start",
+                ],
+            )
+            blink_end_col = _find_first_column(
+                blink_df,
+                ["end_timestamp", "end_time", "end", "t_end", "timestamp_end"],
+            )
+            if blink_start_col and blink_end_col and screens:
+                blink_starts = pd.to_numeric(blink_df[blink_start_col], errors="coerce").to_numpy(dtype=float)
+                blink_ends = pd.to_numeric(blink_df[blink_end_col], errors="coerce").to_numpy(dtype=float)
+                screen_starts = np.array([screen["t_start"] for screen in screens], dtype=float)
+                screen_ends = np.array([screen["t_end"] for screen in screens], dtype=float)
+                overlap_counts, overlap_time = _count_interval_overlaps(
+                    blink_starts, blink_ends, screen_starts, screen_ends
+                )
+                blinks_per_screen = pd.DataFrame(
+                    {
+                        "Modo": [screen["mode"] for screen in screens],
+                        "Pantalla_ID": [screen["pantalla_id"] for screen in screens],
+                        "Pantalla": [screen["row"].get("Pantalla", "") for screen in screens],
+                        "Blinks": overlap_counts,
+                        "Blink_Duration": overlap_time,
+                        "Duration": np.maximum(screen_ends - screen_starts, 0.0),
+                    }
+                )
+                blink_results = (
+                    blinks_per_screen.groupby("Modo", as_index=False)
+                    .agg({"Blinks": "sum", "Blink_Duration": "sum", "Duration": "sum"})
+                    .sort_values("Modo")
+                    .reset_index(drop=True)
+                )
+                for blink_table in (blinks_per_screen, blink_results):
+                    durations = blink_table["Duration"].to_numpy(dtype=float)
+                    blink_table["Duration_Without_Blinks"] = np.maximum(
+                        durations - blink_table["Blink_Duration"].to_numpy(dtype=float), 0.0
+                    )
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        blink_table["Blink_Rate_Hz"] = np.where(
+                            durations > 0,
+                            blink_table["Blinks"].to_numpy(dtype=float) / durations,
+                            np.nan,
+                        )
+        span["Filas"] = len(blink_df) if blink_df is not None else 0
+
+    pupil_per_screen = pd.DataFrame()
+    pupil_per_aoi = pd.DataFrame()
+    pupil_key = _pupil_stage_key(unit_keys, input_shas, list(aoi_categories))
+    with _span("Métricas de pupila") as span:
+        cached_pupil = _load_analysis_cache(pupil_key)
+        if cached_pupil is not None:
+            pupil_per_screen, pupil_per_aoi = cached_pupil
+        else:
+            pupil_data = _prepare_pupil_arrays(pupil_df)
+            if pupil_data is not None and screens:
+                pupil_per_screen, pupil_per_aoi = _compute_pupil_metrics(
+                    pupil_data,
+                    screens,
+                    screen_starts,
+                    screen_ends,
+                    gaze_ts,
+                    screen_index["lo"],
+                    screen_index["hi"],
+                    framewise_aoi_codes,
+                    list(aoi_categories),
+                )
+                _store_analysis_cache(pupil_key, (pupil_per_screen, pupil_per_aoi))
+                cache_stats["pupil_recomputed"] = True
+        span["Filas"] = len(pupil_df) if isinstance(pupil_df, pd.DataFrame) else 0
+
+    with _span("Secuencia de AOIs") as span:
+        scanpath = _compute_scanpath_metrics(
+            screens,
+            framewise_aoi_codes,
+            gaze_dt,
+            screen_index["lo"],
+            screen_index["hi"],
+            list(aoi_categories),
+        )
+        span["Filas"] = len(scanpath["transitions_per_screen"])
+
+    results = {
+        "df_app": excel_df,
+        "framewise_gaze": df_framewise,
+        "fixations_per_screen": df_fixations,
+        "per_screen": df_per_screen,
+        "per_mode": df_per_mode,
+        "blinks_per_mode": blink_results,
+        "blinks_per_screen": blinks_per_screen,
+        "pupil_per_screen": pupil_per_screen,
+        "pupil_per_aoi": pupil_per_aoi,
+        **scanpath,
+        "analysis_cache": cache_stats,
+    }
+
+    if isinstance(pupil_df, pd.DataFrame):
+        results["pupil_raw"] = pupil_df
+    if isinstance(export_info_df, pd.DataFrame):
+        results["export_info"] = export_info_df
+
+    return results
+
+
+HEATMAP_BINS = 64
+HEATMAP_SIGMA_BINS = 1.5
+
+
+def _gaussian_blur_matrix(size: int, sigma_bins: float) -> np.ndarray:
+    """Matriz (size × size) de convolución gaussiana 1D, normalizada por fila."""
+    positions = np.arange(size)
+    kernel = np.exp(-0.5 * ((positions[:, None] - positions[None, :]) / sigma_bins) ** 2)
+    return kernel / kernel.sum(axis=1, keepdims=True)
+
+
+def _gaze_heatmap_grid(
+    x: np.ndarray,
+    y: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    bins: int = HEATMAP_BINS,
+    sigma_bins: float = HEATMAP_SIGMA_BINS,
+) -> np.ndarray:
+    """
+    Rejilla (bins × bins, filas = y) con np.histogram2d sobre [0, 1]² y desenfoque
+    gaussiano separable aplicado como K · H · Kᵀ.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.isfinite(x) & np.isfinite(y)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[valid]
+    grid, _, _ = np.histogram2d(
+        y[valid], x[valid], bins=bins, range=[[0.0, 1.0], [0.0, 1.0]], weights=weights
+    )
+    if sigma_bins and sigma_bins > 0:
+        blur = _gaussian_blur_matrix(bins, sigma_bins)
+        grid = blur @ grid @ blur.T
+    return grid
+
+
+def _compute_gaze_heatmaps(
+    framewise: pd.DataFrame,
+    bins: int = HEATMAP_BINS,
+    sigma_bins: float = HEATMAP_SIGMA_BINS,
+    weight_by_dt: bool = True,
+) -> pd.DataFrame:
+    """
+    Heatmaps binned del gaze framewise: uno global, uno por modo y uno por
+    pantalla. Devuelve una tabla larga pequeña (Vista, x, y, Intensidad) con
+    celdas normalizadas a [0, 1] por vista, lista para graficar.
+    """
+    columns = ["Vista", "x", "y", "Intensidad"]
+    if not isinstance(framewise, pd.DataFrame) or framewise.empty:
+        return pd.DataFrame(columns=columns)
+
+    x = framewise["norm_pos_x"].to_numpy(dtype=float)
+    y = framewise["norm_pos_y"].to_numpy(dtype=float)
+    weights = (
+        framewise["dt"].to_numpy(dtype=float)
+        if weight_by_dt and "dt" in framewise.columns
+        else None
+    )
+
+    views: list[tuple[str, np.ndarray]] = [("Todas las pantallas", np.arange(len(framewise)))]
+    for column, prefix in (("Modo", "Modo"), ("Pantalla_ID", "Pantalla")):
+        if column not in framewise.columns:
+            continue
+        for value, positions in framewise.groupby(column, sort=True, observed=True).indices.items():
+            views.append((f"{prefix} · {value}", positions))
+
+    centers = (np.arange(bins) + 0.5) / bins
+    grid_x = np.tile(centers, bins)
+    grid_y = np.repeat(centers, bins)
+    frames = []
+    for label, positions in views:
+        grid = _gaze_heatmap_grid(
+            x[positions],
+            y[positions],
+            weights[positions] if weights is not None else None,
+            bins=bins,
+            sigma_bins=sigma_bins,
+        )
+        peak = grid.max()
+        if peak <= 0:
+            continue
+        frames.append(
+            pd.DataFrame(
+                {
+                    "Vista": label,
+                    "x": grid_x,
+                    "y": grid_y,
+                    "Intensidad": (grid / peak).reshape(-1).astype(np.float32),
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_SHEET_NAME_MAX = 31
+EXCEL_ROW_BLOCK = 50_000
+FRAMEWISE_ARCHIVE_CSV = "gaze_framewise.csv"
+FRAMEWISE_ARCHIVE_PARQUET = "gaze_framewise.parquet"
+
+
+def _iter_excel_rows(df: pd.DataFrame):
+    # Convierte por bloques para no materializar toda la hoja como objetos Python.
+    for offset in range(0, len(df), EXCEL_ROW_BLOCK):
+        block = df.iloc[offset: offset + EXCEL_ROW_BLOCK]
+        block = block.astype(object).where(block.notna(), None)
+        yield from block.itertuples(index=False, name=None)
+
+
+def _excel_part_name(sheet_name: str, part: int) -> str:
+    if part == 0:
+        return sheet_name[:EXCEL_SHEET_NAME_MAX]
+    suffix = f"_{part + 1}"
+    return sheet_name[: EXCEL_SHEET_NAME_MAX - len(suffix)] + suffix
+
+
+def _write_sheet_streaming(workbook, sheet_name: str, df_value) -> list[str]:
+    """Escribe una hoja en modo write-only, partiéndola si supera el límite de Excel."""
+    if not isinstance(df_value, pd.DataFrame) or df_value.empty:
+        workbook.create_sheet(title=_excel_part_name(sheet_name, 0))
+        return [sheet_name]
+
+    header = [str(column) for column in df_value.columns]
+    rows_per_sheet = EXCEL_MAX_ROWS - 1
+    written = []
+    for part, offset in enumerate(range(0, len(df_value), rows_per_sheet)):
+        title = _excel_part_name(sheet_name, part)
+        worksheet = workbook.create_sheet(title=title)
+        worksheet.append(header)
+        for row in _iter_excel_rows(df_value.iloc[offset: offset + rows_per_sheet]):
+            worksheet.append(row)
+        written.append(title)
+    return written
+
+
+def export_final_excel(
+    results_dict, include_framewise: bool = True, include_pupil_raw: bool = False
+) -> bytes:
+    """Excel final en modo write-only (memoria constante por hoja).
+
+    Con `include_framewise=False` se omite Gaze_Framewise; para esos datos
+    usa `export_framewise_archive`. Pupil_Raw solo se escribe si se pide con
+    `include_pupil_raw`; por defecto van los resúmenes Pupil_Por_*.
+    """
+    resumen = results_dict.get("excel_resumen")
+    if not isinstance(resumen, pd.DataFrame):
+        resumen = results_dict.get("df_app")
+    sheet_order = [("Resumen_App", resumen)]
+    if include_framewise:
+        sheet_order.append(("Gaze_Framewise", results_dict.get("framewise_gaze")))
+    sheet_order += [
+        ("AOI_Por_Pantalla", results_dict.get("per_screen")),
+        ("AOI_Por_Modo", results_dict.get("per_mode")),
+    ]
+
+    if isinstance(results_dict.get("blinks_per_mode"), pd.DataFrame):
+        sheet_order.append(("Blinks_Por_Modo", results_dict.get("blinks_per_mode")))
+    if isinstance(results_dict.get("blinks_per_screen"), pd.DataFrame):
+        sheet_order.append(("Blinks_Por_Pantalla", results_dict.get("blinks_per_screen")))
+    for sheet_name, key in [
+        ("Scanpath_Por_Pantalla", "scanpath_per_screen"),
+        ("Scanpath_Por_Modo", "scanpath_per_mode"),
+        ("Transiciones_Por_Pantalla", "transitions_per_screen"),
+        ("Transiciones_Por_Modo", "transitions_per_mode"),
+    ]:
+        if isinstance(results_dict.get(key), pd.DataFrame):
+            sheet_order.append((sheet_name, results_dict.get(key)))
+    if isinstance(results_dict.get("pupil_per_screen"), pd.DataFrame):
+        sheet_order.append(("Pupil_Por_Pantalla", results_dict.get("pupil_per_screen")))
+    if isinstance(results_dict.get("pupil_per_aoi"), pd.DataFrame):
+        sheet_order.append(("Pupil_Por_AOI", results_dict.get("pupil_per_aoi")))
+    if include_pupil_raw and isinstance(results_dict.get("pupil_raw"), pd.DataFrame):
+        sheet_order.append(("Pupil_Raw", results_dict.get("pupil_raw")))
+    if isinstance(results_dict.get("export_info"), pd.DataFrame):
+        sheet_order.append(("Export_Info", results_dict.get("export_info")))
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, df_value in sheet_order:
+        _write_sheet_streaming(workbook, sheet_name, df_value)
+
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def _parquet_available() -> bool:
+    return any(
+        importlib.util.find_spec(engine) is not None for engine in ("pyarrow", "fastparquet")
+    )
+
+
+def export_framewise_archive(results_dict, file_format: Optional[str] = None) -> bytes:
+    """ZIP con la tabla Gaze_Framewise en Parquet (si hay motor) o CSV por bloques."""
+    framewise = results_dict.get("framewise_gaze")
+    if not isinstance(framewise, pd.DataFrame):
+        framewise = pd.DataFrame()
+    if file_format is None:
+        file_format = "parquet" if _parquet_available() else "csv"
+
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        if file_format == "parquet":
+            with archive.open(FRAMEWISE_ARCHIVE_PARQUET, "w") as handle:
+                framewise.to_parquet(handle, index=False)
+        elif file_format == "csv":
+            with archive.open(FRAMEWISE_ARCHIVE_CSV, "w") as raw_handle:
+                with io.TextIOWrapper(raw_handle, encoding="utf-8", newline="") as handle:
+                    if framewise.empty:
+                        framewise.to_csv(handle, index=False)
+                    for offset in range(0, len(framewise), CSV_CHUNK_ROWS):
+                        framewise.iloc[offset: offset + CSV_CHUNK_ROWS].to_csv(
+                            handle, index=False, header=offset == 0
+                        )
+        else:
+            raise ValueError(f"Formato no soportado para Gaze_Framewise: {file_format}")
+    return buffer.getvalue()
+
+
+CSV_CHUNK_ROWS = 200_000
+CSV_SNIFF_BYTES = 1 << 20
+PUPIL_TIMESTAMP_COLUMNS = ["pupil_timestamp", "timestamp", "world_timestamp", "time", "ts"]
+PUPIL_VALUE_COLUMNS = [
+    "eye_id",
+    "confidence",
+    "norm_pos_x",
+    "norm_pos_y",
+    "diameter",
+    "diameter_3d",
+]
+
+
+def _csv_source_handle(source):
+    """Devuelve un objeto legible por pandas a partir de bytes, ruta o buffer."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    if isinstance(source, (str, Path)):
+        return str(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def _detect_csv_encoding(source) -> str:
+    """
+    Detecta la codificación validando el contenido por bloques (sin parsear el CSV
+    ni cargar una copia decodificada completa). utf-8-sig cubre también utf-8 sin BOM.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            for offset in range(0, len(view), CSV_SNIFF_BYTES):
+                decoder.decode(view[offset : offset + CSV_SNIFF_BYTES])
+        elif isinstance(source, (str, Path)):
+            with open(source, "rb") as handle:
+                for block in iter(lambda: handle.read(CSV_SNIFF_BYTES), b""):
+                    decoder.decode(block)
+        else:
+            source.seek(0)
+            for block in iter(lambda: source.read(CSV_SNIFF_BYTES), b""):
+                decoder.decode(block)
+            source.seek(0)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "latin1"
+    return "utf-8-sig"
+
+
+def _iter_csv_chunks(
+    source,
+    nombre_archivo: str,
+    pick_columns,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+):
+    """
+    Itera un CSV por bloques leyendo solo las columnas que elige pick_columns
+    (recibe la lista del encabezado y devuelve el mapeo columna → nombre final).
+    """
+    encoding = _detect_csv_encoding(source)
+    header = pd.read_csv(_csv_source_handle(source), encoding=encoding, nrows=0)
+    column_map = pick_columns(list(header.columns))
+    if not column_map:
+        raise ValueError(
+            f"{nombre_archivo} no contiene las columnas esperadas de Pupil Labs."
+        )
+    reader = pd.read_csv(
+        _csv_source_handle(source),
+        encoding=encoding,
+        usecols=list(column_map.keys()),
+        chunksize=chunk_rows,
+        low_memory=True,
+    )
+    for chunk in reader:
+        yield chunk.rename(columns=column_map)
+
+
+def _stream_gaze_csv(
+    source, nombre_archivo: str = "gaze_positions.csv", chunk_rows: int = CSV_CHUNK_ROWS
+) -> pd.DataFrame:
+    """
+    Ingesta por bloques de gaze_positions.csv: solo lee las columnas que reconoce
+    _prepare_gaze_dataframe, aplica el filtro de confianza y calcula dt bloque a
+    bloque (arrastrando el último timestamp), con coordenadas en float32. El
+    timestamp se mantiene en float64 para no perder resolución temporal.
+    """
+
+    def _pick(columns: list[str]) -> dict[str, str]:
+        frame = pd.DataFrame(columns=columns)
+        timestamp_col = _find_first_column(frame, GAZE_TIMESTAMP_COLUMNS)
+        if timestamp_col is None:
+            raise ValueError(
+                "gaze_positions.csv debe incluir una columna de tiempo reconocida (timestamp)."
+            )
+        picked = {timestamp_col: "timestamp"}
+        for candidates, target in (
+            (GAZE_X_COLUMNS, "norm_pos_x"),
+            (GAZE_Y_COLUMNS, "norm_pos_y"),
+            (GAZE_CONFIDENCE_COLUMNS, "confidence"),
+        ):
+            found = _find_first_column(frame, candidates)
+            if found is not None:
+                picked[found] = target
+        return picked
+
+    parts: list[pd.DataFrame] = []
+    previous_ts = np.nan
+    is_sorted = True
+    for chunk in _iter_csv_chunks(source, nombre_archivo, _pick, chunk_rows):
+        timestamps = pd.to_numeric(chunk["timestamp"], errors="coerce").to_numpy(dtype=float)
+        length = timestamps.shape[0]
+        if "confidence" in chunk.columns:
+            confidence = (
+                pd.to_numeric(chunk["confidence"], errors="coerce")
+                .fillna(0)
+                .to_numpy(dtype=np.float32)
+            )
+        else:
+            confidence = np.ones(length, dtype=np.float32)
+        coords = {}
+        for column in ("norm_pos_x", "norm_pos_y"):
+            if column in chunk.columns:
+                coords[column] = pd.to_numeric(chunk[column], errors="coerce").to_numpy(
+                    dtype=np.float32
+                )
+            else:
+                coords[column] = np.full(length, np.nan, dtype=np.float32)
+
+        keep = np.isfinite(timestamps) & (confidence >= GAZE_MIN_CONFIDENCE)
+        timestamps = timestamps[keep]
+        if timestamps.size == 0:
+            continue
+        if np.any(np.diff(timestamps) < 0) or timestamps[0] < previous_ts:
+            is_sorted = False
+
+        dt = np.diff(timestamps, prepend=previous_ts)
+        dt = np.clip(dt, 0, 1)
+        dt[np.isnan(dt)] = GAZE_DEFAULT_DT
+        previous_ts = timestamps[-1]
+
+        parts.append(
+            pd.DataFrame(
+                {
+                    "timestamp": timestamps,
+                    "norm_pos_x": coords["norm_pos_x"][keep],
+                    "norm_pos_y": coords["norm_pos_y"][keep],
+                    "confidence": confidence[keep],
+                    "dt": dt.astype(np.float32),
+                }
+            )
+        )
+
+    if parts:
+        clean = pd.concat(parts, ignore_index=True)
+    else:
+        clean = pd.DataFrame(
+            {
+                "timestamp": pd.Series(dtype=float),
+                "norm_pos_x": pd.Series(dtype=np.float32),
+                "norm_pos_y": pd.Series(dtype=np.float32),
+                "confidence": pd.Series(dtype=np.float32),
+                "dt": pd.Series(dtype=np.float32),
+            }
+        )
+
+    if not is_sorted:
+        # Exportación desordenada: se ordena y dt se recalcula sobre la tabla ya reducida
+        clean = clean.sort_values("timestamp", kind="stable").reset_index(drop=True)
+        dt = clean["timestamp"].diff().clip(lower=0, upper=1).fillna(GAZE_DEFAULT_DT)
+        clean["dt"] = dt.astype(np.float32)
+
+    clean.attrs["gaze_clean"] = True
+    return clean
+
+
+def _stream_pupil_csv(
+    source, nombre_archivo: str = "pupil_positions.csv", chunk_rows: int = CSV_CHUNK_ROWS
+) -> pd.DataFrame:
+    """
+    Ingesta por bloques de pupil_positions.csv: descarta las decenas de columnas
+    del modelo 3D y conserva timestamp/ojo/confianza/posición/diámetros en
+    float32. No filtra filas: Pupil_Raw y las métricas de pupila ven las mismas
+    muestras que con el CSV completo.
+    """
+
+    def _pick(columns: list[str]) -> dict[str, str]:
+        frame = pd.DataFrame(columns=columns)
+        timestamp_col = _find_first_column(frame, PUPIL_TIMESTAMP_COLUMNS)
+        if timestamp_col is None:
+            return {}
+        picked = {timestamp_col: "timestamp"}
+        for column in PUPIL_VALUE_COLUMNS:
+            if column in columns:
+                picked[column] = column
+        if "method" in columns:
+            picked["method"] = "method"
+        return picked
+
+    parts: list[pd.DataFrame] = []
+    for chunk in _iter_csv_chunks(source, nombre_archivo, _pick, chunk_rows):
+        reduced = pd.DataFrame(
+            {"timestamp": pd.to_numeric(chunk["timestamp"], errors="coerce").to_numpy(dtype=float)}
+        )
+        for column in PUPIL_VALUE_COLUMNS:
+            if column in chunk.columns:
+                reduced[column] = pd.to_numeric(chunk[column], errors="coerce").to_numpy(
+                    dtype=np.float32
+                )
+        if "method" in chunk.columns:
+            reduced["method"] = chunk["method"].astype(str).to_numpy()
+        parts.append(reduced)
+
+    if not parts:
+        return pd.DataFrame()
+    pupil = pd.concat(parts, ignore_index=True)
+    if "method" in pupil.columns:
+        pupil["method"] = pupil["method"].astype("category")
+    return pupil
+
+
+LOCAL_CACHE_DIR = Path("/tmp/smartcore_cache")
+# Entradas usadas hace menos que esto no se expulsan (pueden estar leyéndose),
+# mientras no pasen del límite de la caché en más de CACHE_PIN_MAX_OVERSHOOT
+CACHE_PIN_SECONDS = 30 * 60
+CACHE_PIN_MAX_OVERSHOOT = 0.5
+GAZE_CACHE_DIR = LOCAL_CACHE_DIR / "gaze"
+GAZE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+GAZE_CACHE_COLUMNS = ["timestamp", "norm_pos_x", "norm_pos_y", "confidence", "dt"]
+GAZE_CACHE_VERSION = f"v1-c{GAZE_MIN_CONFIDENCE}"
+
+
+def _cache_entry_size(entry: Path) -> int:
+    if entry.is_file():
+        return entry.stat().st_size
+    return sum(item.stat().st_size for item in entry.rglob("*") if item.is_file())
+
+
+def _enforce_cache_budget(root: Path, max_bytes: int) -> None:
+    """
+    Expulsa las entradas usadas hace más tiempo (mtime) hasta quedar bajo el
+    límite. Las usadas en los últimos CACHE_PIN_SECONDS se conservan aunque se
+    pase del límite (otra sesión puede haberlas recibido y estar por leerlas),
+    pero solo hasta CACHE_PIN_MAX_OVERSHOOT por encima; más allá se expulsan
+    también, las más viejas primero.
+    """
+    if not root.exists():
+        return
+    pinned_since = time.time() - CACHE_PIN_SECONDS
+    pinned_limit = max_bytes * (1.0 + CACHE_PIN_MAX_OVERSHOOT)
+    entries = []
+    for entry in root.iterdir():
+        if entry.name.startswith(".tmp"):
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, _cache_entry_size(entry), entry))
+        except OSError:
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        try:
+            # Releer el mtime: pudo usarse mientras se recorría el directorio
+            if entry.stat().st_mtime >= pinned_since and total <= pinned_limit:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+        except OSError:
+            continue
+        total -= size
+
+
+def _gaze_cache_path(blob_sha: str) -> Path:
+    return GAZE_CACHE_DIR / f"{blob_sha}-{GAZE_CACHE_VERSION}"
+
+
+def _load_cached_gaze(blob_sha: Optional[str]) -> Optional[pd.DataFrame]:
+    """Abre (memory-mapped) el gaze limpio guardado para ese blob SHA, si existe."""
+    if not blob_sha:
+        return None
+    entry = _gaze_cache_path(blob_sha)
+    if not (entry / "meta.json").exists():
+        return None
+    try:
+        columns = {
+            column: np.load(entry / f"{column}.npy", mmap_mode="r")
+            for column in GAZE_CACHE_COLUMNS
+        }
+        os.utime(entry)
+    except (OSError, ValueError):
+        return None
+    gaze_clean = pd.DataFrame(columns, copy=False)
+    gaze_clean.attrs["gaze_clean"] = True
+    return gaze_clean
+
+
+def _store_cached_gaze(blob_sha: Optional[str], gaze_clean: pd.DataFrame) -> None:
+    """Guarda el gaze limpio como un .npy por columna, indexado por el SHA del blob."""
+    if not blob_sha or gaze_clean.empty:
+        return
+    entry = _gaze_cache_path(blob_sha)
+    if (entry / "meta.json").exists():
+        return
+    try:
+        GAZE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".tmp", dir=GAZE_CACHE_DIR))
+        for column in GAZE_CACHE_COLUMNS:
+            np.save(staging / f"{column}.npy", gaze_clean[column].to_numpy())
+        (staging / "meta.json").write_text(
+            json.dumps({"sha": blob_sha, "rows": int(len(gaze_clean))})
+        )
+        try:
+            os.replace(staging, entry)
+        except OSError:
+            # Otro proceso ya publicó la misma entrada
+            shutil.rmtree(staging, ignore_errors=True)
+        _enforce_cache_budget(GAZE_CACHE_DIR, GAZE_CACHE_MAX_BYTES)
+    except OSError:
+        return
+
+
+TIMESTAMPS_CACHE_DIR = LOCAL_CACHE_DIR / "world_timestamps"
+TIMESTAMPS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+@lru_cache(maxsize=32)
+def _open_world_timestamps(path: str, inode: int, size: int) -> np.ndarray:
+    return np.load(path, mmap_mode="r", allow_pickle=False).reshape(-1)
+
+
+def _load_world_timestamps(path) -> Optional[np.ndarray]:
+    """Abre un world_timestamps.npy memory-mapped, una sola vez por archivo."""
+    try:
+        stat = Path(path).stat()
+        return _open_world_timestamps(str(path), stat.st_ino, stat.st_size)
+    except (OSError, ValueError):
+        return None
+
+
+def _cached_world_timestamps(
+    blob_sha: Optional[str], raw: Optional[bytes] = None
+) -> Optional[np.ndarray]:
+    """
+    world_timestamps.npy de un participante desde la caché local (por SHA del
+    blob), memory-mapped. Si no está y se pasan los bytes descargados, los guarda
+    primero; sin SHA solo se cargan en memoria.
+    """
+    if blob_sha:
+        entry = TIMESTAMPS_CACHE_DIR / f"{blob_sha}.npy"
+        if entry.exists():
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+            cached = _load_world_timestamps(entry)
+            if cached is not None:
+                return cached
+    if raw is None:
+        return None
+    if not blob_sha:
+        return np.load(BytesIO(raw), allow_pickle=False).reshape(-1)
+
+    try:
+        TIMESTAMPS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        handle, staging = tempfile.mkstemp(prefix=".tmp", dir=TIMESTAMPS_CACHE_DIR)
+        with os.fdopen(handle, "wb") as staging_file:
+            staging_file.write(raw)
+        os.replace(staging, entry)
+        _enforce_cache_budget(TIMESTAMPS_CACHE_DIR, TIMESTAMPS_CACHE_MAX_BYTES)
+    except OSError:
+        return np.load(BytesIO(raw), allow_pickle=False).reshape(-1)
+    cached = _load_world_timestamps(entry)
+    if cached is None:
+        return np.load(BytesIO(raw), allow_pickle=False).reshape(-1)
+    return cached
+
+
+def _frames_for_timestamps(
+    world_ts: Optional[np.ndarray], timestamps_seconds
+) -> pd.Series:
+    """
+    Convierte todos los tiempos (s) a índices de frame con un solo searchsorted.
+    Los valores faltantes, o la ausencia de world_timestamps, quedan como <NA>.
+    """
+    values = np.asarray(
+        pd.to_numeric(pd.Series(timestamps_seconds, dtype=object), errors="coerce"),
+        dtype=float,
+    )
+    if world_ts is None or values.size == 0:
+        return pd.Series(pd.NA, index=range(values.size), dtype="Int64")
+    frames = np.searchsorted(world_ts, values).astype(float)
+    frames[~np.isfinite(values)] = np.nan
+    return pd.Series(frames).astype("Int64")
+
+
+VIDEO_CACHE_DIR = LOCAL_CACHE_DIR / "video"
+VIDEO_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+VIDEO_CHUNK_BYTES = 1024 * 1024
+
+
+def _cached_video_path(blob_sha: Optional[str]) -> Optional[Path]:
+    """Ruta local del video de ese blob SHA si ya está en caché (renueva su mtime)."""
+    if not blob_sha:
+        return None
+    entry = VIDEO_CACHE_DIR / f"{blob_sha}.mp4"
+    try:
+        os.utime(entry)
+    except OSError:
+        return None
+    return entry
+
+
+def _publish_chunks(root: Path, name: str, chunks, max_bytes: int) -> Path:
+    """
+    Escribe los bloques en un archivo temporal de `root` y lo publica con
+    os.replace como `name`, sin tener nunca el archivo completo en memoria.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    handle, staging = tempfile.mkstemp(prefix=".tmp", dir=root)
+    try:
+        with os.fdopen(handle, "wb") as staging_file:
+            for chunk in chunks:
+                if chunk:
+                    staging_file.write(chunk)
+        entry = root / name
+        os.replace(staging, entry)
+    except BaseException:
+        Path(staging).unlink(missing_ok=True)
+        raise
+    _enforce_cache_budget(root, max_bytes)
+    return entry
+
+
+def _store_video_chunks(blob_sha: str, chunks) -> Optional[Path]:
+    try:
+        entry = _publish_chunks(VIDEO_CACHE_DIR, f"{blob_sha}.mp4", chunks, VIDEO_CACHE_MAX_BYTES)
+    except OSError:
+        return None
+    return entry if entry.exists() else None
+
+
+# Espejo local de los blobs del repo, direccionado por SHA de git: el mismo
+# SHA es siempre el mismo contenido, así que nunca hay que invalidarlo.
+BLOB_MIRROR_DIR = LOCAL_CACHE_DIR / "blobs"
+BLOB_MIRROR_MAX_BYTES = int(
+    os.environ.get("SMARTCORE_BLOB_MIRROR_BYTES", 2 * 1024 * 1024 * 1024)
+)
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def _mirrored_blob_path(blob_sha: Optional[str]) -> Optional[Path]:
+    """Ruta del blob en el espejo local si ya está (renueva su mtime para el LRU)."""
+    if not blob_sha:
+        return None
+    entry = BLOB_MIRROR_DIR / blob_sha
+    try:
+        os.utime(entry)
+    except OSError:
+        return None
+    return entry
+
+
+def _store_mirror_chunks(blob_sha: str, chunks) -> Path:
+    return _publish_chunks(BLOB_MIRROR_DIR, blob_sha, chunks, BLOB_MIRROR_MAX_BYTES)
+
+
+ANALYSIS_CACHE_DIR = LOCAL_CACHE_DIR / "analysis"
+ANALYSIS_CACHE_MAX_BYTES = 512 * 1024 * 1024
+ANALYSIS_CACHE_VERSION = "v3"
+
+
+def _encode_analysis_value(value: Any) -> dict[str, np.ndarray]:
+    """
+    Pasa una unidad de análisis a arreglos para np.savez (sin pickle): los
+    dicts de hit-test (nombres de AOI + arreglos numéricos) y las tuplas de
+    DataFrames de pupila. Las columnas no numéricas van como JSON.
+    """
+    arrays: dict[str, np.ndarray] = {}
+    if isinstance(value, dict):
+        manifest: dict[str, Any] = {"kind": "unit", "names": [str(name) for name in value["names"]]}
+        manifest["fields"] = [field for field in value if field != "names"]
+        for field in manifest["fields"]:
+            arrays[f"unit/{field}"] = np.asarray(value[field])
+    elif isinstance(value, tuple) and all(isinstance(frame, pd.DataFrame) for frame in value):
+        manifest = {"kind": "frames", "frames": []}
+        for frame_pos, frame in enumerate(value):
+            columns = []
+            for col_pos, column in enumerate(frame.columns):
+                series = frame[column]
+                key = f"frame{frame_pos}/{col_pos}"
+                numeric = isinstance(series.dtype, np.dtype) and (
+                    pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+                )
+                if numeric:
+                    arrays[key] = series.to_numpy()
+                else:
+                    values = series.astype(object).where(series.notna(), None).tolist()
+                    arrays[key] = np.array(json.dumps(values, default=str))
+                columns.append({"name": column, "dtype": str(series.dtype), "json": not numeric})
+            manifest["frames"].append(columns)
+    else:
+        raise TypeError(f"Tipo no soportado en la caché de análisis: {type(value).__name__}")
+    arrays["manifest"] = np.array(json.dumps(manifest, default=str))
+    return arrays
+
+
+def _decode_analysis_value(data) -> Any:
+    manifest = json.loads(str(data["manifest"]))
+    if manifest["kind"] == "unit":
+        return {
+            "names": manifest["names"],
+            **{field: data[f"unit/{field}"] for field in manifest["fields"]},
+        }
+    frames = []
+    for frame_pos, columns in enumerate(manifest["frames"]):
+        frame_data = {}
+        for col_pos, column in enumerate(columns):
+            stored = data[f"frame{frame_pos}/{col_pos}"]
+            if column["json"]:
+                series = pd.Series(json.loads(str(stored)), dtype=object)
+                if column["dtype"] != "object":
+                    series = series.astype(column["dtype"])
+                frame_data[column["name"]] = series
+            else:
+                frame_data[column["name"]] = stored
+        frames.append(pd.DataFrame(frame_data, columns=[column["name"] for column in columns]))
+    return tuple(frames)
+
+
+def _load_analysis_cache(key: Optional[str]) -> Any:
+    """
+    Resultado de una unidad de análisis guardado con esa clave, o None. Se lee
+    con allow_pickle=False; una entrada ilegible (p. ej. de otra versión de
+    pandas/numpy) se borra y cuenta como fallo de caché.
+    """
+    if not key:
+        return None
+    entry = ANALYSIS_CACHE_DIR / f"{key}.npz"
+    try:
+        with np.load(entry, allow_pickle=False) as data:
+            value = _decode_analysis_value(data)
+        os.utime(entry)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        entry.unlink(missing_ok=True)
+        return None
+    return value
+
+
+def _store_analysis_cache(key: Optional[str], value: Any) -> None:
+    if not key:
+        return
+    try:
+        arrays = _encode_analysis_value(value)
+        ANALYSIS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        handle, staging = tempfile.mkstemp(prefix=".tmp", dir=ANALYSIS_CACHE_DIR)
+        try:
+            with os.fdopen(handle, "wb") as staging_file:
+                np.savez(staging_file, **arrays)
+            os.replace(staging, ANALYSIS_CACHE_DIR / f"{key}.npz")
+        except BaseException:
+            Path(staging).unlink(missing_ok=True)
+            raise
+        _enforce_cache_budget(ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_MAX_BYTES)
+    except (OSError, TypeError, ValueError):
+        return
+
+
+OVERLAY_CACHE_DIR = LOCAL_CACHE_DIR / "overlays"
+OVERLAY_CACHE_MAX_BYTES = 256 * 1024 * 1024
+OVERLAY_CACHE_VERSION = "v1"
+OVERLAY_SIZE = (1280, 720)
+OVERLAY_MAX_GAZE_POINTS = 2000
+OVERLAY_FIXATION_RADIUS = (6, 28)
+
+
+def _screen_stimuli(excel_df: pd.DataFrame) -> dict[str, dict[str, Any]]:
+    """
+    Pantalla_ID → modo, productos visibles (hoja "Resumen") y AOIs de esa
+    pantalla, en el orden del Excel. Los AOIs se resuelven igual que en
+    integrate_app_with_pupil; las pantallas sin AOIs propios se omiten.
+    """
+    stimuli: dict[str, dict[str, Any]] = {}
+    if not isinstance(excel_df, pd.DataFrame) or excel_df.empty:
+        return stimuli
+    for idx, row in excel_df.iterrows():
+        pantalla_id = str(row.get("Pantalla_ID") or "").strip()
+        if not pantalla_id or pantalla_id in stimuli:
+            continue
+        block_aois = _screen_block_aois(row, pantalla_id, idx)
+        if not block_aois:
+            continue
+        raw_products = row.get("Productos visibles en pantalla")
+        products = (
+            [name.strip() for name in raw_products.split(",") if name.strip()]
+            if isinstance(raw_products, str)
+            else []
+        )
+        stimuli[pantalla_id] = {
+            "mode": str(row.get("Modo", "")).strip() or "Desconocido",
+            "products": products,
+            "block_aois": block_aois,
+        }
+    return stimuli
+
+
+def _norm_to_canvas(
+    x: np.ndarray, y: np.ndarray, size: tuple[int, int]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Coordenadas normalizadas → píxeles del lienzo (n × 2), con el mismo origen
+    que los AOIs del hit-test. Descarta puntos fuera de [0, 1]² y devuelve
+    también la máscara de los que se conservaron.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    inside = np.isfinite(x) & np.isfinite(y) & (x >= 0) & (x <= 1) & (y >= 0) & (y <= 1)
+    scale = np.array([size[0] - 1, size[1] - 1], dtype=float)
+    return np.column_stack([x[inside], y[inside]]) * scale, inside
+
+
+def _overlay_cache_path(participant_id: str, pantalla_id: str, key: str) -> Path:
+    def _slug(value: str) -> str:
+        return re.sub(r"[^0-9A-Za-z_-]+", "_", str(value)).strip("_") or "sin_id"
+
+    return OVERLAY_CACHE_DIR / _slug(participant_id) / f"{_slug(pantalla_id)}-{key[:16]}.png"
+
+
+def _overlay_cache_key(
+    block_aois: dict[str, dict[str, float]],
+    product_images: dict[str, Path],
+    points: np.ndarray,
+    durations: Optional[np.ndarray],
+    size: tuple[int, int],
+) -> str:
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {
+                "version": OVERLAY_CACHE_VERSION,
+                "size": list(size),
+                "aois": block_aois,
+                "images": {
+                    name: [str(path), path.stat().st_size, path.stat().st_mtime_ns]
+                    for name, path in sorted(product_images.items())
+                    if Path(path).exists()
+                },
+            },
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    )
+    digest.update(np.ascontiguousarray(points, dtype=np.float32).tobytes())
+    if durations is not None:
+        digest.update(np.ascontiguousarray(durations, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def _draw_stimulus_canvas(
+    block_aois: dict[str, dict[str, float]],
+    product_images: dict[str, Path],
+    size: tuple[int, int],
+):
+    """Lienzo con la imagen de cada producto dentro de su AOI "_pack" y el contorno de cada AOI."""
+    from PIL import Image, ImageDraw, ImageOps
+
+    canvas = Image.new("RGB", size, "white")
+    names, bounds = _compile_aoi_bounds(block_aois)
+    pixel_bounds = np.rint(bounds * np.array([size[0], size[1], size[0], size[1]])).astype(int)
+    boxes = dict(zip(names, pixel_bounds.tolist()))
+
+    for product, image_path in product_images.items():
+        box = boxes.get(f"{product}_pack")
+        if box is None:
+            continue
+        width, height = box[2] - box[0], box[3] - box[1]
+        if width <= 1 or height <= 1:
+            continue
+        try:
+            with Image.open(image_path) as stimulus:
+                fitted = ImageOps.contain(stimulus.convert("RGB"), (width, height))
+        except OSError:
+            continue
+        canvas.paste(
+            fitted,
+            (box[0] + (width - fitted.width) // 2, box[1] + (height - fitted.height) // 2),
+        )
+
+    draw = ImageDraw.Draw(canvas)
+    for name, box in boxes.items():
+        draw.rectangle(box, outline=(120, 120, 120), width=1)
+        draw.text((box[0] + 4, box[1] + 2), name, fill=(90, 90, 90))
+    return canvas
+
+
+def render_scanpath_overlay(
+    participant_id: str,
+    pantalla_id: str,
+    block_aois: dict[str, dict[str, float]],
+    product_images: dict[str, Path],
+    fixations: Optional[pd.DataFrame] = None,
+    gaze: Optional[pd.DataFrame] = None,
+    size: tuple[int, int] = OVERLAY_SIZE,
+) -> Path:
+    """
+    PNG del scanpath de una pantalla sobre su estímulo: fijaciones numeradas
+    (radio ∝ √duración) unidas por sacadas. Sin fijaciones dibuja el gaze
+    muestreado. El PNG queda en caché por participante y pantalla, con una
+    clave que cambia si cambian los AOIs, las imágenes o los datos.
+    """
+    durations = None
+    if isinstance(fixations, pd.DataFrame) and not fixations.empty:
+        points, inside = _norm_to_canvas(
+            fixations["norm_pos_x"].to_numpy(dtype=float),
+            fixations["norm_pos_y"].to_numpy(dtype=float),
+            size,
+        )
+        durations = fixations["Duration"].to_numpy(dtype=float)[inside]
+    elif isinstance(gaze, pd.DataFrame) and not gaze.empty:
+        stride = max(1, int(np.ceil(len(gaze) / OVERLAY_MAX_GAZE_POINTS)))
+        points, _ = _norm_to_canvas(
+            gaze["norm_pos_x"].to_numpy(dtype=float)[::stride],
+            gaze["norm_pos_y"].to_numpy(dtype=float)[::stride],
+            size,
+        )
+    else:
+        points = np.empty((0, 2))
+
+    key = _overlay_cache_key(block_aois, product_images, points, durations, size)
+    entry = _overlay_cache_path(participant_id, pantalla_id, key)
+    try:
+        os.utime(entry)
+        os.utime(entry.parent)
+        return entry
+    except OSError:
+        pass
+
+    from PIL import Image, ImageDraw
+
+    canvas = _draw_stimulus_canvas(block_aois, product_images, size).convert("RGBA")
+    layer = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    if len(points) > 1:
+        draw.line(
+            points.ravel().tolist(),
+            fill=(30, 90, 200, 170),
+            width=2 if durations is not None else 1,
+        )
+    if durations is not None and len(points):
+        min_radius, max_radius = OVERLAY_FIXATION_RADIUS
+        peak = durations.max() if durations.size and durations.max() > 0 else 1.0
+        radii = min_radius + (max_radius - min_radius) * np.sqrt(np.clip(durations, 0, None) / peak)
+        boxes = np.column_stack([points - radii[:, None], points + radii[:, None]])
+        for number, (box, center) in enumerate(zip(boxes.tolist(), points.tolist()), start=1):
+            draw.ellipse(box, fill=(230, 60, 40, 110), outline=(180, 30, 20, 230), width=2)
+            draw.text((center[0] - 4, center[1] - 6), str(number), fill=(255, 255, 255, 255))
+    elif len(points):
+        dots = np.column_stack([points - 2, points + 2])
+        for box in dots.tolist():
+            draw.ellipse(box, fill=(230, 60, 40, 160))
+    overlay = Image.alpha_composite(canvas, layer).convert("RGB")
+
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    handle, staging = tempfile.mkstemp(prefix=".tmp", suffix=".png", dir=entry.parent)
+    with os.fdopen(handle, "wb") as staging_file:
+        overlay.save(staging_file, format="PNG", optimize=True)
+    os.replace(staging, entry)
+    # Versiones anteriores de esta pantalla (AOIs o datos distintos) ya no sirven;
+    # el patrón exacto evita borrar las de otra pantalla como "Grid-1" al pintar "Grid"
+    stale_name = re.compile(rf"{re.escape(entry.name.rsplit('-', 1)[0])}-[0-9a-f]{{16}}\.png")
+    for stale in entry.parent.iterdir():
+        if stale != entry and stale_name.fullmatch(stale.name):
+            stale.unlink(missing_ok=True)
+    _enforce_cache_budget(OVERLAY_CACHE_DIR, OVERLAY_CACHE_MAX_BYTES)
+    return entry
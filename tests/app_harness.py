@@ -0,0 +1,259 @@
+"""
+Carga funciones de app.py sin ejecutar la interfaz de Streamlit.
+
+app.py construye la página al importarse, así que aquí se ejecutan solo sus
+constantes y definiciones (sin decoradores) en un espacio de nombres con
+dobles de `st`, de PyGithub y de un repositorio en memoria.
+"""
+
+import ast
+import base64
+import hashlib
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+import types
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import pupil_analysis
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+
+class FakeGithubException(Exception):
+    def __init__(self, status: int, data: Optional[dict] = None):
+        super().__init__(status)
+        self.status = status
+        self.data = data or {"message": f"HTTP {status}"}
+
+
+def _fake_tree_element(path, mode, type, content=None, sha=None):
+    return types.SimpleNamespace(path=path, mode=mode, type=type, sha=sha)
+
+
+class FakeRepo:
+    """Repositorio git mínimo en memoria con la API de datos que usa app.py."""
+
+    def __init__(self, files: Optional[dict[str, bytes]] = None):
+        self.blobs: dict[str, bytes] = {}
+        self.commits: dict[str, dict[str, str]] = {}
+        self.head = self._new_commit({path: self._put_blob(data) for path, data in (files or {}).items()})
+        self.calls: list[str] = []
+        # Se ejecuta justo antes de mover la rama (simula otro proceso escribiendo)
+        self.before_ref_edit = None
+        # Simula un árbol recursivo que GitHub devolvió truncado
+        self.tree_truncated = False
+
+    def _put_blob(self, data: bytes) -> str:
+        sha = hashlib.sha1(f"blob {len(data)}\0".encode("ascii") + data).hexdigest()
+        self.blobs[sha] = data
+        return sha
+
+    def _new_commit(self, tree: dict[str, str]) -> str:
+        sha = hashlib.sha1(json.dumps(sorted(tree.items())).encode() + str(len(self.commits)).encode()).hexdigest()
+        self.commits[sha] = dict(tree)
+        return sha
+
+    def files(self) -> dict[str, bytes]:
+        return {path: self.blobs[sha] for path, sha in self.commits[self.head].items()}
+
+    def write(self, path: str, data: Optional[bytes]) -> None:
+        """Commit directo (otro escritor)."""
+        tree = dict(self.commits[self.head])
+        if data is None:
+            tree.pop(path, None)
+        else:
+            tree[path] = self._put_blob(data)
+        self.head = self._new_commit(tree)
+
+    # --- API de PyGithub usada por app.py ---
+    def get_git_ref(self, name):
+        self.calls.append("get_git_ref")
+        repo = self
+        seen_head = self.head
+
+        def edit(sha):
+            repo.calls.append("edit")
+            if repo.before_ref_edit is not None:
+                hook, repo.before_ref_edit = repo.before_ref_edit, None
+                hook(repo)
+            if repo.head != seen_head:
+                raise FakeGithubException(422)
+            repo.head = sha
+
+        return types.SimpleNamespace(object=types.SimpleNamespace(sha=seen_head), edit=edit)
+
+    def get_git_commit(self, sha):
+        return types.SimpleNamespace(sha=sha, tree=types.SimpleNamespace(sha=f"tree:{sha}"))
+
+    def get_git_tree(self, sha, recursive=False):
+        self.calls.append("get_git_tree")
+        commit = sha.split(":", 1)[1] if sha.startswith("tree:") else sha
+        elements = [
+            types.SimpleNamespace(path=path, sha=blob, type="blob", size=len(self.blobs[blob]))
+            for path, blob in self.commits[commit].items()
+        ]
+        return types.SimpleNamespace(tree=elements, raw_data={"truncated": self.tree_truncated})
+
+    def create_git_blob(self, content, encoding):
+        self.calls.append("create_git_blob")
+        return types.SimpleNamespace(sha=self._put_blob(base64.b64decode(content)))
+
+    def create_git_tree(self, elements, base_tree):
+        tree = dict(self.commits[base_tree.sha.split(":", 1)[1]])
+        for element in elements:
+            if element.sha is None:
+                tree.pop(element.path, None)
+            else:
+                tree[element.path] = element.sha
+        return tree
+
+    def create_git_commit(self, message, tree, parents):
+        return types.SimpleNamespace(sha=self._new_commit(tree))
+
+    def create_file(self, path, message, content, branch=None):
+        self.calls.append("create_file")
+        if path in self.commits[self.head]:
+            raise FakeGithubException(422)
+        self.write(path, content)
+        return {"commit": types.SimpleNamespace(sha=self.head)}
+
+    def get_contents(self, path):
+        self.calls.append("get_contents")
+        blob = self.commits[self.head].get(path)
+        if blob is None:
+            raise FakeGithubException(404)
+        return types.SimpleNamespace(
+            sha=blob, content=base64.b64encode(self.blobs[blob]), download_url=None
+        )
+
+
+class _FakeResponse:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start : start + chunk_size]
+
+
+class FakeSession:
+    def __init__(self, repo: FakeRepo):
+        self.repo = repo
+
+    def get(self, url, stream=False, timeout=None):
+        self.repo.calls.append("raw_blob")
+        return _FakeResponse(self.repo.blobs[url.rsplit("/", 1)[1]])
+
+
+def _streamlit_double():
+    messages: list[tuple[str, str]] = []
+    st = types.SimpleNamespace(session_state={}, secrets={}, messages=messages)
+    for level in ("error", "warning", "info", "success", "caption"):
+        setattr(st, level, lambda text, _level=level: messages.append((_level, str(text))))
+    return st
+
+
+def _exec_definitions(tree: ast.Module, filename: str, namespace: dict, st) -> None:
+    """Ejecuta imports, funciones, clases y constantes de app.py, sin la interfaz."""
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            # streamlit / PyGithub / altair se reemplazan por los dobles de arriba
+            try:
+                exec(compile(ast.Module(body=[node], type_ignores=[]), filename, "exec"), namespace)
+            except ImportError:
+                pass
+            namespace.update(
+                st=st,
+                GithubException=FakeGithubException,
+                GithubObject=types.SimpleNamespace,
+                InputGitTreeElement=_fake_tree_element,
+            )
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            node.decorator_list = []
+            exec(compile(ast.Module(body=[node], type_ignores=[]), filename, "exec"), namespace)
+        elif isinstance(node, ast.Assign) and all(
+            isinstance(target, ast.Name) and target.id.isupper() for target in node.targets
+        ):
+            try:
+                exec(compile(ast.Module(body=[node], type_ignores=[]), filename, "exec"), namespace)
+            except Exception:
+                continue
+
+
+def load_app_namespace(repo: Optional[FakeRepo] = None) -> dict:
+    """Constantes y funciones de app.py listas para llamar contra `repo`."""
+    source = APP_PATH.read_text(encoding="utf-8")
+    tree = ast.parse(source)
+    st = _streamlit_double()
+    namespace: dict[str, Any] = {
+        name: getattr(pupil_analysis, name) for name in dir(pupil_analysis) if not name.startswith("__")
+    }
+    namespace.update(
+        ast=ast, base64=base64, hashlib=hashlib, json=json, random=random, re=re,
+        threading=threading, time=time, unicodedata=unicodedata, uuid=uuid,
+        ThreadPoolExecutor=ThreadPoolExecutor, as_completed=as_completed,
+        copy_context=copy_context, BytesIO=BytesIO, Path=Path, Any=Any, Optional=Optional,
+        pd=pd, np=np, st=st, Github=object, GithubException=FakeGithubException,
+        InputGitTreeElement=_fake_tree_element,
+    )
+    _exec_definitions(tree, str(APP_PATH), namespace, st)
+
+    index_state = {
+        "head": None,
+        "files": {},
+        "dirs": set(),
+        "truncated": False,
+        "checked_at": 0.0,
+        "lock": threading.Lock(),
+    }
+    counted: list[int] = []
+    counter = {"action": None, "tally": lambda calls=1: counted.append(calls), "counted": counted}
+    namespace.update(
+        _repo_index_state=lambda: index_state,
+        _github_call_counter=lambda: counter,
+        _github_repo=lambda: repo,
+    )
+    if repo is not None:
+        namespace["_github_http_session"] = lambda: FakeSession(repo)
+    return namespace
+
+
+def load_baseline_namespace() -> dict:
+    """
+    Funciones de app.py tal como estaban en el primer commit del repo, cuando
+    todo el pipeline de análisis vivía ahí: la referencia de las comparaciones.
+    """
+    root = APP_PATH.parent
+    baseline = subprocess.run(
+        ["git", "rev-list", "--max-parents=0", "HEAD"],
+        cwd=root, capture_output=True, text=True, check=True,
+    ).stdout.split()[-1]
+    source = subprocess.run(
+        ["git", "show", f"{baseline}:app.py"],
+        cwd=root, capture_output=True, check=True,
+    ).stdout.decode("utf-8")
+    namespace: dict[str, Any] = {"Github": object, "GithubException": FakeGithubException}
+    _exec_definitions(ast.parse(source), f"{baseline}:app.py", namespace, _streamlit_double())
+    return namespace
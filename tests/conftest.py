@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import pupil_analysis  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _isolated_local_cache(tmp_path, monkeypatch):
+    """Cada prueba usa su propia caché local en vez de /tmp/smartcore_cache."""
+    root = pupil_analysis.LOCAL_CACHE_DIR
+    for name in dir(pupil_analysis):
+        value = getattr(pupil_analysis, name)
+        if name.endswith("_DIR") and isinstance(value, Path) and value.is_relative_to(root):
+            monkeypatch.setattr(pupil_analysis, name, tmp_path / "cache" / value.relative_to(root))
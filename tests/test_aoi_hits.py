@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import pupil_analysis
+
+
+def _brute_force_hits(x, y, bounds):
+    """Recorrido original: muestra por muestra, AOI por AOI, en orden."""
+    hits = np.zeros((len(x), len(bounds)), dtype=bool)
+    for i, (px, py) in enumerate(zip(x, y)):
+        for j, (x_min, y_min, x_max, y_max) in enumerate(bounds):
+            hits[i, j] = bool(x_min <= px <= x_max and y_min <= py <= y_max)
+    return hits
+
+
+def _scene(seed, n_aois=40, n_samples=3000):
+    rng = np.random.default_rng(seed)
+    x_min = rng.uniform(-0.2, 1.0, n_aois)
+    y_min = rng.uniform(-0.2, 1.0, n_aois)
+    bounds = np.column_stack(
+        [x_min, y_min, x_min + rng.uniform(0.0, 0.4, n_aois), y_min + rng.uniform(0.0, 0.4, n_aois)]
+    )
+    bounds[0] = [1.2, 1.2, 1.4, 1.4]  # por completo fuera de [0,1]²
+    bounds[1] = [0.5, 0.5, 0.4, 0.6]  # invertido: nunca contiene nada
+    bounds[2] = [np.nan, 0.1, 0.3, 0.3]
+    bounds[3] = [0.25, 0.25, 0.25, 0.25]  # degenerado: un solo punto
+
+    x = rng.uniform(-0.5, 1.5, n_samples)
+    y = rng.uniform(-0.5, 1.5, n_samples)
+    x[:50], y[:50] = np.nan, 0.5
+    x[50:100], y[50:100] = 0.5, np.inf
+    # Esquinas exactas de los AOIs (el borde cuenta como dentro)
+    corners = np.arange(4, n_aois)
+    x[100 : 100 + corners.size] = bounds[corners, 0]
+    y[100 : 100 + corners.size] = bounds[corners, 3]
+    x[-2], y[-2] = 1.3, 1.3  # dentro del AOI fuera de rango
+    x[-1], y[-1] = 0.25, 0.25  # sobre el AOI degenerado
+    return x, y, bounds
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_grid_pairs_match_brute_force(seed):
+    x, y, bounds = _scene(seed)
+    expected = _brute_force_hits(x, y, bounds)
+    pair_samples, pair_aois = pupil_analysis._aoi_hit_pairs(x, y, bounds)
+
+    actual = np.zeros_like(expected)
+    actual[pair_samples, pair_aois] = True
+    np.testing.assert_array_equal(actual, expected)
+    # Ordenados por muestra y, dentro de cada una, por AOI
+    assert np.all(np.diff(pair_samples * len(bounds) + pair_aois) > 0)
+
+
+@pytest.mark.parametrize("use_grid", [False, True])
+def test_compute_aoi_hits_matches_brute_force(use_grid):
+    x, y, bounds = _scene(3)
+    timestamps = np.arange(len(x)) * 0.005 + 100.0
+    dt = np.full(len(x), 0.005)
+    dt[::7] = np.nan
+    block_aois = {
+        f"AOI_{j}": dict(zip(["x_min", "y_min", "x_max", "y_max"], row)) for j, row in enumerate(bounds)
+    }
+    result = pupil_analysis._compute_aoi_hits(timestamps, x, y, dt, block_aois, use_grid=use_grid)
+
+    hits = _brute_force_hits(x, y, bounds)
+    expected_codes = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+    np.testing.assert_array_equal(result["label_codes"], expected_codes)
+    np.testing.assert_array_equal(result["counts"], hits.sum(axis=0))
+    np.testing.assert_allclose(result["dwell"], np.nan_to_num(dt) @ hits)
+    expected_tff = np.array(
+        [timestamps[column].min() if column.any() else np.nan for column in hits.T]
+    )
+    np.testing.assert_array_equal(result["tff"], expected_tff)
+    assert result["counts"][0] > 0 and result["counts"][1] == result["counts"][2] == 0
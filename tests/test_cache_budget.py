@@ -0,0 +1,36 @@
+import os
+import time
+
+import pupil_analysis
+
+
+def _entry(root, name, size, age_seconds):
+    path = root / name
+    path.write_bytes(b"x" * size)
+    moment = time.time() - age_seconds
+    os.utime(path, (moment, moment))
+    return path
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    old = _entry(tmp_path, "old", 100, 3 * 3600)
+    older = _entry(tmp_path, "older", 100, 4 * 3600)
+    recent = _entry(tmp_path, "recent", 100, 2 * 3600)
+    pupil_analysis._enforce_cache_budget(tmp_path, 150)
+    assert not older.exists() and not old.exists() and recent.exists()
+
+
+def test_recent_entries_are_pinned_within_the_overshoot(tmp_path):
+    stale = _entry(tmp_path, "stale", 100, 2 * 3600)
+    pinned = [_entry(tmp_path, f"pinned{i}", 100, 60 * (i + 1)) for i in range(2)]
+    # 200 bytes usados hace minutos sobre un límite de 150: dentro del margen de 50 %
+    pupil_analysis._enforce_cache_budget(tmp_path, 150)
+    assert not stale.exists()
+    assert all(path.exists() for path in pinned)
+
+
+def test_pinned_entries_past_the_cap_are_evicted_oldest_first(tmp_path):
+    pinned = [_entry(tmp_path, f"pinned{i}", 100, 60 * (5 - i)) for i in range(5)]
+    # 500 bytes fijados sobre un límite de 200: se baja hasta 300 (200 + 50 %)
+    pupil_analysis._enforce_cache_budget(tmp_path, 200)
+    assert [path.exists() for path in pinned] == [False, False, True, True, True]
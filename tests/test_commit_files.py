@@ -0,0 +1,51 @@
+import pytest
+
+from app_harness import FakeRepo, load_app_namespace
+
+
+@pytest.fixture
+def repo():
+    return FakeRepo({"README.md": b"x"})
+
+
+@pytest.fixture
+def app(repo):
+    return load_app_namespace(repo)
+
+
+def test_commit_skips_unchanged_and_deletes(app, repo):
+    repo.write("a.txt", b"same")
+    repo.write("b.txt", b"old")
+    assert app["_commit_files_to_repo"](repo, {"a.txt": b"same", "b.txt": None, "c.txt": b"new"}, "m")
+    assert repo.files() == {"README.md": b"x", "a.txt": b"same", "c.txt": b"new"}
+    assert repo.calls.count("create_git_blob") == 1
+
+
+def test_commit_rebases_when_other_paths_moved(app, repo):
+    repo.before_ref_edit = lambda r: r.write("otro.txt", b"concurrente")
+    assert app["_commit_files_to_repo"](repo, {"a.txt": b"mio"}, "m")
+    assert repo.files()["otro.txt"] == b"concurrente"
+    assert repo.files()["a.txt"] == b"mio"
+
+
+def test_commit_refuses_to_overwrite_concurrent_change(app, repo):
+    repo.write("a.txt", b"base")
+    repo.before_ref_edit = lambda r: r.write("a.txt", b"concurrente")
+    assert not app["_commit_files_to_repo"](repo, {"a.txt": b"mio"}, "m")
+    assert repo.files()["a.txt"] == b"concurrente"
+    assert any(level == "error" and "Conflicto" in text for level, text in app["st"].messages)
+
+
+def test_commit_checks_expected_sha(app, repo):
+    repo.write("a.txt", b"leido")
+    leido = app["_git_blob_sha"](b"leido")
+    repo.write("a.txt", b"cambiado")
+    assert not app["_commit_files_to_repo"](repo, {"a.txt": b"mio"}, "m", expected_shas={"a.txt": leido})
+    assert repo.files()["a.txt"] == b"cambiado"
+
+
+def test_commit_uses_fresh_index(app, repo):
+    app["_repo_tree_index"](repo)
+    repo.write("a.txt", b"nuevo")  # el índice en memoria aún no lo ve
+    assert app["_commit_files_to_repo"](repo, {"a.txt": None}, "m")
+    assert "a.txt" not in repo.files()
@@ -0,0 +1,77 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pupil_analysis
+from app_harness import load_baseline_namespace
+
+
+def _results(n_frames=25):
+    rng = np.random.default_rng(0)
+    framewise = pd.DataFrame(
+        {
+            "timestamp": 8171.0 + np.arange(n_frames) / 200.0,
+            "x_norm": rng.uniform(0, 1, n_frames),
+            "AOI": rng.choice(["Precio", "Marca", None], n_frames),
+        }
+    )
+    framewise.loc[3, "x_norm"] = np.nan
+    return {
+        "df_app": pd.DataFrame({"Pantalla": ["A", "B"], "Modo": ["Con", "Sin"]}),
+        "framewise_gaze": framewise,
+        "per_screen": pd.DataFrame({"Pantalla_ID": ["P1"], "Dwell": [1.5]}),
+        "per_mode": pd.DataFrame(),
+        "blinks_per_mode": pd.DataFrame({"Modo": ["Con"], "Blinks": [3]}),
+        "pupil_raw": pd.DataFrame({"timestamp": [1.0, 2.0], "diameter": [3.0, 3.5]}),
+    }
+
+
+def _read_sheets(content: bytes) -> dict[str, pd.DataFrame]:
+    return pd.read_excel(BytesIO(content), sheet_name=None)
+
+
+@pytest.fixture
+def small_sheets(monkeypatch):
+    # 10 filas de datos por hoja y bloques de 3 para cruzar ambos bordes
+    monkeypatch.setattr(pupil_analysis, "EXCEL_MAX_ROWS", 11)
+    monkeypatch.setattr(pupil_analysis, "EXCEL_ROW_BLOCK", 3)
+
+
+def test_split_sheets_concatenate_to_baseline_sheet(small_sheets):
+    results = _results()
+    expected = _read_sheets(load_baseline_namespace()["export_final_excel"](results))
+    actual = _read_sheets(pupil_analysis.export_final_excel(results, include_pupil_raw=True))
+
+    assert list(actual) == [
+        "Resumen_App",
+        "Gaze_Framewise",
+        "Gaze_Framewise_2",
+        "Gaze_Framewise_3",
+        "AOI_Por_Pantalla",
+        "AOI_Por_Modo",
+        "Blinks_Por_Modo",
+        "Pupil_Raw",
+    ]
+    parts = [actual.pop(name) for name in ["Gaze_Framewise", "Gaze_Framewise_2", "Gaze_Framewise_3"]]
+    assert [len(part) for part in parts] == [10, 10, 5]
+    pd.testing.assert_frame_equal(
+        pd.concat(parts, ignore_index=True), expected.pop("Gaze_Framewise")
+    )
+    assert list(actual) == list(expected)
+    for name, frame in expected.items():
+        pd.testing.assert_frame_equal(actual[name], frame, obj=name)
+
+
+def test_exact_limit_does_not_add_a_part(small_sheets):
+    sheets = _read_sheets(pupil_analysis.export_final_excel(_results(n_frames=10)))
+    assert "Gaze_Framewise" in sheets and "Gaze_Framewise_2" not in sheets
+    assert len(sheets["Gaze_Framewise"]) == 10
+
+
+def test_part_names_fit_excel_limit():
+    name = "Transiciones_Por_Pantalla_Detalle_Largo"
+    assert pupil_analysis._excel_part_name(name, 0) == name[:31]
+    part = pupil_analysis._excel_part_name(name, 11)
+    assert len(part) == 31 and part.endswith("_12")
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+import pupil_analysis
+from app_harness import load_baseline_namespace
+
+
+def test_batch_lookup_matches_baseline_per_value_lookup():
+    world_ts = 8171.0 + np.arange(300) / 30.0
+    values = [
+        world_ts[0] - 5.0,  # antes del primer frame
+        world_ts[0],
+        world_ts[10],  # coincide exacto con un frame
+        world_ts[10] + 1e-4,
+        (world_ts[120] + world_ts[121]) / 2,
+        world_ts[-1],
+        world_ts[-1] + 5.0,  # después del último frame
+        None,
+    ]
+    baseline = load_baseline_namespace()
+    baseline["WORLD_TIMESTAMPS"] = world_ts
+    expected = [baseline["buscar_frame"](value) for value in values]
+
+    frames = pupil_analysis._frames_for_timestamps(world_ts, values)
+    assert frames.dtype == "Int64"
+    assert [None if pd.isna(frame) else int(frame) for frame in frames] == expected
+
+
+def test_missing_timestamps_become_na():
+    world_ts = np.arange(10, dtype=float)
+    frames = pupil_analysis._frames_for_timestamps(world_ts, [np.nan, 2.5, None, float("inf"), "3"])
+    # El searchsorted escalar devolvía len(world_ts) para NaN: un frame que no existe
+    assert frames.isna().tolist() == [True, False, True, True, False]
+    assert frames[1] == 3 and frames[4] == 3
+
+
+def test_without_world_timestamps_everything_is_na():
+    frames = pupil_analysis._frames_for_timestamps(None, [1.0, 2.0])
+    assert frames.dtype == "Int64" and frames.isna().all()
@@ -0,0 +1,12 @@
+from app_harness import FakeRepo, load_app_namespace
+
+
+def test_counted_repo_tallies_each_api_method():
+    repo = FakeRepo({"README.md": b"x"})
+    app = load_app_namespace(repo)
+    counted_repo = app["_CountedGithubObject"](repo)
+    assert app["_commit_files_to_repo"](counted_repo, {"a.txt": b"nuevo"}, "m")
+    # get_git_ref + get_git_tree (índice), create_git_blob, get_git_ref, get_git_commit,
+    # create_git_tree, create_git_commit y ref.edit
+    assert sum(app["_github_call_counter"]()["counted"]) == 8
+    assert repo.files()["a.txt"] == b"nuevo"
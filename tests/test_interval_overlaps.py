@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import pupil_analysis
+
+
+def _brute_force(event_starts, event_ends, interval_starts, interval_ends):
+    """Recorrido original: cada intervalo contra cada evento válido."""
+    counts, overlaps = [], []
+    for start, end in zip(interval_starts, interval_ends):
+        count, overlap = 0, 0.0
+        for event_start, event_end in zip(event_starts, event_ends):
+            if not (np.isfinite(event_start) and np.isfinite(event_end) and event_end > event_start):
+                continue
+            shared = min(end, event_end) - max(start, event_start)
+            if shared > 0:
+                count += 1
+                overlap += shared
+        counts.append(count)
+        overlaps.append(overlap)
+    return np.array(counts), np.array(overlaps)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 3])
+def test_sweep_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    clock = 8171.0  # timestamps de Pupil Labs: grandes, con decimales
+    # Tiempos en una rejilla de 0.05 s para forzar bordes que coinciden exactamente
+    event_starts = clock + rng.integers(0, 400, 120) * 0.05
+    event_ends = event_starts + rng.integers(0, 12, 120) * 0.05
+    event_starts[:5] = np.nan
+    event_ends[5:8] = event_starts[5:8] - 0.05  # fin antes del inicio
+    interval_starts = clock + rng.integers(-20, 420, 60) * 0.05
+    interval_ends = interval_starts + rng.integers(-2, 60, 60) * 0.05
+
+    counts, overlaps = pupil_analysis._count_interval_overlaps(
+        event_starts, event_ends, interval_starts, interval_ends
+    )
+    expected_counts, expected_overlaps = _brute_force(
+        event_starts, event_ends, interval_starts, interval_ends
+    )
+    np.testing.assert_array_equal(counts, expected_counts)
+    np.testing.assert_allclose(overlaps, expected_overlaps, atol=1e-9)
+
+
+def test_touching_events_do_not_count():
+    counts, overlaps = pupil_analysis._count_interval_overlaps(
+        np.array([0.0, 2.0, 1.5]), np.array([1.0, 3.0, 1.6]), np.array([1.0]), np.array([2.0])
+    )
+    assert counts.tolist() == [1]
+    np.testing.assert_allclose(overlaps, [0.1])
+
+
+def test_no_valid_events():
+    counts, overlaps = pupil_analysis._count_interval_overlaps(
+        np.array([np.nan]), np.array([1.0]), np.array([0.0, 1.0]), np.array([1.0, 2.0])
+    )
+    assert counts.tolist() == [0, 0] and overlaps.tolist() == [0.0, 0.0]
@@ -0,0 +1,165 @@
+"""
+integrate_app_with_pupil contra la versión original (app.py del primer commit)
+sobre el export sintético de `benchmark.py generate`.
+"""
+
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmark
+import pupil_analysis
+from app_harness import load_baseline_namespace
+
+
+@pytest.fixture(scope="module")
+def synthetic_folder(tmp_path_factory):
+    return benchmark.generate_synthetic_export(tmp_path_factory.mktemp("bench"), 1.0)
+
+
+@pytest.fixture(scope="module")
+def synthetic_inputs(synthetic_folder):
+    folder = synthetic_folder
+    return dict(
+        excel_df=pd.read_excel(next(folder.glob("experimento_*.xlsx")), sheet_name="Resumen"),
+        gaze_df=pd.read_csv(folder / "gaze_positions.csv"),
+        world_ts=np.load(folder / "world_timestamps.npy"),
+        fixations_df=pd.read_csv(folder / "fixations.csv"),
+        blink_df=pd.read_csv(folder / "blinks.csv"),
+        pupil_df=pd.read_csv(folder / "pupil_positions.csv"),
+    )
+
+
+@pytest.fixture(scope="module")
+def baseline_results(synthetic_inputs):
+    integrate = load_baseline_namespace()["integrate_app_with_pupil"]
+    with warnings.catch_warnings():
+        # El código original usa asignaciones encadenadas que pandas 3 avisa
+        warnings.simplefilter("ignore")
+        return integrate(**{key: _copy(value) for key, value in synthetic_inputs.items()})
+
+
+def _copy(value):
+    return value.copy() if hasattr(value, "copy") else value
+
+
+def _comparable(frame: pd.DataFrame) -> pd.DataFrame:
+    """Las etiquetas ahora son categóricas; se comparan por valor."""
+    frame = frame.reset_index(drop=True)
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype(object)
+    return frame
+
+
+def _assert_matches_baseline(results: dict, baseline: dict) -> None:
+    for key, expected in baseline.items():
+        if not isinstance(expected, pd.DataFrame):
+            continue
+        actual = results[key]
+        # Las tablas nuevas pueden sumar columnas, pero no cambiar las de antes
+        assert set(expected.columns) <= set(actual.columns), key
+        pd.testing.assert_frame_equal(
+            _comparable(actual[expected.columns]),
+            _comparable(expected),
+            check_dtype=False,
+            atol=1e-9,
+            obj=key,
+        )
+
+
+def test_integrate_matches_baseline(synthetic_inputs, baseline_results):
+    results = pupil_analysis.integrate_app_with_pupil(
+        **{key: _copy(value) for key, value in synthetic_inputs.items()}
+    )
+    _assert_matches_baseline(results, baseline_results)
+
+
+SHAS = {"gaze": "a" * 40, "timestamps": "b" * 40, "fixations": "c" * 40, "pupil": "d" * 40}
+
+
+def _cached_run(inputs, shas, **overrides):
+    return pupil_analysis.integrate_app_with_pupil(
+        **{key: _copy(value) for key, value in inputs.items()} | overrides, input_shas=shas
+    )
+
+
+def test_cached_integrate_matches_baseline(synthetic_inputs, baseline_results):
+    for _ in range(2):
+        results = _cached_run(synthetic_inputs, SHAS)
+    # La segunda corrida sale entera de la caché de análisis
+    assert results["analysis_cache"]["screens_recomputed"] == 0
+    assert not results["analysis_cache"]["pupil_recomputed"]
+    _assert_matches_baseline(results, baseline_results)
+
+
+@pytest.mark.parametrize(
+    "changed, screens_recomputed, pupil_recomputed",
+    [
+        ("pupil", False, True),
+        ("fixations", True, False),
+        ("gaze", True, True),
+        ("timestamps", True, True),
+    ],
+)
+def test_changed_input_sha_recomputes_only_its_stages(
+    synthetic_inputs, changed, screens_recomputed, pupil_recomputed
+):
+    first = _cached_run(synthetic_inputs, SHAS)
+    assert first["analysis_cache"]["screens_recomputed"] == first["analysis_cache"]["screens"]
+    second = _cached_run(synthetic_inputs, SHAS | {changed: "e" * 40})
+    stats = second["analysis_cache"]
+    assert stats["screens_recomputed"] == (stats["screens"] if screens_recomputed else 0)
+    assert stats["pupil_recomputed"] == pupil_recomputed
+    # Mismas entradas con otro SHA: el resultado no cambia
+    _assert_matches_baseline(second, {k: v for k, v in first.items() if k != "analysis_cache"})
+
+
+def test_changed_aois_recompute_only_that_screen(synthetic_inputs):
+    _cached_run(synthetic_inputs, SHAS)
+    excel_df = synthetic_inputs["excel_df"].copy()
+    aois = json.loads(excel_df.loc[2, "AOIs"])
+    block = aois[excel_df.loc[2, "Pantalla_ID"]]
+    first_aoi = next(iter(block))
+    block[first_aoi] = [value + 0.01 for value in block[first_aoi]]
+    excel_df.loc[2, "AOIs"] = json.dumps(aois)
+
+    stats = _cached_run(synthetic_inputs, SHAS, excel_df=excel_df)["analysis_cache"]
+    assert stats["screens_recomputed"] == 1 and stats["pupil_recomputed"]
+
+
+def test_missing_sha_disables_the_cache(synthetic_inputs):
+    for _ in range(2):
+        stats = _cached_run(synthetic_inputs, SHAS | {"gaze": None})["analysis_cache"]
+    assert stats["screens_recomputed"] == stats["screens"] and stats["pupil_recomputed"]
+
+
+def test_streamed_pupil_keeps_every_baseline_sample(
+    synthetic_folder, synthetic_inputs, baseline_results
+):
+    csv_path = synthetic_folder / "pupil_positions.csv"
+    # El admin original leía el CSV completo y solo renombraba pupil_timestamp
+    expected = pd.read_csv(csv_path).rename(columns={"pupil_timestamp": "timestamp"})
+    assert (expected["confidence"] < pupil_analysis.GAZE_MIN_CONFIDENCE).any()
+
+    streamed = pupil_analysis._stream_pupil_csv(csv_path)
+    assert len(streamed) == len(expected)
+    for column in streamed.columns:
+        if column == "method":
+            assert list(streamed[column].astype(str)) == list(expected[column])
+        else:
+            np.testing.assert_allclose(
+                streamed[column].to_numpy(dtype=float),
+                expected[column].to_numpy(dtype=float),
+                rtol=1e-6,
+                equal_nan=True,
+                err_msg=column,
+            )
+
+    results = pupil_analysis.integrate_app_with_pupil(
+        **{key: _copy(value) for key, value in synthetic_inputs.items()} | {"pupil_df": streamed}
+    )
+    assert len(results["pupil_raw"]) == len(baseline_results["pupil_raw"])
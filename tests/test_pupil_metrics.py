@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+import pupil_analysis
+
+AOI_NAMES = ["Precio", "Marca", "Logo"]
+
+
+def _scene(seed=0):
+    rng = np.random.default_rng(seed)
+    clock = 8171.0
+    # Las pantallas 0 y 1 quedan pegadas: el gaze más cercano puede ser de la otra
+    starts = clock + np.array([0.0, 2.01, 6.0, 9.0])
+    ends = starts + np.array([2.0, 2.5, 1.5, 2.0])
+    screens = [
+        {"mode": mode, "pantalla_id": f"P{i}", "row": {"Pantalla": f"Pantalla {i}"}}
+        for i, mode in enumerate(["Con", "Sin", "Con", "Sin"])
+    ]
+    pupil_ts = np.sort(clock + rng.uniform(-0.5, 12.0, 1500))
+    # Pantalla 2 sin muestras en su primer medio segundo: línea base vacía
+    pupil_ts = pupil_ts[~((pupil_ts >= starts[2]) & (pupil_ts < starts[2] + 0.8))]
+    # Bordes exactos de pantalla y del fin de la ventana de línea base
+    edges = [starts[[0, 1]], ends[[0, 3]], starts[[0, 3]] + pupil_analysis.PUPIL_BASELINE_SECONDS]
+    pupil_ts = np.concatenate([pupil_ts, *edges])
+    pupil_ts.sort()
+    pupil = {
+        "timestamp": pupil_ts,
+        "diameter": rng.uniform(2.0, 6.0, pupil_ts.size),
+        "unit": "mm",
+    }
+    gaze_ts = clock + rng.uniform(-0.5, 12.0, 2000)
+    # Sin gaze en los últimos 40 ms de la pantalla 0 y uno justo al inicio de la 1
+    gaze_ts = np.sort(np.append(gaze_ts[np.abs(gaze_ts - ends[0] + 0.02) > 0.02], starts[1]))
+    gaze_index = pupil_analysis._build_screen_interval_index(gaze_ts, starts, ends)
+    gaze_aoi_codes = [
+        rng.integers(-1, len(AOI_NAMES), hi - lo).astype(np.int32)
+        for lo, hi in zip(gaze_index["lo"], gaze_index["hi"])
+    ]
+    return pupil, screens, starts, ends, gaze_ts, gaze_index, gaze_aoi_codes
+
+
+def _brute_force(pupil, starts, ends, gaze_ts, gaze_index, gaze_aoi_codes):
+    """Recorrido por pantalla y por muestra, con el gaze más cercano a mano."""
+    screen_rows, aoi_samples = [], {}
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        mask = (pupil["timestamp"] >= start) & (pupil["timestamp"] <= end)
+        ts, diameters = pupil["timestamp"][mask], pupil["diameter"][mask]
+        window = diameters[ts < start + pupil_analysis.PUPIL_BASELINE_SECONDS]
+        baseline = window.mean() if window.size else np.nan
+        screen_rows.append((mask.sum(), baseline, diameters.mean(), diameters.max()))
+
+        screen_gaze = gaze_ts[gaze_index["lo"][i] : gaze_index["hi"][i]]
+        for t, diameter in zip(ts, diameters):
+            distance = np.abs(screen_gaze - t)
+            nearest = distance.argmin()
+            if distance[nearest] > pupil_analysis.PUPIL_GAZE_TOLERANCE:
+                continue
+            aoi = gaze_aoi_codes[i][nearest]
+            if aoi >= 0:
+                aoi_samples.setdefault((f"P{i}", AOI_NAMES[aoi]), []).append(diameter)
+    return screen_rows, aoi_samples
+
+
+def test_pupil_metrics_match_brute_force():
+    pupil, screens, starts, ends, gaze_ts, gaze_index, gaze_aoi_codes = _scene()
+    per_screen, per_aoi = pupil_analysis._compute_pupil_metrics(
+        pupil,
+        screens,
+        starts,
+        ends,
+        gaze_ts,
+        gaze_index["lo"],
+        gaze_index["hi"],
+        gaze_aoi_codes,
+        AOI_NAMES,
+    )
+    screen_rows, aoi_samples = _brute_force(
+        pupil, starts, ends, gaze_ts, gaze_index, gaze_aoi_codes
+    )
+
+    assert list(per_screen.columns) == pupil_analysis.PUPIL_SCREEN_COLUMNS
+    for row, (count, baseline, mean, peak) in zip(per_screen.itertuples(), screen_rows):
+        assert row.Pupil_Samples == count
+        np.testing.assert_allclose(
+            [row.Pupil_Baseline, row.Pupil_Mean, row.Pupil_Peak],
+            [baseline, mean, peak],
+            equal_nan=True,
+        )
+        np.testing.assert_allclose(
+            [row.Pupil_Mean_Change, row.Pupil_Peak_Change],
+            [mean - baseline, peak - baseline],
+            equal_nan=True,
+        )
+    assert np.isnan(per_screen.loc[2, "Pupil_Baseline"])
+
+    baselines = dict(zip(per_screen["Pantalla_ID"], per_screen["Pupil_Baseline"]))
+    expected_aoi = pd.DataFrame(
+        [
+            (pantalla, aoi, len(values), np.mean(values), np.max(values))
+            for (pantalla, aoi), values in sorted(aoi_samples.items())
+        ],
+        columns=["Pantalla_ID", "AOI", "Pupil_Samples", "Pupil_Mean", "Pupil_Peak"],
+    )
+    actual_aoi = per_aoi.sort_values(["Pantalla_ID", "AOI"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        actual_aoi[expected_aoi.columns], expected_aoi, check_dtype=False
+    )
+    np.testing.assert_allclose(
+        actual_aoi["Pupil_Mean_Change"],
+        actual_aoi["Pupil_Mean"] - actual_aoi["Pantalla_ID"].map(baselines),
+        equal_nan=True,
+    )
@@ -0,0 +1,15 @@
+from app_harness import FakeRepo, load_app_namespace
+
+
+def test_truncated_tree_is_flagged_without_touching_streamlit():
+    repo = FakeRepo({"data_participantes/P1/gaze_positions.csv": b"x"})
+    repo.tree_truncated = True
+    app = load_app_namespace(repo)
+
+    assert app["_commit_files_to_repo"](repo, {"a.txt": b"nuevo"}, "m")
+    assert app["_repo_tree_index"](repo)["truncated"]
+    assert app["st"].messages == []
+
+    status = app["_check_participant_files"](repo, "P1")
+    assert status["gaze"]["exists"]
+    assert [level for level, _ in app["st"].messages] == ["warning"]
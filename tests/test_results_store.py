@@ -0,0 +1,157 @@
+import base64
+import types
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from app_harness import FakeRepo, load_app_namespace, load_baseline_namespace
+
+
+def _record(persona_id, edad=30, genero="Female", grupo="", fecha="2026-01-01 10:00:00", **extra):
+    return pd.DataFrame(
+        [
+            {
+                "ID_Participante": persona_id,
+                "Grupo_Experimental": grupo,
+                "Nombre Completo": persona_id.split("_")[0],
+                "Edad": edad,
+                "Género": genero,
+                "Fecha": fecha,
+                **extra,
+            }
+        ]
+    )
+
+
+def _workbook(app, rows):
+    return app["_df_to_excel_bytes"](pd.concat(rows, ignore_index=True))
+
+
+def _baseline_groups(df: pd.DataFrame) -> dict[str, str]:
+    """Grupos que asignar_grupos_experimentales (versión original) deja en `df`."""
+    baseline = load_baseline_namespace()
+    baseline["st"].secrets["GITHUB_TOKEN"] = "token"
+    guardado = {}
+
+    class _Repo:
+        def get_contents(self, path):
+            contenido = base64.b64encode(baseline["_df_to_excel_bytes"](df))
+            return types.SimpleNamespace(content=contenido, sha="sha")
+
+        def update_file(self, path, message, content, sha):
+            guardado["df"] = pd.read_excel(BytesIO(content))
+
+    baseline["Github"] = lambda token: types.SimpleNamespace(get_repo=lambda name: _Repo())
+    assert baseline["asignar_grupos_experimentales"]() == {"status": "ok"}
+    return dict(zip(guardado["df"]["ID_Participante"], guardado["df"]["Grupo_Experimental"]))
+
+
+@pytest.fixture
+def repo():
+    return FakeRepo({"README.md": b"x"})
+
+
+@pytest.fixture
+def app(repo):
+    return load_app_namespace(repo)
+
+
+def _submit(app, repo, persona_id, **kwargs):
+    ruta = app["_result_record_path"](persona_id)
+    app["append_record_to_results"](repo, ruta, _record(persona_id, **kwargs), persona_id)
+    return ruta
+
+
+def test_submission_writes_only_its_shard(app, repo):
+    workbook = _workbook(app, [_record("A_1", grupo="Con SmartScore")])
+    repo.write(app["RESULTS_PATH_IN_REPO"], workbook)
+    antes = repo.files()
+    ruta = _submit(app, repo, "B_1")
+    assert repo.calls == ["create_file"]
+    assert set(repo.files()) - set(antes) == {ruta}
+    assert repo.files()[app["RESULTS_PATH_IN_REPO"]] == workbook
+
+
+def test_groups_match_baseline_rebalance(app, repo):
+    compactados = [
+        _record("A_1", edad=22, genero="Male", grupo="Con SmartScore", fecha="2026-01-01 09:00:00"),
+        _record("B_1", edad=41, genero="Female", grupo="Con SmartScore", fecha="2026-01-01 09:05:00"),
+        _record("C_1", edad=35, genero="Female", grupo="Sin SmartScore", fecha="2026-01-01 09:10:00"),
+    ]
+    repo.write(app["RESULTS_PATH_IN_REPO"], _workbook(app, compactados))
+    # Los nombres no siguen el orden de envío: la tabla debe ordenarse por fecha
+    pendientes = [
+        _record("Zoe_1", edad=28, fecha="2026-01-02 10:00:00"),
+        _record("Ana_1", edad=29, fecha="2026-01-02 10:01:00"),
+        _record("Luis_1", edad=31, genero="Male", fecha="2026-01-02 10:02:00"),
+        _record("Eva_1", edad=27, genero="Mujer", fecha="2026-01-02 10:03:00"),
+        _record("Ines_1", edad=26, genero="F", fecha="2026-01-02 10:04:00"),
+    ]
+    for fila in pendientes:
+        persona_id = fila.loc[0, "ID_Participante"]
+        app["append_record_to_results"](repo, app["_result_record_path"](persona_id), fila, persona_id)
+
+    tabla, _ = app["_read_results_table"](repo, force_refresh=True)
+    esperado = _baseline_groups(pd.concat(compactados + pendientes, ignore_index=True))
+    assert dict(zip(tabla["ID_Participante"], tabla["Grupo_Experimental"])) == esperado
+
+
+def test_merge_prefers_compacted_rows(app):
+    compacted = pd.concat([_record("A_1", grupo="Con SmartScore")], ignore_index=True)
+    records = pd.concat([_record("A_1", grupo=""), _record("B_1", grupo="Sin SmartScore")], ignore_index=True)
+    merged = app["_merge_result_records"](compacted, records)
+    assert list(merged["ID_Participante"]) == ["A_1", "B_1"]
+    assert list(merged["Grupo_Experimental"]) == ["Con SmartScore", "Sin SmartScore"]
+
+
+def test_compaction_persists_groups_and_removes_shards(app, repo):
+    repo.write(app["RESULTS_PATH_IN_REPO"], _workbook(app, [_record("Legado_1", grupo="")]))
+    for i in range(3):
+        _submit(app, repo, f"P_{i}", edad=20 + 10 * i, fecha=f"2026-01-01 10:0{i}:00")
+    antes, _ = app["_read_results_table"](repo, force_refresh=True)
+
+    assert app["_compact_result_records"](repo) == {"status": "ok", "compactados": 3}
+    assert not any(app["_is_result_record_path"](path) for path in repo.files())
+    despues, versiones = app["_read_results_table"](repo, force_refresh=True)
+    assert list(versiones) == [app["RESULTS_PATH_IN_REPO"]]
+    pd.testing.assert_series_equal(
+        despues["Grupo_Experimental"], antes["Grupo_Experimental"], check_dtype=False
+    )
+
+
+def test_compaction_keeps_concurrent_submission_pending(app, repo):
+    _submit(app, repo, "A_1")
+    otro = load_app_namespace(repo)
+    repo.before_ref_edit = lambda r: _submit(otro, r, "B_1")
+    assert app["_compact_result_records"](repo) == {"status": "ok", "compactados": 1}
+    assert app["_result_record_path"]("B_1") in repo.files()
+    tabla, _ = app["_read_results_table"](repo, force_refresh=True)
+    assert set(tabla["ID_Participante"]) == {"A_1", "B_1"}
+
+
+def test_participant_with_only_a_shard_can_be_selected(app, repo):
+    app["st"].secrets["GITHUB_TOKEN"] = "token"
+    ruta = app["_result_record_path"]("Maria_20260101_101010_ab12cd")
+    registro = _record(
+        "Maria_20260101_101010_ab12cd",
+        **{
+            "Instant Noodles · Top 1 · Producto": "Maruchan",
+            "Instant Noodles · Top 1 · SmartScore": "0.812",
+        },
+    )
+    app["append_record_to_results"](repo, ruta, registro, "Maria")
+
+    nombres, error = app["_load_registered_names"]()
+    assert error is None and nombres == ["Maria"]
+    participant_id, grupo = app["_lookup_participant_metadata"]("maria ")
+    assert participant_id == "Maria_20260101_101010_ab12cd"
+    assert grupo in {"Con SmartScore", "Sin SmartScore"}
+    assert app["get_user_group"]("Maria") == grupo
+    assert app["_load_user_smartscore_map"]("Maria") == {"Maruchan": 0.812}
+
+
+def test_record_paths_are_unique_per_submission(app):
+    assert app["_result_record_path"]("José Pérez/x_20260101_101010_ab12cd") == (
+        "registros_resultados/José_Pérez_x_20260101_101010_ab12cd.json"
+    )
@@ -0,0 +1,93 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import pupil_analysis
+
+
+def _brute_force_visits(screens, aois, dt):
+    """Recorrido muestra a muestra: sin AOI se ignora, un cambio abre visita."""
+    visits = []
+    for screen, aoi, step in zip(screens, aois, dt):
+        if aoi < 0:
+            continue
+        if visits and visits[-1][0] == screen and visits[-1][1] == aoi:
+            visits[-1][2] += step
+        else:
+            visits.append([screen, aoi, step])
+    return visits
+
+
+def _brute_force_entropies(visits, n_groups):
+    stationary, transition = [], []
+    for group in range(n_groups):
+        sequence = [aoi for screen, aoi, _ in visits if screen == group]
+        if not sequence:
+            stationary.append(np.nan)
+            transition.append(np.nan)
+            continue
+        share = {aoi: count / len(sequence) for aoi, count in Counter(sequence).items()}
+        stationary.append(-sum(p * math.log2(p) for p in share.values()))
+        pairs = Counter(zip(sequence[:-1], sequence[1:]))
+        rows = Counter(origin for origin, _ in pairs.elements())
+        transition.append(
+            -sum(
+                share[origin] * (count / rows[origin]) * math.log2(count / rows[origin])
+                for (origin, _), count in pairs.items()
+            )
+        )
+    return np.array(stationary), np.array(transition)
+
+
+def _brute_force_pairs(visits):
+    pairs = Counter()
+    for (screen, origin, _), (next_screen, target, _) in zip(visits[:-1], visits[1:]):
+        if screen == next_screen:
+            pairs[(screen, origin, target)] += 1
+    return pairs
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_visits_and_entropies_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n_screens, n_aois = 6, 5
+    lengths = rng.integers(0, 80, n_screens)
+    lengths[2] = 0  # pantalla sin muestras
+    screens = np.repeat(np.arange(n_screens), lengths)
+    # Tramos largos de la misma etiqueta, con huecos fuera de AOI (-1)
+    aois = np.repeat(rng.integers(-1, n_aois, screens.size // 4 + 1), 4)[: screens.size]
+    aois[screens == 4] = 3  # una sola visita: H_t = 0
+    dt = rng.uniform(0.001, 0.01, screens.size)
+
+    visits = pupil_analysis._run_length_visits(screens, aois, dt)
+    expected = _brute_force_visits(screens, aois, dt)
+    assert visits["screen"].tolist() == [v[0] for v in expected]
+    assert visits["aoi"].tolist() == [v[1] for v in expected]
+    np.testing.assert_allclose(visits["duration"], [v[2] for v in expected])
+
+    same_screen = visits["screen"][1:] == visits["screen"][:-1]
+    distinct, stationary, transition, pairs = pupil_analysis._grouped_entropies(
+        visits["screen"],
+        visits["aoi"],
+        visits["screen"][:-1][same_screen],
+        visits["aoi"][:-1][same_screen],
+        visits["aoi"][1:][same_screen],
+        n_screens,
+        n_aois,
+    )
+    expected_stationary, expected_transition = _brute_force_entropies(expected, n_screens)
+    np.testing.assert_allclose(stationary, expected_stationary, atol=1e-12)
+    np.testing.assert_allclose(transition, expected_transition, atol=1e-12)
+    assert distinct.tolist() == [
+        len({v[1] for v in expected if v[0] == group}) for group in range(n_screens)
+    ]
+    assert np.isnan(stationary[2]) and transition[4] == 0.0
+
+    actual_pairs = dict(
+        zip(zip(pairs["group"], pairs["from"], pairs["to"]), pairs["Transitions"])
+    )
+    assert actual_pairs == dict(_brute_force_pairs(expected))
+    row_totals = pairs.groupby(["group", "from"])["Probability"].sum()
+    np.testing.assert_allclose(row_totals, 1.0)
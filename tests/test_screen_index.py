@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import pupil_analysis
+
+
+def _screens(rng, clock=8171.0, n_screens=25):
+    """Pantallas sin traslape, en orden aleatorio, con huecos entre ellas."""
+    bounds = clock + np.sort(rng.choice(np.arange(0, 2000), 2 * n_screens, replace=False)) * 0.01
+    starts, ends = bounds[0::2], bounds[1::2]
+    order = rng.permutation(n_screens)
+    return starts[order], ends[order]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_index_matches_per_screen_masks(seed):
+    rng = np.random.default_rng(seed)
+    starts, ends = _screens(rng)
+    sample_ts = np.concatenate(
+        [
+            8171.0 + rng.uniform(-1.0, 21.0, 4000),
+            starts,  # los bordes cuentan como dentro (intervalos cerrados)
+            ends,
+        ]
+    )
+    sample_ts = np.sort(sample_ts)
+    sample_ts = np.concatenate([sample_ts, [np.nan] * 5])  # NaN al final, como np.sort
+
+    index = pupil_analysis._build_screen_interval_index(sample_ts, starts, ends)
+
+    expected_labels = np.full(sample_ts.size, -1)
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        # Segmentación original: una máscara por pantalla
+        mask = (sample_ts >= start) & (sample_ts <= end)
+        np.testing.assert_array_equal(
+            np.flatnonzero(mask), np.arange(index["lo"][i], index["hi"][i])
+        )
+        expected_labels[mask] = i
+    np.testing.assert_array_equal(index["labels"], expected_labels)
+
+
+def test_empty_inputs():
+    index = pupil_analysis._build_screen_interval_index(np.array([]), np.array([1.0]), np.array([2.0]))
+    assert index["labels"].size == 0 and index["lo"].tolist() == index["hi"].tolist() == [0]
+    index = pupil_analysis._build_screen_interval_index(np.array([1.0, 2.0]), np.array([]), np.array([]))
+    assert index["labels"].tolist() == [-1, -1]
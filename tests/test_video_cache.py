@@ -0,0 +1,26 @@
+from app_harness import FakeRepo, load_app_namespace
+
+VIDEO_PATH = "data_participantes/P1/world.mp4"
+
+
+def test_video_streams_by_blob_sha_and_is_cached():
+    video = b"\x00\x00\x00\x18ftypmp42" * 4096
+    repo = FakeRepo({VIDEO_PATH: video})
+    app = load_app_namespace(repo)
+
+    path = app["_fetch_repo_video"](repo, VIDEO_PATH, "world.mp4")
+    assert path.read_bytes() == video
+    assert "get_contents" not in repo.calls
+    assert repo.calls.count("raw_blob") == 1
+
+    # Con el SHA conocido (del mapa de estado) el segundo pedido sale de la caché
+    blob_sha = app["_repo_tree_index"](repo)["files"][VIDEO_PATH]["sha"]
+    assert app["_fetch_repo_video"](repo, VIDEO_PATH, "world.mp4", blob_sha=blob_sha) == path
+    assert repo.calls.count("raw_blob") == 1
+
+
+def test_missing_video_returns_none():
+    repo = FakeRepo({"README.md": b"x"})
+    app = load_app_namespace(repo)
+    assert app["_fetch_repo_video"](repo, VIDEO_PATH, "world.mp4") is None
+    assert "raw_blob" not in repo.calls